@@ -63,7 +63,11 @@ call is efficient.
 # o implement additional SourceLocation, SourceRange, and File methods.
 
 from ctypes import *
+import array
+import bisect
 import collections
+import os
+import time
 
 import clang.enumerations
 
@@ -105,6 +109,11 @@ if sys.version_info[0] == 3:
             return x
         return x.encode('utf8')
 
+    def _decode(x):
+        if isinstance(x, bytes):
+            return x.decode('utf8')
+        return x
+
     xrange = range
 
 elif sys.version_info[0] == 2:
@@ -120,6 +129,9 @@ elif sys.version_info[0] == 2:
     def b(x):
         return x
 
+    def _decode(x):
+        return x
+
 
 # ctypes doesn't implicitly convert c_void_p to the appropriate wrapper
 # object. This is a problem, because it means that from_parameter will see an
@@ -198,6 +210,134 @@ class CachedProperty(object):
         return value
 
 
+class StringInterner(object):
+    """A bounded table of interned strings returned by libclang.
+
+    When enabled on a TranslationUnit (see
+    TranslationUnit.enable_string_interning()), strings obtained for objects
+    of that translation unit are looked up by their raw bytes, so each
+    distinct spelling is decoded and stored only once. Once max_size strings
+    are held, new strings are still returned but no longer added.
+    """
+
+    # The number of interners currently enabled on a TranslationUnit. While it
+    # is zero, string results skip the interner lookup entirely.
+    active = 0
+
+    def __init__(self, max_size=65536):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._strings = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def intern(self, raw):
+        """Return the str for the raw bytes of a string."""
+        if raw is None:
+            return None
+
+        value = self._strings.get(raw)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = _decode(raw)
+        if len(self._strings) < self.max_size:
+            self._strings[raw] = value
+        return value
+
+    def clear(self):
+        """Drop all interned strings and reset the statistics."""
+        self._strings.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        """Return a dict with the size and hit/miss counts of the table."""
+        return {'size' : len(self._strings),
+                'max_size' : self.max_size,
+                'hits' : self.hits,
+                'misses' : self.misses}
+
+def _find_string_interner(args):
+    for arg in args:
+        if isinstance(arg, TranslationUnit):
+            return arg.string_interner
+        tu = getattr(arg, '_tu', None)
+        if tu is not None:
+            return tu.string_interner
+    return None
+
+def _struct_bytes(obj):
+    """Return the raw bytes of a ctypes structure.
+
+    bytes(obj) gives these on Python 3 only; on Python 2 it is str(obj), the
+    repr of the Python object.
+    """
+    return string_at(addressof(obj), sizeof(obj))
+
+class PropertyCache(object):
+    """Side table of memoized attributes for a translation unit.
+
+    Cursors, types and source locations are ctypes structures that are
+    created anew by every libclang call returning them, so values memoized
+    on one instance do not help another instance referring to the same
+    entity. When enabled on a TranslationUnit (see
+    TranslationUnit.enable_property_cache()), attribute values are instead
+    stored in this table, keyed by the attribute name and the raw bytes of
+    the structure, and shared by all instances. The table is invalidated
+    when the translation unit is reparsed.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, obj, name, compute):
+        """Return the memoized value of compute(obj) for attribute name."""
+        key = (name, _struct_bytes(obj))
+        try:
+            value = self._values[key]
+        except KeyError:
+            self.misses += 1
+            value = self._values[key] = compute(obj)
+            return value
+
+        self.hits += 1
+        return value
+
+    def invalidate(self):
+        """Drop all memoized values."""
+        self._values.clear()
+        self.invalidations += 1
+
+    @property
+    def stats(self):
+        """Return a dict with the size and hit/miss counts of the table."""
+        lookups = self.hits + self.misses
+        return {'size' : len(self._values),
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'hit_rate' : float(self.hits) / lookups if lookups else 0.0,
+                'invalidations' : self.invalidations}
+
+def _memoize(obj, name, compute):
+    """Return compute(obj), through the property cache of the translation
+    unit obj belongs to if it has one."""
+    tu = getattr(obj, '_tu', None)
+    if tu is None or tu.property_cache is None:
+        return compute(obj)
+    return tu.property_cache.get(obj, name, compute)
+
 class _CXString(Structure):
     """Helper for transforming CXString results."""
 
@@ -209,8 +349,24 @@ class _CXString(Structure):
     @staticmethod
     def from_result(res, fn, args):
         assert isinstance(res, _CXString)
+        if StringInterner.active:
+            interner = _find_string_interner(args)
+            if interner is not None:
+                return interner.intern(_CXString.to_bytes(res))
         return conf.lib.clang_getCString(res)
 
+    @staticmethod
+    def to_bytes(res):
+        """Return the contents of a CXString as bytes, without decoding."""
+        return conf.get_raw_function('clang_getCString', c_char_p)(res)
+
+    @staticmethod
+    def get_bytes(name, *args):
+        """Call the libclang function returning a CXString with the given name
+        and return its result as bytes, without decoding."""
+        res = conf.get_raw_function(name, _CXString)(*args)
+        return _CXString.to_bytes(res)
+
 
 class SourceLocation(Structure):
     """
@@ -221,16 +377,21 @@ class SourceLocation(Structure):
 
     def _get_instantiation(self):
         if self._data is None:
-            f, l, c, o = c_object_p(), c_uint(), c_uint(), c_uint()
-            conf.lib.clang_getInstantiationLocation(self, byref(f), byref(l),
-                    byref(c), byref(o))
-            if f:
-                f = File(f)
-            else:
-                f = None
-            self._data = (f, int(l.value), int(c.value), int(o.value))
+            self._data = _memoize(self, 'location.instantiation',
+                                  SourceLocation._instantiation)
         return self._data
 
+    @staticmethod
+    def _instantiation(location):
+        f, l, c, o = c_object_p(), c_uint(), c_uint(), c_uint()
+        conf.lib.clang_getInstantiationLocation(location, byref(f), byref(l),
+                byref(c), byref(o))
+        if f:
+            f = File(f)
+        else:
+            f = None
+        return (f, int(l.value), int(c.value), int(o.value))
+
     @staticmethod
     def from_position(tu, file, line, column):
         """
@@ -325,22 +486,26 @@ class SourceRange(Structure):
         """Useful to detect the Token/Lexer bug"""
         if not isinstance(other, SourceLocation):
             return False
-        if other.file is None and self.start.file is None:
+        # Each of these calls into libclang, so only do it once.
+        start, end = self.start, self.end
+        if other.file is None and start.file is None:
             pass
-        elif ( self.start.file.name != other.file.name or
-               other.file.name != self.end.file.name):
-            # same file name
-            return False
+        else:
+            other_name = other.file.name
+            if (start.file.name != other_name or
+                other_name != end.file.name):
+                # same file name
+                return False
         # same file, in between lines
-        if self.start.line < other.line < self.end.line:
+        if start.line < other.line < end.line:
             return True
-        elif self.start.line == other.line:
+        elif start.line == other.line:
             # same file first line
-            if self.start.column <= other.column:
+            if start.column <= other.column:
                 return True
-        elif other.line == self.end.line:
+        elif other.line == end.line:
             # same file last line
-            if other.column <= self.end.column:
+            if other.column <= end.column:
                 return True
         return False
 
@@ -529,6 +694,12 @@ class TokenGroup(object):
         This functionality is needed multiple places in this module. We define
         it here because it seems like a logical place.
         """
+        for token in TokenGroup.get_token_array(tu, extent):
+            yield token
+
+    @staticmethod
+    def get_token_array(tu, extent):
+        """Helper method to return a TokenArray of all tokens in an extent."""
         tokens_memory = POINTER(Token)()
         tokens_count = c_uint()
 
@@ -537,23 +708,84 @@ class TokenGroup(object):
 
         count = int(tokens_count.value)
 
-        # If we get no tokens, no memory was allocated. Be sure not to return
-        # anything and potentially call a destructor on nothing.
+        # If we get no tokens, no memory was allocated. Be sure not to call a
+        # destructor on nothing.
         if count < 1:
-            return
+            return TokenArray(tu, None, (Token * 0)())
 
         tokens_array = cast(tokens_memory, POINTER(Token * count)).contents
 
         token_group = TokenGroup(tu, tokens_memory, tokens_count)
 
-        for i in xrange(0, count):
-            token = Token()
-            token.int_data = tokens_array[i].int_data
-            token.ptr_data = tokens_array[i].ptr_data
-            token._tu = tu
-            token._group = token_group
+        return TokenArray(tu, token_group, tokens_array)
 
-            yield token
+class TokenArray(object):
+    """A sequence of tokens backed directly by the libclang token buffer.
+
+    Indexing or iterating yields Token instances that share memory with the
+    buffer instead of copies. The kinds(), lengths() and offsets() methods
+    read one field of every token straight out of the buffer, without a
+    libclang call or a Token object per token.
+
+    You should not instantiate this class outside of this module; use
+    TranslationUnit.get_token_array() or Cursor.get_token_array().
+    """
+
+    # The index of the c_uint words of a Token holding the kind, raw location
+    # and length of a token. See the description of CXToken in libclang.
+    _KIND, _LOCATION, _LENGTH = 0, 1, 2
+
+    def __init__(self, tu, group, tokens):
+        self._tu = tu
+        self._group = group
+        self._tokens = tokens
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __getitem__(self, key):
+        if key < 0:
+            key += len(self._tokens)
+        if not 0 <= key < len(self._tokens):
+            raise IndexError('token index out of range')
+        token = self._tokens[key]
+        token._tu = self._tu
+        token._group = self._group
+        return token
+
+    def __iter__(self):
+        for i in xrange(len(self._tokens)):
+            yield self[i]
+
+    def _words(self, index):
+        words = array.array('I')
+        data = string_at(addressof(self._tokens), sizeof(self._tokens))
+        if hasattr(words, 'frombytes'):
+            words.frombytes(data)
+        else:
+            words.fromstring(data)
+        return words[index::sizeof(Token) // sizeof(c_uint)]
+
+    def kinds(self):
+        """Return an array with the TokenKind value of every token."""
+        return self._words(TokenArray._KIND)
+
+    def lengths(self):
+        """Return an array with the length in characters of every token."""
+        return self._words(TokenArray._LENGTH)
+
+    def offsets(self):
+        """Return an array with the file offset at which every token starts.
+
+        All tokens of an array come from a single file, so their raw
+        locations are a fixed distance from their file offsets, which is
+        established with the first token.
+        """
+        raw = self._words(TokenArray._LOCATION)
+        if not raw:
+            return raw
+        base = raw[0] - self[0].location.offset
+        return array.array('I', [r - base for r in raw])
 
 class TokenKind(object):
     """Describes a specific type of a Token."""
@@ -1393,6 +1625,11 @@ ExceptionSpecificationKind.UNPARSED = ExceptionSpecificationKind(8)
 
 ### Cursors ###
 
+# An entry reported by Cursor.walk(): a cursor, its parent and its depth below
+# the cursor the walk started from.
+CursorWalkEntry = collections.namedtuple('CursorWalkEntry',
+                                         ['cursor', 'parent', 'depth'])
+
 class Cursor(Structure):
     """
     The Cursor class represents a reference to an element within the AST. It
@@ -1513,10 +1750,20 @@ class Cursor(Structure):
     def spelling(self):
         """Return the spelling of the entity pointed at by the cursor."""
         if not hasattr(self, '_spelling'):
-            self._spelling = conf.lib.clang_getCursorSpelling(self)
+            self._spelling = _memoize(self, 'cursor.spelling',
+                                      conf.lib.clang_getCursorSpelling)
 
         return self._spelling
 
+    @property
+    def spelling_bytes(self):
+        """Return the spelling of the cursor as undecoded bytes.
+
+        This is cheaper than spelling when the result is only compared or
+        hashed.
+        """
+        return _CXString.get_bytes('clang_getCursorSpelling', self)
+
     @property
     def displayname(self):
         """
@@ -1546,10 +1793,17 @@ class Cursor(Structure):
         pointed at by the cursor.
         """
         if not hasattr(self, '_loc'):
-            self._loc = conf.lib.clang_getCursorLocation(self)
+            self._loc = _memoize(self, 'cursor.location', Cursor._location)
 
         return self._loc
 
+    @staticmethod
+    def _location(cursor):
+        location = conf.lib.clang_getCursorLocation(cursor)
+        # Let the location find the property cache of the translation unit.
+        location._tu = getattr(cursor, '_tu', None)
+        return location
+
     @property
     def extent(self):
         """
@@ -1557,7 +1811,8 @@ class Cursor(Structure):
         pointed at by the cursor.
         """
         if not hasattr(self, '_extent'):
-            self._extent = conf.lib.clang_getCursorExtent(self)
+            self._extent = _memoize(self, 'cursor.extent',
+                                    conf.lib.clang_getCursorExtent)
 
         return self._extent
 
@@ -1589,7 +1844,8 @@ class Cursor(Structure):
         Retrieve the Type (if any) of the entity pointed at by the cursor.
         """
         if not hasattr(self, '_type'):
-            self._type = conf.lib.clang_getCursorType(self)
+            self._type = _memoize(self, 'cursor.type',
+                                  conf.lib.clang_getCursorType)
 
         return self._type
 
@@ -1700,7 +1956,8 @@ class Cursor(Structure):
     def semantic_parent(self):
         """Return the semantic parent for this cursor."""
         if not hasattr(self, '_semantic_parent'):
-            self._semantic_parent = conf.lib.clang_getCursorSemanticParent(self)
+            self._semantic_parent = _memoize(self, 'cursor.semantic_parent',
+                conf.lib.clang_getCursorSemanticParent)
 
         return self._semantic_parent
 
@@ -1726,7 +1983,8 @@ class Cursor(Structure):
         representing the entity that it references.
         """
         if not hasattr(self, '_referenced'):
-            self._referenced = conf.lib.clang_getCursorReferenced(self)
+            self._referenced = _memoize(self, 'cursor.referenced',
+                                        conf.lib.clang_getCursorReferenced)
 
         return self._referenced
 
@@ -1795,6 +2053,86 @@ class Cursor(Structure):
             for descendant in child.walk_preorder():
                 yield descendant
 
+    def walk(self, kinds=None, max_depth=None, batch_size=1024):
+        """Depth-first preorder walk done in a single libclang traversal.
+
+        Unlike walk_preorder(), which issues one clang_visitChildren call per
+        node, this visits the whole subtree with one recursive visitation and
+        collects the results as it goes.
+
+        kinds is an optional iterable of CursorKind instances. When given, only
+        cursors of those kinds are reported, although the walk still descends
+        through cursors of other kinds.
+
+        max_depth limits how deep the walk descends. This cursor is at depth 0
+        and its children are at depth 1. If None, the whole subtree is walked.
+
+        Returns an iterator over lists of at most batch_size CursorWalkEntry
+        tuples of (cursor, parent, depth), in preorder. The parent is the
+        direct parent in the AST, whether or not it was reported itself, and
+        is None for this cursor.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive integer')
+
+        kind_ids = None
+        if kinds is not None:
+            kind_ids = frozenset(k.value for k in kinds)
+
+        tu = self._tu
+        batches = []
+        batch = []
+
+        def report(entry):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                batches.append(batch[:])
+                del batch[:]
+
+        if kind_ids is None or self._kind_id in kind_ids:
+            report(CursorWalkEntry(self, None, 0))
+
+        def visit(child, parent, depth):
+            if kind_ids is None or child._kind_id in kind_ids:
+                child._tu = tu
+                parent._tu = tu
+                report(CursorWalkEntry(child, parent, depth))
+
+        self._visit_subtree(visit, max_depth)
+
+        if batch:
+            batches.append(batch)
+        return iter(batches)
+
+    def _visit_subtree(self, visit, max_depth=None):
+        """Visit the descendants of this cursor with one clang_visitChildren.
+
+        visit is called as visit(child, parent, depth) for every descendant in
+        preorder, where the children of this cursor are at depth 1. The walk
+        does not descend below max_depth, if given.
+        """
+        # Cursors are plain structures, so the raw bytes of a cursor identify
+        # it cheaply. The stack holds the keys of the ancestors of the cursor
+        # being visited, with this cursor at the bottom.
+        stack = [_struct_bytes(self)]
+
+        def visitor(child, parent, data):
+            parent_key = _struct_bytes(parent)
+            while stack[-1] != parent_key:
+                stack.pop()
+            depth = len(stack)
+
+            visit(child, parent, depth)
+
+            if max_depth is not None and depth >= max_depth:
+                return 1 # continue
+            stack.append(_struct_bytes(child))
+            return 2 # recurse
+
+        if max_depth is None or max_depth > 0:
+            conf.lib.clang_visitChildren(self,
+                callbacks['cursor_visit'](visitor), None)
+
     def get_tokens(self):
         """Obtain Token instances formulating that compose this Cursor.
 
@@ -1803,6 +2141,10 @@ class Cursor(Structure):
         """
         return TokenGroup.get_tokens(self._tu, self.extent)
 
+    def get_token_array(self):
+        """Obtain a TokenArray of the tokens that compose this Cursor."""
+        return TokenGroup.get_token_array(self._tu, self.extent)
+
     def get_field_offsetof(self):
         """Returns the offsetof the FIELD_DECL pointed by this Cursor."""
         return conf.lib.clang_Cursor_getOffsetOfField(self)
@@ -2171,7 +2513,7 @@ class Type(Structure):
         example, if 'T' is a typedef for 'int', the canonical type for
         'T' would be 'int'.
         """
-        return conf.lib.clang_getCanonicalType(self)
+        return _memoize(self, 'type.canonical', conf.lib.clang_getCanonicalType)
 
     def is_const_qualified(self):
         """Determine whether a Type has the "const" qualifier set.
@@ -2306,7 +2648,12 @@ class Type(Structure):
     @property
     def spelling(self):
         """Retrieve the spelling of this Type."""
-        return conf.lib.clang_getTypeSpelling(self)
+        return _memoize(self, 'type.spelling', conf.lib.clang_getTypeSpelling)
+
+    @property
+    def spelling_bytes(self):
+        """Retrieve the spelling of this Type as undecoded bytes."""
+        return _CXString.get_bytes('clang_getTypeSpelling', self)
 
     def __eq__(self, other):
         if type(other) != type(self):
@@ -2340,6 +2687,19 @@ class _CXUnsavedFile(Structure):
     """Helper for passing unsaved file arguments."""
     _fields_ = [("name", c_char_p), ("contents", c_char_p), ('length', c_ulong)]
 
+class _CXTUResourceUsageEntry(Structure):
+    """Helper for one entry of a translation unit's resource usage."""
+    _fields_ = [("kind", c_int), ("amount", c_ulong)]
+
+class CXTUResourceUsage(Structure):
+    """Helper for retrieving the resource usage of a translation unit."""
+    _fields_ = [("data", c_void_p), ("numEntries", c_uint),
+                ("entries", POINTER(_CXTUResourceUsageEntry))]
+
+    # The range of CXTUResourceUsageKind values measured in bytes.
+    MEMORY_IN_BYTES_BEGIN = 1
+    MEMORY_IN_BYTES_END = 14
+
 # Functions calls through the python interface are rather slow. Fortunately,
 # for most symboles, we do not need to perform a function call. Their spelling
 # never changes and is consequently provided by this spelling cache.
@@ -2562,6 +2922,86 @@ class CodeCompletionResults(ClangObject):
         return DiagnosticsItr(self)
 
 
+class ParseResult(object):
+    """The outcome of parsing one compile command with Index.parse_many().
+
+    tu is the TranslationUnit when parsing in threads, and None when parsing
+    in processes. summary is what the summarize function made of the
+    translation unit, if one was used. If parsing failed, error holds the
+    message and both are None. seconds is the time spent parsing.
+    """
+
+    def __init__(self, directory, filename, args, tu, summary, error,
+                 seconds):
+        self.directory = directory
+        self.filename = filename
+        self.args = args
+        self.tu = tu
+        self.summary = summary
+        self.error = error
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "<ParseResult %r, %.3fs%s>" % (
+            self.filename, self.seconds,
+            ", error %r" % self.error if self.error else "")
+
+def summarize_translation_unit(tu):
+    """Return a picklable summary of a translation unit.
+
+    This is the default summary of Index.parse_many() in process mode: a dict
+    with the spelling of the translation unit, its diagnostics as (severity,
+    file name, line, column, spelling) tuples and the names of the files it
+    includes.
+    """
+    diagnostics = []
+    for diag in tu.diagnostics:
+        location = diag.location
+        diagnostics.append((diag.severity,
+                            location.file.name if location.file else None,
+                            location.line, location.column, diag.spelling))
+    return {'spelling' : tu.spelling,
+            'diagnostics' : diagnostics,
+            'includes' : [i.include.name for i in tu.get_includes()]}
+
+# The Index used by a parse_many() worker process.
+_worker_index = None
+
+def _parse_command(job, index=None, summarize=None):
+    """Parse one (directory, filename, args, options) job of parse_many()."""
+    directory, filename, args, options = job
+    # Drop the compiler, which is args[0], and the source file, which is
+    # passed separately. Relative paths are resolved against the directory of
+    # the command, as parsing threads cannot each change the working
+    # directory.
+    path = os.path.join(directory, filename)
+    clang_args = ['-working-directory', directory]
+    clang_args += [arg for arg in args[1:]
+                   if os.path.join(directory, arg) != path]
+
+    tu, summary, error = None, None, None
+    start = time.time()
+    try:
+        tu = TranslationUnit.from_source(path, clang_args, options=options,
+                                         index=index)
+        if summarize is not None:
+            summary = summarize(tu)
+    except TranslationUnitLoadError as e:
+        error = str(e) or 'Error parsing translation unit.'
+    seconds = time.time() - start
+    return ParseResult(directory, filename, args, tu, summary, error, seconds)
+
+def _parse_command_in_process(job_and_summarize):
+    global _worker_index
+    job, summarize = job_and_summarize
+    if _worker_index is None:
+        _worker_index = Index.create()
+    result = _parse_command(job, _worker_index,
+                            summarize or summarize_translation_unit)
+    # The translation unit cannot leave the worker process.
+    result.tu = None
+    return result
+
 class Index(ClangObject):
     """
     The Index type provides the primary interface to the Clang CIndex library,
@@ -2601,6 +3041,67 @@ class Index(ClangObject):
         return TranslationUnit.from_source(path, args, unsaved_files, options,
                                            self)
 
+    def parse_many(self, commands, workers=None, mode='thread', options=0,
+                   summarize=None):
+        """Parse many translation units concurrently.
+
+        commands is a CompilationDatabase, whose compile commands are all
+        parsed, or an iterable of CompileCommand instances or of (directory,
+        filename, arguments) tuples, where arguments starts with the compiler
+        like CompileCommand.arguments does.
+
+        workers is the number of translation units parsed at once, and
+        defaults to the number of CPUs. With mode 'thread' they are parsed
+        in threads of this process using this index; libclang runs without
+        the GIL while parsing. With mode 'process' they are parsed in worker
+        processes, and only a summary of each translation unit is sent back.
+
+        summarize is a function turning a TranslationUnit into the summary of
+        the ParseResult. In process mode it must be picklable and defaults to
+        summarize_translation_unit(); in thread mode it is optional.
+
+        options is a bitwise or of TranslationUnit.PARSE_XXX flags.
+
+        This is a generator of ParseResult instances, yielded as parsing
+        completes rather than in the order of commands.
+        """
+        import multiprocessing
+        import multiprocessing.pool
+
+        if isinstance(commands, CompilationDatabase):
+            commands = commands.getAllCompileCommands() or []
+
+        jobs = []
+        for command in commands:
+            if isinstance(command, CompileCommand):
+                command = (command.directory, command.filename,
+                           list(command.arguments))
+            directory, filename, args = command
+            jobs.append((directory, filename, list(args), options))
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        if mode == 'thread':
+            pool = multiprocessing.pool.ThreadPool(workers)
+            results = pool.imap_unordered(
+                lambda job: _parse_command(job, self, summarize), jobs)
+        elif mode == 'process':
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap_unordered(_parse_command_in_process,
+                                          [(job, summarize) for job in jobs])
+        else:
+            raise ValueError("mode must be 'thread' or 'process', not %r" %
+                             mode)
+
+        try:
+            for result in results:
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
 class TranslationUnit(ClangObject):
     """Represents a source code translation unit.
 
@@ -2640,6 +3141,12 @@ class TranslationUnit(ClangObject):
     # into the set of code completions returned from this translation unit.
     PARSE_INCLUDE_BRIEF_COMMENTS_IN_CODE_COMPLETION = 128
 
+    # The StringInterner used for strings of this translation unit, if any.
+    string_interner = None
+
+    # The PropertyCache memoizing attributes of this translation unit, if any.
+    property_cache = None
+
     @classmethod
     def from_source(cls, filename, args=None, unsaved_files=None, options=0,
                     index=None):
@@ -2748,8 +3255,47 @@ class TranslationUnit(ClangObject):
         ClangObject.__init__(self, ptr)
 
     def __del__(self):
+        if self.string_interner is not None:
+            StringInterner.active -= 1
         conf.lib.clang_disposeTranslationUnit(self)
 
+    def enable_string_interning(self, max_size=65536):
+        """Intern the strings obtained for objects of this translation unit.
+
+        Spellings of cursors, types and tokens of this translation unit are
+        then decoded once and shared, which saves time and memory when the
+        same names are requested over and over. Returns the StringInterner,
+        whose stats property reports its effectiveness.
+        """
+        if self.string_interner is None:
+            StringInterner.active += 1
+            self.string_interner = StringInterner(max_size)
+        return self.string_interner
+
+    def disable_string_interning(self):
+        """Stop interning strings of this translation unit."""
+        if self.string_interner is not None:
+            StringInterner.active -= 1
+            self.string_interner = None
+
+    def enable_property_cache(self):
+        """Memoize cursor, type and location attributes of this translation
+        unit in a shared side table.
+
+        Repeatedly asking for the spelling, location, extent, type, semantic
+        parent or referenced cursor of the same entity then only calls into
+        libclang once, even through different Cursor instances. The table is
+        invalidated by reparse(). Returns the PropertyCache, whose stats
+        property reports the hit rate.
+        """
+        if self.property_cache is None:
+            self.property_cache = PropertyCache()
+        return self.property_cache
+
+    def disable_property_cache(self):
+        """Stop memoizing attributes of this translation unit."""
+        self.property_cache = None
+
     @property
     def cursor(self):
         """Retrieve the cursor that represents the given translation unit."""
@@ -2780,6 +3326,50 @@ class TranslationUnit(ClangObject):
 
         return iter(includes)
 
+    def to_table(self):
+        """Return a CursorTable with every cursor of this translation unit.
+
+        The table is built in a single traversal of the AST and stores the
+        cursor attributes as columns, which is much more compact than keeping
+        a Cursor object per node.
+        """
+        return CursorTable.from_cursor(self.cursor)
+
+    def get_extent_index(self, table=None):
+        """Return an ExtentIndex over the cursor extents of this translation
+        unit, built from table or from a new CursorTable."""
+        if table is None:
+            table = self.to_table()
+        return ExtentIndex(table)
+
+    def get_resource_usage(self):
+        """Return the resource usage of this translation unit.
+
+        The result is a dict mapping the libclang name of each resource
+        category to the amount used.
+        """
+        lib = conf.lib
+        usage = lib.clang_getCXTUResourceUsage(self)
+        try:
+            return dict((lib.clang_getTUResourceUsageName(entry.kind),
+                         int(entry.amount))
+                        for entry in usage.entries[:usage.numEntries])
+        finally:
+            lib.clang_disposeCXTUResourceUsage(usage)
+
+    def get_memory_usage(self):
+        """Return the number of bytes of memory used by this translation
+        unit."""
+        lib = conf.lib
+        usage = lib.clang_getCXTUResourceUsage(self)
+        try:
+            return sum(int(entry.amount)
+                       for entry in usage.entries[:usage.numEntries]
+                       if CXTUResourceUsage.MEMORY_IN_BYTES_BEGIN <=
+                          entry.kind <= CXTUResourceUsage.MEMORY_IN_BYTES_END)
+        finally:
+            lib.clang_disposeCXTUResourceUsage(usage)
+
     def get_file(self, filename):
         """Obtain a File from this translation unit."""
 
@@ -2861,6 +3451,29 @@ class TranslationUnit(ClangObject):
 
         return DiagIterator(self)
 
+    def iter_diagnostics(self, min_severity=None):
+        """Generate the diagnostics of this translation unit in order.
+
+        If min_severity is given, only diagnostics with at least that
+        severity (one of the Diagnostic severity constants) are generated.
+        The severity is checked before a Diagnostic is created, so skipped
+        diagnostics cost no Python objects.
+        """
+        lib = conf.lib
+        severity_of = conf.get_raw_function('clang_getDiagnosticSeverity',
+                                            c_int, [c_object_p])
+        dispose = conf.get_raw_function('clang_disposeDiagnostic', None,
+                                        [c_object_p])
+
+        for i in xrange(int(lib.clang_getNumDiagnostics(self))):
+            ptr = lib.clang_getDiagnostic(self, i)
+            if not ptr:
+                continue
+            if min_severity is not None and severity_of(ptr) < min_severity:
+                dispose(ptr)
+                continue
+            yield Diagnostic(ptr)
+
     def reparse(self, unsaved_files=None, options=0):
         """
         Reparse an already parsed translation unit.
@@ -2884,11 +3497,13 @@ class TranslationUnit(ClangObject):
                     print(value)
                 if not isinstance(value, str):
                     raise TypeError('Unexpected unsaved file contents.')
-                unsaved_files_array[i].name = name
-                unsaved_files_array[i].contents = value
+                unsaved_files_array[i].name = b(name)
+                unsaved_files_array[i].contents = b(value)
                 unsaved_files_array[i].length = len(value)
         ptr = conf.lib.clang_reparseTranslationUnit(self, len(unsaved_files),
                 unsaved_files_array, options)
+        if self.property_cache is not None:
+            self.property_cache.invalidate()
 
     def save(self, filename):
         """Saves the TranslationUnit to a file.
@@ -2970,6 +3585,410 @@ class TranslationUnit(ClangObject):
 
         return TokenGroup.get_tokens(self, extent)
 
+    def get_token_array(self, locations=None, extent=None):
+        """Obtain a TokenArray of the tokens in this translation unit.
+
+        The range is specified as for get_tokens(). The TokenArray avoids
+        copying tokens out of the libclang buffer.
+        """
+        if locations is not None:
+            extent = SourceRange(start=locations[0], end=locations[1])
+
+        return TokenGroup.get_token_array(self, extent)
+
+class TranslationUnitPool(object):
+    """A pool of warm translation units for interactive workloads.
+
+    Editors and completion services reparse and code complete the same files
+    over and over. Parsing a file from scratch each time, or forgetting to
+    request a precompiled preamble, makes every request pay for the headers
+    of the file again. A pool keeps the translation units it parses, keyed by
+    file name and arguments, always parses them with a precompiled preamble
+    and cached completion results, and reuses them for later requests.
+
+    When the memory used by the pooled translation units exceeds
+    memory_budget bytes, the least recently used ones are dropped. The stats
+    property reports hits and misses as well as the latency of parsing,
+    reparsing and code completion.
+    """
+
+    # Options every pooled translation unit is parsed with.
+    DEFAULT_OPTIONS = (TranslationUnit.PARSE_PRECOMPILED_PREAMBLE |
+                       TranslationUnit.PARSE_CACHE_COMPLETION_RESULTS)
+
+    def __init__(self, index=None, memory_budget=None, options=0):
+        if index is None:
+            index = Index.create()
+        self.index = index
+        self.memory_budget = memory_budget
+        self.options = options | TranslationUnitPool.DEFAULT_OPTIONS
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (filename, args) -> [tu, memory usage], least recently used first.
+        self._entries = collections.OrderedDict()
+        self._latencies = dict((op, [0, 0.0, 0.0])
+                               for op in ('parse', 'reparse', 'complete'))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        filename, args = key
+        return (filename, tuple(args or ())) in self._entries
+
+    def _record(self, op, start):
+        elapsed = time.time() - start
+        latency = self._latencies[op]
+        latency[0] += 1
+        latency[1] += elapsed
+        latency[2] = max(latency[2], elapsed)
+
+    def _lookup(self, filename, args, unsaved_files):
+        key = (filename, tuple(args or ()))
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.hits += 1
+            self._entries[key] = entry
+            return key, entry, True
+
+        self.misses += 1
+        start = time.time()
+        tu = TranslationUnit.from_source(filename, list(key[1]),
+                                         unsaved_files, self.options,
+                                         self.index)
+        self._record('parse', start)
+        entry = self._entries[key] = [tu, 0]
+        self._update_memory(key, entry)
+        return key, entry, False
+
+    def _update_memory(self, key, entry):
+        if self.memory_budget is None:
+            return
+        entry[1] = entry[0].get_memory_usage()
+        total = sum(e[1] for e in self._entries.values())
+        for other in list(self._entries):
+            if total <= self.memory_budget:
+                break
+            if other == key:
+                continue
+            total -= self._entries.pop(other)[1]
+            self.evictions += 1
+
+    def get(self, filename, args=None, unsaved_files=None):
+        """Return an up-to-date TranslationUnit for filename and args.
+
+        A pooled translation unit is reparsed with unsaved_files, reusing its
+        precompiled preamble; otherwise the file is parsed and pooled.
+        """
+        key, entry, hit = self._lookup(filename, args, unsaved_files)
+        if hit:
+            start = time.time()
+            entry[0].reparse(unsaved_files)
+            self._record('reparse', start)
+            self._update_memory(key, entry)
+        return entry[0]
+
+    def code_complete(self, filename, line, column, args=None,
+                      unsaved_files=None, **kwargs):
+        """Code complete in filename at line and column.
+
+        This parses and pools the file if needed, but does not reparse a
+        pooled translation unit: code completion reads unsaved_files itself.
+        Other keyword arguments are passed to TranslationUnit.codeComplete().
+        """
+        key, entry, hit = self._lookup(filename, args, unsaved_files)
+        start = time.time()
+        results = entry[0].codeComplete(filename, line, column, unsaved_files,
+                                        **kwargs)
+        self._record('complete', start)
+        return results
+
+    def evict(self, filename, args=None):
+        """Drop the translation unit for filename and args, if pooled."""
+        return self._entries.pop((filename, tuple(args or ())),
+                                 None) is not None
+
+    def clear(self):
+        """Drop all pooled translation units."""
+        self._entries.clear()
+
+    @property
+    def memory_usage(self):
+        """The memory used by the pooled translation units, as last measured.
+
+        This is only tracked when the pool has a memory budget.
+        """
+        return sum(e[1] for e in self._entries.values())
+
+    @property
+    def stats(self):
+        """Return a dict with the pool statistics.
+
+        Besides the hit, miss and eviction counts, the 'parse', 'reparse' and
+        'complete' items hold the count, total, mean and max seconds of those
+        operations.
+        """
+        stats = {'size' : len(self._entries),
+                 'hits' : self.hits,
+                 'misses' : self.misses,
+                 'evictions' : self.evictions,
+                 'memory_usage' : self.memory_usage}
+        for op, (count, total, slowest) in self._latencies.items():
+            stats[op] = {'count' : count,
+                         'total' : total,
+                         'mean' : total / count if count else 0.0,
+                         'max' : slowest}
+        return stats
+
+class ASTCache(object):
+    """A persistent, content-addressed cache of parsed translation units.
+
+    Parsing a file whose inputs did not change since the last run is wasted
+    work when the result could be loaded from a saved AST instead. The cache
+    stores the AST of every translation unit it parses in directory, along
+    with a manifest of the inputs of the translation unit: the main file and
+    every file it includes. An entry is keyed by the libclang version, the
+    main file, the normalized compiler arguments and the parse options.
+
+    get() returns the cached translation unit, loaded with
+    TranslationUnit.from_ast_file(), as long as none of the inputs changed.
+    Inputs whose size and modification time are unchanged are trusted;
+    others are compared by content hash. When the saved ASTs exceed max_size
+    bytes, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_size=None, index=None):
+        if index is None:
+            index = Index.create()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_size = max_size
+        self.index = index
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_args(args):
+        """Drop the arguments that do not affect the AST, like -o <file>."""
+        result = []
+        skip = False
+        for arg in args:
+            if skip:
+                skip = False
+            elif arg in ('-o', '-MF', '-MT', '-MQ'):
+                skip = True
+            elif arg in ('-c', '-MD', '-MMD'):
+                pass
+            else:
+                result.append(arg)
+        return result
+
+    @staticmethod
+    def _hash_file(path):
+        import hashlib
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1 << 16), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _describe_input(path):
+        stat = os.stat(path)
+        return {'size' : stat.st_size,
+                'mtime' : stat.st_mtime,
+                'hash' : ASTCache._hash_file(path)}
+
+    def _key(self, filename, args, options):
+        import hashlib
+        import json
+
+        # Relative paths in the arguments (like -I include) are resolved
+        # against the working directory, so it is part of the key.
+        key = [conf.lib.clang_getClangVersion(), os.getcwd(),
+               os.path.abspath(filename), ASTCache.normalize_args(args),
+               options]
+        return hashlib.sha1(b(json.dumps(key))).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.ast'
+
+    def _is_current(self, manifest):
+        """Return (current, refreshed) for the inputs of manifest.
+
+        The size and modification time of inputs whose content did not
+        change are updated in manifest, and refreshed tells whether there
+        were any, so that they are not hashed again on the next use.
+        """
+        refreshed = False
+        for path, recorded in manifest['inputs'].items():
+            try:
+                stat = os.stat(path)
+                if (stat.st_size == recorded['size'] and
+                        stat.st_mtime == recorded['mtime']):
+                    continue
+                if ASTCache._hash_file(path) != recorded['hash']:
+                    return False, False
+            except (IOError, OSError):
+                return False, False
+            recorded['size'] = stat.st_size
+            recorded['mtime'] = stat.st_mtime
+            refreshed = True
+        return True, refreshed
+
+    def get(self, filename, args=None, options=0):
+        """Return a TranslationUnit for filename parsed with args.
+
+        The translation unit is loaded from the cache if its inputs did not
+        change, and parsed and added to the cache otherwise.
+        """
+        import json
+
+        args = list(args or [])
+        key = self._key(filename, args, options)
+        manifest_path, ast_path = self._paths(key)
+
+        try:
+            with open(manifest_path) as handle:
+                manifest = json.load(handle)
+        except (IOError, OSError, ValueError):
+            manifest = None
+
+        if manifest is not None:
+            current, refreshed = self._is_current(manifest)
+            if current:
+                try:
+                    tu = TranslationUnit.from_ast_file(ast_path, self.index)
+                except TranslationUnitLoadError:
+                    pass
+                else:
+                    self.hits += 1
+                    # The manifest modification time tracks the last use.
+                    if refreshed:
+                        self._write_manifest(manifest_path, manifest)
+                    else:
+                        os.utime(manifest_path, None)
+                    return tu
+            self.stale += 1
+
+        self.misses += 1
+        tu = TranslationUnit.from_source(filename, args, options=options,
+                                         index=self.index)
+        self._store(tu, filename, manifest_path, ast_path)
+        return tu
+
+    def _store(self, tu, filename, manifest_path, ast_path):
+        paths = set([os.path.abspath(filename)])
+        for inclusion in tu.get_includes():
+            paths.add(os.path.abspath(inclusion.include.name))
+
+        try:
+            inputs = dict((path, ASTCache._describe_input(path))
+                          for path in paths)
+        except (IOError, OSError):
+            return
+
+        temp_ast_path = '%s.%d.tmp' % (ast_path, os.getpid())
+        try:
+            tu.save(temp_ast_path)
+        except TranslationUnitSaveError:
+            # Translation units with errors are not worth caching.
+            if os.path.exists(temp_ast_path):
+                os.remove(temp_ast_path)
+            return
+        ASTCache._replace(temp_ast_path, ast_path)
+
+        self._write_manifest(manifest_path,
+                             {'file' : filename, 'inputs' : inputs})
+        self._evict()
+
+    @staticmethod
+    def _replace(source, destination):
+        # os.rename() fails on Windows when destination exists, and
+        # os.replace() is missing on Python 2.
+        if hasattr(os, 'replace'):
+            os.replace(source, destination)
+            return
+        try:
+            os.rename(source, destination)
+        except OSError:
+            if not os.path.exists(destination):
+                raise
+            os.remove(destination)
+            os.rename(source, destination)
+
+    @staticmethod
+    def _write_manifest(manifest_path, manifest):
+        import json
+
+        temp_manifest_path = '%s.%d.tmp' % (manifest_path, os.getpid())
+        with open(temp_manifest_path, 'w') as handle:
+            json.dump(manifest, handle)
+        ASTCache._replace(temp_manifest_path, manifest_path)
+
+    def _entries(self):
+        """Return (last use, size, key) of the cached entries."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            manifest_path, ast_path = self._paths(key)
+            try:
+                entries.append((os.path.getmtime(manifest_path),
+                                os.path.getsize(ast_path), key))
+            except OSError:
+                continue
+        return entries
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        # Keep the most recently used entry, even if it is too large alone.
+        for _, size, key in entries[:-1]:
+            if total <= self.max_size:
+                break
+            self._remove(key)
+            total -= size
+            self.evictions += 1
+
+    @property
+    def size(self):
+        """The total size in bytes of the cached ASTs."""
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        for _, _, key in self._entries():
+            self._remove(key)
+
+    @property
+    def stats(self):
+        """Return a dict with the cache statistics.
+
+        'stale' counts lookups that found an entry whose inputs changed.
+        """
+        return {'hits' : self.hits,
+                'misses' : self.misses,
+                'stale' : self.stale,
+                'evictions' : self.evictions,
+                'size' : self.size}
+
 class File(ClangObject):
     """
     The File class represents a particular source file that is part of a
@@ -2986,6 +4005,11 @@ class File(ClangObject):
         """Return the complete file and path name of the file."""
         return conf.lib.clang_getFileName(self)
 
+    @property
+    def name_bytes(self):
+        """Return the file name as undecoded bytes."""
+        return _CXString.get_bytes('clang_getFileName', self)
+
     @property
     def time(self):
         """Return the last modification time of the file."""
@@ -3025,6 +4049,250 @@ class FileInclusion(object):
         """True if the included file is the input file."""
         return self.depth == 0
 
+class CursorTable(object):
+    """A columnar snapshot of the cursors below (and including) a cursor.
+
+    Each cursor is stored as one row and every attribute as one column, so a
+    table holds a handful of flat buffers instead of one Python object per
+    cursor and attribute. Rows are in preorder; row 0 is the cursor the table
+    was built from. The columns are array.array instances:
+
+      kinds          CursorKind id
+      parents        row of the parent cursor, -1 for row 0
+      file_ids       index into file_names, -1 if there is no file
+      lines          line of the cursor location
+      columns        column of the cursor location
+      start_offsets  file offset at which the cursor extent starts
+      end_offsets    file offset at which the cursor extent ends
+      type_kinds     TypeKind id of the cursor type
+      spelling_ids   index into spellings
+
+    File names and spellings are interned: file_names and spellings hold
+    every distinct value once.
+
+    Tables are created with TranslationUnit.to_table().
+    """
+
+    column_types = [
+        ('kinds', 'i'),
+        ('parents', 'i'),
+        ('file_ids', 'i'),
+        ('lines', 'I'),
+        ('columns', 'I'),
+        ('start_offsets', 'I'),
+        ('end_offsets', 'I'),
+        ('type_kinds', 'i'),
+        ('spelling_ids', 'i'),
+    ]
+
+    def __init__(self):
+        for name, typecode in CursorTable.column_types:
+            setattr(self, name, array.array(typecode))
+        self.file_names = []
+        self.spellings = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, row):
+        """Return the CursorKind of a row."""
+        return CursorKind.from_id(self.kinds[row])
+
+    def spelling(self, row):
+        """Return the spelling of a row."""
+        return self.spellings[self.spelling_ids[row]]
+
+    def file_name(self, row):
+        """Return the file name of a row, or None if it has no file."""
+        file_id = self.file_ids[row]
+        if file_id < 0:
+            return None
+        return self.file_names[file_id]
+
+    def to_numpy(self):
+        """Return a dict mapping column names to NumPy arrays.
+
+        The arrays share memory with the columns of this table. This requires
+        NumPy to be installed.
+        """
+        import numpy
+
+        return dict((name, numpy.frombuffer(getattr(self, name),
+                                            dtype=typecode))
+                    for name, typecode in CursorTable.column_types)
+
+    @staticmethod
+    def from_cursor(cursor):
+        """Build a table from a cursor and its descendants in one traversal."""
+        lib = conf.lib
+        table = CursorTable()
+        tu = cursor._tu
+
+        file_ids = {}
+        spelling_ids = {}
+        f, l, c, o = c_object_p(), c_uint(), c_uint(), c_uint()
+
+        def add(cur, parent_row):
+            table.kinds.append(cur._kind_id)
+            table.parents.append(parent_row)
+
+            lib.clang_getInstantiationLocation(lib.clang_getCursorLocation(cur),
+                    byref(f), byref(l), byref(c), byref(o))
+            if f:
+                key = cast(f, c_void_p).value
+                file_id = file_ids.get(key)
+                if file_id is None:
+                    file_id = file_ids[key] = len(table.file_names)
+                    table.file_names.append(
+                        lib.clang_getFileName(File(cast(key, c_object_p))))
+            else:
+                file_id = -1
+            table.file_ids.append(file_id)
+            table.lines.append(l.value)
+            table.columns.append(c.value)
+
+            extent = lib.clang_getCursorExtent(cur)
+            lib.clang_getInstantiationLocation(lib.clang_getRangeStart(extent),
+                    None, None, None, byref(o))
+            table.start_offsets.append(o.value)
+            lib.clang_getInstantiationLocation(lib.clang_getRangeEnd(extent),
+                    None, None, None, byref(o))
+            table.end_offsets.append(o.value)
+
+            table.type_kinds.append(lib.clang_getCursorType(cur)._kind_id)
+
+            spelling = lib.clang_getCursorSpelling(cur)
+            spelling_id = spelling_ids.get(spelling)
+            if spelling_id is None:
+                spelling_id = spelling_ids[spelling] = len(table.spellings)
+                table.spellings.append(spelling)
+            table.spelling_ids.append(spelling_id)
+
+        # rows[d] is the row of the most recent cursor seen at depth d.
+        rows = [0]
+        add(cursor, -1)
+
+        def visit(child, parent, depth):
+            child._tu = tu
+            del rows[depth:]
+            rows.append(len(table.kinds))
+            add(child, rows[depth - 1])
+
+        cursor._visit_subtree(visit)
+        return table
+
+class ExtentIndex(object):
+    """An index answering which cursors cover a source position.
+
+    Answering "which cursor is at this offset" by checking the extent of
+    every cursor costs several libclang calls per cursor. This index is
+    built once from the extents of a CursorTable, with the rows of each file
+    sorted by start offset in arrays. A lookup then bisects to the last
+    cursor starting at or before an offset and walks up its parents, so
+    queries take O(log n) plus the nesting depth, without calling libclang.
+
+    Cursor extents are half-open offset ranges [start, end) in the file of
+    the cursor location. The index relies on the extent of a cursor lying
+    within the extent of its parent, as it does for the AST. Files can be
+    given by name or by file id of the table. Results are rows of the table.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._file_ids = dict((name, file_id)
+                              for file_id, name in enumerate(table.file_names))
+
+        rows_by_file = {}
+        for row in xrange(len(table)):
+            file_id = table.file_ids[row]
+            if file_id >= 0:
+                rows_by_file.setdefault(file_id, []).append(row)
+
+        # file id -> (sorted start offsets, matching rows). Rows with the same
+        # start stay in preorder, so the last is the innermost.
+        self._files = {}
+        starts = table.start_offsets
+        for file_id, rows in rows_by_file.items():
+            rows.sort(key=lambda row: starts[row])
+            self._files[file_id] = (array.array('I', [starts[r] for r in rows]),
+                                    array.array('i', rows))
+
+    def _file_id(self, file):
+        if isinstance(file, int):
+            return file
+        return self._file_ids.get(file, -1)
+
+    def _covers(self, row, file_id, offset):
+        table = self.table
+        return (table.file_ids[row] == file_id and
+                table.start_offsets[row] <= offset < table.end_offsets[row])
+
+    def _containing(self, file_id, offset):
+        entry = self._files.get(file_id)
+        if entry is None:
+            return
+        starts, rows = entry
+        i = bisect.bisect_right(starts, offset)
+        if i == 0:
+            return
+        row = rows[i - 1]
+        while row >= 0:
+            if self._covers(row, file_id, offset):
+                yield row
+            row = self.table.parents[row]
+
+    def innermost(self, file, offset):
+        """Return the row of the innermost cursor covering offset, or -1."""
+        for row in self._containing(self._file_id(file), offset):
+            return row
+        return -1
+
+    def innermost_many(self, file, offsets):
+        """Return an array with innermost() of every offset."""
+        file_id = self._file_id(file)
+        result = array.array('i')
+        for offset in offsets:
+            row = -1
+            for row in self._containing(file_id, offset):
+                break
+            result.append(row)
+        return result
+
+    def containing(self, file, offset):
+        """Return the rows of all cursors covering offset, innermost first."""
+        return list(self._containing(self._file_id(file), offset))
+
+    def overlapping(self, file, start, end):
+        """Return the rows of the cursors overlapping [start, end) in
+        preorder."""
+        file_id = self._file_id(file)
+        entry = self._files.get(file_id)
+        if entry is None or start >= end:
+            return []
+        starts, rows = entry
+        starts_offsets = self.table.start_offsets
+        result = [row for row in self._containing(file_id, start)
+                  if starts_offsets[row] < start]
+        result.extend(rows[bisect.bisect_left(starts, start):
+                           bisect.bisect_left(starts, end)])
+        result.sort()
+        return result
+
+    def within(self, file, start, end):
+        """Return the rows of the cursors lying within [start, end) in
+        preorder."""
+        file_id = self._file_id(file)
+        entry = self._files.get(file_id)
+        if entry is None:
+            return []
+        starts, rows = entry
+        end_offsets = self.table.end_offsets
+        result = [row for row in rows[bisect.bisect_left(starts, start):
+                                      bisect.bisect_left(starts, end)]
+                  if end_offsets[row] <= end]
+        result.sort()
+        return result
+
 class CompilationDatabaseError(Exception):
     """Represents an error that occurred when working with a CompilationDatabase
 
@@ -3174,6 +4442,11 @@ class Token(Structure):
         """
         return conf.lib.clang_getTokenSpelling(self._tu, self)
 
+    @property
+    def spelling_bytes(self):
+        """The spelling of this token as undecoded bytes."""
+        return _CXString.get_bytes('clang_getTokenSpelling', self._tu, self)
+
     @property
     def kind(self):
         """Obtain the TokenKind of the current token."""
@@ -3334,8 +4607,8 @@ functionList = [
   ("clang_disposeCodeCompleteResults",
    [CodeCompletionResults]),
 
-# ("clang_disposeCXTUResourceUsage",
-#  [CXTUResourceUsage]),
+  ("clang_disposeCXTUResourceUsage",
+   [CXTUResourceUsage]),
 
   ("clang_disposeDiagnostic",
    [Diagnostic]),
@@ -3405,6 +4678,11 @@ functionList = [
    [Diagnostic],
    c_object_p),
 
+  ("clang_getClangVersion",
+   [],
+   _CXString,
+   _CXString.from_result),
+
   ("clang_getCompletionAvailability",
    [c_void_p],
    c_int),
@@ -3497,9 +4775,9 @@ functionList = [
    _CXString,
    _CXString.from_result),
 
-# ("clang_getCXTUResourceUsage",
-#  [TranslationUnit],
-#  CXTUResourceUsage),
+  ("clang_getCXTUResourceUsage",
+   [TranslationUnit],
+   CXTUResourceUsage),
 
   ("clang_getCXXAccessSpecifier",
    [Cursor],
@@ -3954,11 +5232,41 @@ def register_functions(lib, ignore_errors):
     for f in functionList:
         register(f)
 
+class LazyLibrary(object):
+    """A libclang library instance registering function prototypes on use.
+
+    Registering every prototype of functionList up front costs a symbol
+    lookup and several attribute assignments per function, which short-lived
+    tools mostly pay for functions they never call. This wrapper instead
+    registers a function the first time it is looked up, and then caches it
+    as an attribute so later lookups are as fast as on the library itself.
+    """
+
+    def __init__(self, lib, ignore_errors):
+        self._lib = lib
+        self._ignore_errors = ignore_errors
+        self._functions = dict((item[0], item) for item in functionList)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        item = self._functions.get(name)
+        if item is not None:
+            register_function(self._lib, item, self._ignore_errors)
+        func = getattr(self._lib, name)
+        setattr(self, name, func)
+        return func
+
+    def __getitem__(self, name):
+        return self._lib[name]
+
 class Config:
     library_path = None
     library_file = None
     compatibility_check = True
     loaded = False
+    _raw_functions = {}
 
     @staticmethod
     def set_library_path(path):
@@ -3984,8 +5292,8 @@ class Config:
 
         The python bindings are only tested and evaluated with the version of
         libclang they are provided with. To ensure correct behavior a (limited)
-        compatibility check is performed when loading the bindings. This check
-        will throw an exception, as soon as it fails.
+        compatibility check is performed when a libclang function is first
+        used. This check will throw an exception, as soon as it fails.
 
         In case these bindings are used with an older version of libclang, parts
         that have been stable between releases may still work. Users of the
@@ -4004,8 +5312,8 @@ class Config:
 
     @CachedProperty
     def lib(self):
-        lib = self.get_cindex_library()
-        register_functions(lib, not Config.compatibility_check)
+        lib = LazyLibrary(self.get_cindex_library(),
+                          not Config.compatibility_check)
         Config.loaded = True
         return lib
 
@@ -4039,10 +5347,30 @@ class Config:
 
         return library
 
+    def get_raw_function(self, name, restype, argtypes=None):
+        """Return a libclang function that returns restype unconverted.
+
+        The function has the argument types registered in functionList, or
+        argtypes if given, but none of the result conversion, so callers can
+        take a fast path that the registered prototype does not offer.
+        """
+        if argtypes is not None:
+            argtypes = tuple(argtypes)
+        key = (name, restype, argtypes)
+        func = self._raw_functions.get(key)
+        if func is None:
+            func = self.lib[name]
+            if argtypes is None:
+                argtypes = getattr(self.lib, name).argtypes
+            func.argtypes = argtypes
+            func.restype = restype
+            self._raw_functions[key] = func
+        return func
+
     def function_exists(self, name):
         try:
             getattr(self.lib, name)
-        except AttributeError:
+        except (AttributeError, LibclangError):
             return False
 
         return True
@@ -4055,6 +5383,7 @@ conf = Config()
 register_enumerations()
 
 __all__ = [
+    'ASTCache',
     'Config',
     'CodeCompletionResults',
     'CompilationDatabase',
@@ -4062,16 +5391,24 @@ __all__ = [
     'CompileCommand',
     'CursorKind',
     'Cursor',
+    'CursorTable',
+    'CursorWalkEntry',
     'Diagnostic',
+    'ExtentIndex',
     'File',
     'FixIt',
     'Index',
+    'ParseResult',
+    'PropertyCache',
     'SourceLocation',
     'SourceRange',
+    'StringInterner',
+    'TokenArray',
     'TokenKind',
     'Token',
     'TranslationUnitLoadError',
     'TranslationUnit',
+    'TranslationUnitPool',
     'TypeKind',
     'Type',
 ]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+#===- cindex-bench.py - cindex/Python Benchmarks -------------*- python -*--===#
+#
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+#
+#===------------------------------------------------------------------------===#
+
+"""
+A simple command line tool for timing common operations of the Clang Index
+Library Python bindings on a real source file.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+def best_of(repeat, func):
+    """Run func repeat times and return (best seconds, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+# Run in a fresh interpreter by bench_startup, with the clang arguments as
+# command line arguments.
+startup_script = """
+import sys, time
+start = time.time()
+import clang.cindex
+imported = time.time()
+index = clang.cindex.Index.create()
+tu = index.parse(None, sys.argv[1:])
+parsed = time.time()
+print('%r %r' % (imported - start, parsed - imported))
+"""
+
+def bench_startup(tu, opts, args):
+    env = dict(os.environ)
+    path = os.path.dirname(os.path.dirname(os.path.abspath(
+        sys.modules['clang'].__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [path] + [p for p in [env.get('PYTHONPATH')] if p])
+
+    def run():
+        start = time.time()
+        output = subprocess.check_output(
+            [sys.executable, '-c', startup_script] + args, env=env)
+        total = time.time() - start
+        imported, parsed = [float(x) for x in output.split()]
+        return total, imported, parsed
+
+    runs = [run() for _ in range(opts.repeat)]
+    return [('startup: process', (min(r[0] for r in runs), '')),
+            ('startup: import', (min(r[1] for r in runs), '')),
+            ('startup: first parse', (min(r[2] for r in runs), ''))]
+
+def bench_walk(tu, opts, args):
+    def preorder():
+        return sum(1 for _ in tu.cursor.walk_preorder())
+
+    def walk():
+        return sum(len(batch) for batch in tu.cursor.walk())
+
+    return [('walk_preorder', best_of(opts.repeat, preorder)),
+            ('walk', best_of(opts.repeat, walk))]
+
+benchmarks = {
+    'startup' : bench_startup,
+    'walk' : bench_walk,
+}
+
+def main():
+    from clang.cindex import Index
+
+    from optparse import OptionParser, OptionGroup
+
+    parser = OptionParser("usage: %prog [options] {filename} [clang-args*]")
+    parser.add_option("", "--benchmark", dest="benchmarks",
+                      help="Benchmark to run (one of: %s; default: all)" %
+                      ", ".join(sorted(benchmarks)),
+                      metavar="NAME", action="append", default=[])
+    parser.add_option("", "--repeat", dest="repeat",
+                      help="Report the best of N runs",
+                      metavar="N", type=int, default=3)
+    parser.disable_interspersed_args()
+    (opts, args) = parser.parse_args()
+
+    if len(args) == 0:
+        parser.error('invalid number arguments')
+    for name in opts.benchmarks:
+        if name not in benchmarks:
+            parser.error('unknown benchmark: %s' % name)
+
+    index = Index.create()
+    tu = index.parse(None, args)
+    if not tu:
+        parser.error("unable to load input")
+
+    for name in sorted(opts.benchmarks or benchmarks):
+        for label, (seconds, count) in benchmarks[name](tu, opts, args):
+            print('%-24s %10.4fs  %s' % (label, seconds, count))
+
+if __name__ == '__main__':
+    main()
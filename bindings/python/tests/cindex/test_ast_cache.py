@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from clang.cindex import ASTCache
+from clang.cindex import TranslationUnit
+
+def make_sources(directory):
+    header = os.path.join(directory, 'header.h')
+    source = os.path.join(directory, 'source.c')
+    with open(header, 'w') as f:
+        f.write('int from_header(void);\n')
+    with open(source, 'w') as f:
+        f.write('#include "header.h"\nint main(void) { return 0; }\n')
+    return header, source
+
+def spellings(tu):
+    return [c.spelling for c in tu.cursor.get_children()]
+
+def test_normalize_args():
+    args = ['-DX=1', '-c', '-o', 'out.o', '-MD', '-MF', 'out.d', '-I.']
+    assert ASTCache.normalize_args(args) == ['-DX=1', '-I.']
+
+def test_cache_hit_and_invalidation():
+    directory = tempfile.mkdtemp()
+    try:
+        header, source = make_sources(directory)
+        cache = ASTCache(os.path.join(directory, 'cache'))
+
+        tu = cache.get(source, ['-c', '-o', 'a.o'])
+        assert isinstance(tu, TranslationUnit)
+        assert 'from_header' in spellings(tu)
+        assert cache.stats['misses'] == 1
+        assert cache.size > 0
+
+        # The output file does not matter.
+        tu = cache.get(source, ['-c', '-o', 'b.o'])
+        assert 'from_header' in spellings(tu)
+        assert cache.stats['hits'] == 1
+
+        # A different define is a different entry.
+        cache.get(source, ['-DOTHER'])
+        assert cache.stats['misses'] == 2
+
+        # Changing an included file invalidates the entry.
+        time.sleep(0.01)
+        with open(header, 'w') as f:
+            f.write('int changed_header(void);\n')
+        tu = cache.get(source, ['-c', '-o', 'a.o'])
+        assert 'changed_header' in spellings(tu)
+        assert cache.stats['stale'] == 1
+        assert cache.stats['misses'] == 3
+    finally:
+        shutil.rmtree(directory)
+
+def test_cache_eviction():
+    directory = tempfile.mkdtemp()
+    try:
+        header, source = make_sources(directory)
+        cache = ASTCache(os.path.join(directory, 'cache'), max_size=1)
+
+        cache.get(source, ['-DONE'])
+        cache.get(source, ['-DTWO'])
+        assert cache.stats['evictions'] == 1
+
+        cache.clear()
+        assert cache.size == 0
+    finally:
+        shutil.rmtree(directory)
+
+def test_cache_refreshes_touched_inputs():
+    directory = tempfile.mkdtemp()
+    try:
+        header, source = make_sources(directory)
+        cache = ASTCache(os.path.join(directory, 'cache'))
+        cache.get(source)
+
+        # Touching an input without changing it keeps the entry, and its
+        # new modification time is recorded.
+        time.sleep(0.01)
+        os.utime(header, None)
+        cache.get(source)
+        assert cache.stats['hits'] == 1
+        manifest_path = [os.path.join(cache.directory, name)
+                         for name in os.listdir(cache.directory)
+                         if name.endswith('.json')][0]
+        with open(manifest_path) as f:
+            recorded = json.load(f)['inputs'][os.path.abspath(header)]
+        assert recorded['mtime'] == os.stat(header).st_mtime
+    finally:
+        shutil.rmtree(directory)
+
+def test_cache_key_includes_working_directory():
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        header, source = make_sources(directory)
+        other = os.path.join(directory, 'other')
+        os.mkdir(other)
+        cache = ASTCache(os.path.join(directory, 'cache'))
+
+        # The same relative include path means different directories.
+        os.chdir(directory)
+        cache.get(source, ['-I', 'include'])
+        os.chdir(other)
+        cache.get(source, ['-I', 'include'])
+        assert cache.stats['misses'] == 2
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
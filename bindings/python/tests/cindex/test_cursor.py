@@ -468,3 +468,73 @@ def test_mangled_name():
     # [c-index-test handles this by running the source through clang, emitting
     #  an AST file and running libclang on that AST file]
     assert foo.mangled_name in ('_Z3fooii', '__Z3fooii', '?foo@@YAHHH')
+
+def test_walk():
+    """Ensure Cursor.walk matches walk_preorder in a single traversal."""
+    tu = get_tu(kInput)
+
+    expected = list(tu.cursor.walk_preorder())
+    entries = [e for batch in tu.cursor.walk(batch_size=4) for e in batch]
+
+    assert len(entries) == len(expected)
+    for entry, cursor in zip(entries, expected):
+        assert entry.cursor == cursor
+        assert entry.cursor.translation_unit is not None
+
+    assert entries[0].cursor == tu.cursor
+    assert entries[0].parent is None
+    assert entries[0].depth == 0
+
+    s0 = [e for e in entries if e.cursor.spelling == 's0'][0]
+    assert s0.depth == 1
+    assert s0.parent == tu.cursor
+
+    a = [e for e in entries if e.cursor.spelling == 'a'][0]
+    assert a.depth == 2
+    assert a.parent == s0.cursor
+
+def test_walk_batches():
+    """Ensure Cursor.walk honors batch_size."""
+    tu = get_tu(kInput)
+
+    batches = list(tu.cursor.walk(batch_size=3))
+    assert len(batches) > 1
+    for batch in batches[:-1]:
+        assert len(batch) == 3
+    assert 0 < len(batches[-1]) <= 3
+
+def test_walk_filters():
+    """Ensure Cursor.walk filters by kind and depth."""
+    tu = get_tu(kInput)
+
+    fields = [e for batch in tu.cursor.walk(kinds=[CursorKind.FIELD_DECL])
+              for e in batch]
+    assert [e.cursor.spelling for e in fields] == ['a', 'b']
+    for entry in fields:
+        assert entry.depth == 2
+        assert entry.parent.spelling == 's0'
+
+    top = [e for batch in tu.cursor.walk(max_depth=1) for e in batch]
+    assert len(top) == 4
+    assert [e.depth for e in top] == [0, 1, 1, 1]
+
+    variables = [e for batch in tu.cursor.walk(kinds=[CursorKind.VAR_DECL],
+                                               max_depth=2)
+                 for e in batch]
+    assert variables == []
+
+def test_walk_nested_max_depth():
+    """Ensure Cursor.walk tracks the parents of a nested TU.
+
+    The ancestors are identified by the raw bytes of the cursors, which
+    differ from bytes(cursor) on Python 2.
+    """
+    tu = get_tu('namespace a { namespace b { namespace c { int x; } } '
+                'int y; } int z;', lang='cpp')
+
+    entries = [e for batch in tu.cursor.walk(max_depth=3) for e in batch]
+    assert [(e.cursor.spelling, e.depth) for e in entries] == [
+        (tu.cursor.spelling, 0), ('a', 1), ('b', 2), ('c', 3), ('y', 2),
+        ('z', 1)]
+    assert [e.parent.spelling for e in entries[1:]] == [
+        tu.cursor.spelling, 'a', 'b', 'a', tu.cursor.spelling]
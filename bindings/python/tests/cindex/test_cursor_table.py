@@ -0,0 +1,109 @@
+from clang.cindex import CursorKind
+from clang.cindex import CursorTable
+from clang.cindex import TypeKind
+from .util import get_tu
+
+kInput = """\
+struct s0 {
+  int a;
+  int b;
+};
+
+int f0(int a) {
+  return a;
+}
+"""
+
+def test_to_table():
+    """Ensure TranslationUnit.to_table matches the cursor attributes."""
+    tu = get_tu(kInput)
+    table = tu.to_table()
+    assert isinstance(table, CursorTable)
+
+    cursors = list(tu.cursor.walk_preorder())
+    assert len(table) == len(cursors)
+
+    for row, cursor in enumerate(cursors):
+        assert table.kind(row) == cursor.kind
+        assert table.spelling(row) == cursor.spelling
+        assert table.type_kinds[row] == cursor.type.kind.value
+        if row == 0:
+            continue
+        assert table.file_name(row) == cursor.location.file.name
+        assert table.lines[row] == cursor.location.line
+        assert table.columns[row] == cursor.location.column
+        assert table.start_offsets[row] == cursor.extent.start.offset
+        assert table.end_offsets[row] == cursor.extent.end.offset
+
+def test_to_table_parents():
+    """Ensure parent rows of a CursorTable are correct."""
+    tu = get_tu(kInput)
+    table = tu.to_table()
+
+    assert table.parents[0] == -1
+    assert table.kind(0) == CursorKind.TRANSLATION_UNIT
+
+    rows = dict((table.spelling(i), i) for i in range(len(table))
+                if table.kind(i) == CursorKind.FIELD_DECL)
+    assert sorted(rows) == ['a', 'b']
+    for row in rows.values():
+        parent = table.parents[row]
+        assert table.kind(parent) == CursorKind.STRUCT_DECL
+        assert table.spelling(parent) == 's0'
+        assert table.parents[parent] == 0
+        assert table.type_kinds[row] == TypeKind.INT.value
+
+def test_to_table_interning():
+    """Ensure file names and spellings are stored once."""
+    tu = get_tu(kInput)
+    table = tu.to_table()
+
+    assert table.file_names == ['t.c']
+    assert len(set(table.spellings)) == len(table.spellings)
+    a_rows = [i for i in range(len(table)) if table.spelling(i) == 'a']
+    assert len(a_rows) > 1
+    assert len(set(table.spelling_ids[i] for i in a_rows)) == 1
+
+def test_extent_index():
+    """Ensure ExtentIndex finds the cursors covering an offset."""
+    tu = get_tu(kInput)
+    table = tu.to_table()
+    index = tu.get_extent_index(table)
+
+    # Offset of 'a' in 'return a;'.
+    offset = kInput.index('return a') + len('return ')
+    row = index.innermost('t.c', offset)
+    assert row >= 0
+    assert table.kind(row) == CursorKind.DECL_REF_EXPR
+    assert table.spelling(row) == 'a'
+
+    kinds = [table.kind(r) for r in index.containing('t.c', offset)]
+    assert kinds[0] == CursorKind.DECL_REF_EXPR
+    assert CursorKind.RETURN_STMT in kinds
+    assert kinds[-1] == CursorKind.FUNCTION_DECL
+
+    cursor = tu.cursor.from_location(tu, tu.get_location('t.c', offset))
+    assert cursor.spelling == table.spelling(row)
+
+    assert index.innermost('t.c', len(kInput) + 10) == -1
+    assert index.innermost('nonexistent.c', 0) == -1
+
+def test_extent_index_batch_and_ranges():
+    """Ensure ExtentIndex batch, overlap and containment queries work."""
+    tu = get_tu(kInput)
+    table = tu.to_table()
+    index = tu.get_extent_index(table)
+
+    offsets = [kInput.index('int a'), kInput.index('f0')]
+    rows = index.innermost_many('t.c', offsets)
+    assert list(rows) == [index.innermost('t.c', o) for o in offsets]
+
+    s0_end = kInput.index('};') + 1
+    within = [table.spelling(r) for r in index.within('t.c', 0, s0_end)]
+    assert within == ['s0', 'a', 'b']
+
+    body = kInput.index('{\n  return')
+    overlapping = [table.kind(r) for r in index.overlapping('t.c', body,
+                                                              body + 1)]
+    assert overlapping == [CursorKind.FUNCTION_DECL,
+                           CursorKind.COMPOUND_STMT]
@@ -92,3 +92,15 @@ def test_diagnostic_children():
     assert children[0].spelling.endswith('declared here')
     assert children[0].location.line == 1
     assert children[0].location.column == 1
+
+def test_iter_diagnostics():
+    tu = get_tu('int f0() {}\nint f1() { return x; }\n')
+    diags = list(tu.iter_diagnostics())
+    assert len(diags) == len(tu.diagnostics) == 2
+    assert diags[0].severity == Diagnostic.Warning
+    assert diags[1].severity == Diagnostic.Error
+
+    errors = list(tu.iter_diagnostics(min_severity=Diagnostic.Error))
+    assert len(errors) == 1
+    assert errors[0].location.line == 2
+    assert 'undeclared identifier' in errors[0].spelling
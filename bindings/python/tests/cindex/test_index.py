@@ -13,3 +13,45 @@ def test_parse():
     assert isinstance(index, Index)
     tu = index.parse(os.path.join(kInputsDir, 'hello.cpp'))
     assert isinstance(tu, TranslationUnit)
+
+def test_parse_many_threads():
+    index = Index.create()
+    commands = [(kInputsDir, 'include.cpp', ['clang++', '-c', 'include.cpp']),
+                (kInputsDir, 'parse_arguments.c',
+                 ['clang', '-DDECL_ONE=a', '-DDECL_TWO=b', '-c',
+                  'parse_arguments.c'])]
+    results = list(index.parse_many(commands, workers=2))
+    assert len(results) == 2
+
+    by_name = dict((r.filename, r) for r in results)
+    assert sorted(by_name) == ['include.cpp', 'parse_arguments.c']
+    for result in results:
+        assert result.error is None
+        assert isinstance(result.tu, TranslationUnit)
+        assert result.seconds >= 0
+
+    tu = by_name['parse_arguments.c'].tu
+    spellings = [c.spelling for c in tu.cursor.get_children()]
+    assert spellings[-2:] == ['a', 'b']
+
+def test_parse_many_processes():
+    index = Index.create()
+    commands = [(kInputsDir, 'include.cpp', ['clang++', '-c', 'include.cpp'])]
+    results = list(index.parse_many(commands, workers=1, mode='process'))
+    assert len(results) == 1
+
+    result = results[0]
+    assert result.error is None
+    assert result.tu is None
+    assert result.summary['spelling'].endswith('include.cpp')
+    includes = [os.path.basename(i) for i in result.summary['includes']]
+    assert 'header1.h' in includes
+
+def test_parse_many_bad_mode():
+    index = Index.create()
+    try:
+        list(index.parse_many([], mode='fork'))
+    except ValueError:
+        pass
+    else:
+        assert False
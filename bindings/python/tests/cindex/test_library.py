@@ -0,0 +1,16 @@
+from clang.cindex import LazyLibrary
+from clang.cindex import conf
+
+def test_lazy_registration():
+    """Ensure function prototypes are registered on first use."""
+    lib = conf.lib
+    assert isinstance(lib, LazyLibrary)
+
+    func = lib.clang_getNullCursor
+    assert 'clang_getNullCursor' in vars(lib)
+    assert lib.clang_getNullCursor is func
+    assert func.restype is not None
+
+def test_function_exists():
+    assert conf.function_exists('clang_createIndex')
+    assert not conf.function_exists('clang_noSuchFunction')
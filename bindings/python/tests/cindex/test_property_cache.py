@@ -0,0 +1,82 @@
+import ctypes
+
+from clang.cindex import PropertyCache
+from .util import get_cursor
+from .util import get_tu
+
+kInput = """\
+int a;
+int f(void) { return a; }
+"""
+
+def test_property_cache_shared():
+    """Ensure attributes are shared between cursors for the same entity."""
+    tu = get_tu(kInput)
+    cache = tu.enable_property_cache()
+    assert isinstance(cache, PropertyCache)
+    assert tu.enable_property_cache() is cache
+
+    first = get_cursor(tu, 'f')
+    second = get_cursor(tu, 'f')
+    assert first is not second
+
+    assert first.spelling == 'f'
+    assert first.type.spelling == 'int (void)'
+    assert first.location.line == 2
+    misses = cache.misses
+
+    assert second.spelling == 'f'
+    assert second.type.spelling == 'int (void)'
+    assert second.location.line == 2
+    assert second.extent.start.line == 2
+    assert cache.misses > misses
+    assert cache.hits >= 3
+
+    stats = cache.stats
+    assert stats['size'] == len(cache)
+    assert 0.0 < stats['hit_rate'] < 1.0
+
+def test_property_cache_referenced():
+    """Ensure memoized cursors still compare correctly."""
+    tu = get_tu(kInput)
+    tu.enable_property_cache()
+
+    a = get_cursor(tu, 'a')
+    refs = [c for c in tu.cursor.walk_preorder() if c.spelling == 'a'
+            and c != a]
+    assert len(refs) > 0
+    for ref in refs:
+        assert ref.referenced == a
+        assert ref.referenced.spelling == 'a'
+
+def test_property_cache_reparse():
+    """Ensure reparsing invalidates the property cache."""
+    tu = get_tu(kInput)
+    cache = tu.enable_property_cache()
+
+    assert get_cursor(tu, 'f').spelling == 'f'
+    assert len(cache) > 0
+
+    tu.reparse()
+    assert len(cache) == 0
+    assert cache.stats['invalidations'] == 1
+    assert get_cursor(tu, 'f').spelling == 'f'
+
+    tu.disable_property_cache()
+    assert tu.property_cache is None
+
+def test_property_cache_key():
+    """Ensure entries are keyed by the content of the structure."""
+    class Pair(ctypes.Structure):
+        _fields_ = [('x', ctypes.c_int), ('y', ctypes.c_int)]
+
+    cache = PropertyCache()
+    compute = lambda pair: pair.x + pair.y
+
+    assert cache.get(Pair(1, 2), 'sum', compute) == 3
+    # An equal structure in another object hits.
+    assert cache.get(Pair(1, 2), 'sum', compute) == 3
+    assert (cache.hits, cache.misses) == (1, 1)
+    # A different structure, maybe at the same address, misses.
+    assert cache.get(Pair(2, 2), 'sum', compute) == 4
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,60 @@
+from clang.cindex import StringInterner
+from .util import get_cursor
+from .util import get_tu
+
+kInput = """\
+int a;
+int b;
+int f(int a, int b) { return a + b; }
+"""
+
+def test_interner_bounded():
+    """Ensure StringInterner stops growing at its maximum size."""
+    interner = StringInterner(max_size=2)
+    assert interner.intern(b'int') == 'int'
+    assert interner.intern(b'int') is interner.intern(b'int')
+    assert interner.intern(b'a') == 'a'
+    assert interner.intern(b'b') == 'b'
+    assert len(interner) == 2
+
+    stats = interner.stats
+    assert stats['size'] == 2
+    assert stats['max_size'] == 2
+    assert stats['hits'] == 2
+    assert stats['misses'] == 3
+
+    interner.clear()
+    assert len(interner) == 0
+    assert interner.stats['hits'] == 0
+
+def test_tu_string_interning():
+    """Ensure spellings are shared once interning is enabled."""
+    tu = get_tu(kInput)
+    interner = tu.enable_string_interning()
+    assert tu.enable_string_interning() is interner
+
+    spellings = [c.spelling for c in tu.cursor.walk_preorder()
+                 if c.spelling == 'a']
+    assert len(spellings) > 1
+    for spelling in spellings[1:]:
+        assert spelling is spellings[0]
+
+    types = [c.type.spelling for c in tu.cursor.get_children()]
+    assert types[0] == 'int'
+    assert types[0] is types[1]
+    assert interner.stats['hits'] > 0
+
+    tu.disable_string_interning()
+    assert tu.string_interner is None
+    assert get_cursor(tu, 'f').spelling == 'f'
+
+def test_spelling_bytes():
+    """Ensure the undecoded spelling accessors match the str ones."""
+    tu = get_tu(kInput)
+    f = get_cursor(tu, 'f')
+    assert f.spelling_bytes == b'f'
+    assert f.type.spelling_bytes == b'int (int, int)'
+    assert f.location.file.name_bytes == b't.c'
+
+    tokens = list(f.get_tokens())
+    assert [t.spelling_bytes for t in tokens[:2]] == [b'int', b'f']
@@ -50,3 +50,30 @@ def test_token_extent():
 
     eq_(extent.start.offset, 4)
     eq_(extent.end.offset, 7)
+
+def test_token_array():
+    """Ensure TokenArray matches the Token instances."""
+    tu = get_tu('int foo = 10;')
+    r = tu.get_extent('t.c', (0, 13))
+
+    tokens = list(tu.get_tokens(extent=r))
+    array = tu.get_token_array(extent=r)
+    eq_(len(array), len(tokens))
+    eq_(len(array), 5)
+
+    eq_([t.spelling for t in array], [t.spelling for t in tokens])
+    eq_(array[1].spelling, 'foo')
+    eq_(array[-1].spelling, ';')
+    eq_(list(array.kinds()), [t.kind.value for t in tokens])
+    eq_(list(array.offsets()), [t.location.offset for t in tokens])
+    eq_(list(array.offsets()), [0, 4, 8, 10, 12])
+    eq_(list(array.lengths()), [3, 3, 1, 2, 1])
+
+def test_token_array_cursor():
+    """Ensure Cursor.get_token_array works."""
+    tu = get_tu('int foo = 10;')
+    foo = [c for c in tu.cursor.get_children() if c.spelling == 'foo'][0]
+
+    array = foo.get_token_array()
+    eq_([t.spelling for t in array], [t.spelling for t in foo.get_tokens()])
+    ok_(len(array) > 0)
@@ -0,0 +1,70 @@
+from clang.cindex import TranslationUnit
+from clang.cindex import TranslationUnitPool
+
+kSource = """
+int test1;
+void test2(void);
+
+void f() {
+
+}
+"""
+
+def test_memory_usage():
+    tu = TranslationUnit.from_source('fake.c', unsaved_files=[('fake.c',
+                                                                kSource)])
+    usage = tu.get_resource_usage()
+    assert len(usage) > 0
+    assert tu.get_memory_usage() > 0
+
+def test_pool_reuses_translation_units():
+    pool = TranslationUnitPool()
+    files = [('fake.c', kSource)]
+
+    tu = pool.get('fake.c', ['-std=c99'], unsaved_files=files)
+    assert isinstance(tu, TranslationUnit)
+    assert pool.get('fake.c', ['-std=c99'], unsaved_files=files) is tu
+    assert pool.get('fake.c', ['-std=c89'], unsaved_files=files) is not tu
+    assert len(pool) == 2
+    assert ('fake.c', ['-std=c99']) in pool
+
+    stats = pool.stats
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['parse']['count'] == 2
+    assert stats['reparse']['count'] == 1
+    assert stats['reparse']['max'] >= stats['reparse']['mean']
+
+    assert pool.evict('fake.c', ['-std=c89'])
+    assert not pool.evict('fake.c', ['-std=c89'])
+    assert len(pool) == 1
+
+def test_pool_code_complete():
+    pool = TranslationUnitPool()
+    files = [('fake.c', kSource)]
+
+    for _ in range(2):
+        cr = pool.code_complete('fake.c', 6, 1, ['-std=c99'],
+                                unsaved_files=files)
+        assert cr is not None
+        completions = [str(c) for c in cr.results]
+        assert any('test1' in c for c in completions)
+
+    stats = pool.stats
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+    assert stats['complete']['count'] == 2
+    assert stats['reparse']['count'] == 0
+
+def test_pool_memory_budget():
+    pool = TranslationUnitPool(memory_budget=1)
+    files = [('fake.c', kSource)]
+
+    pool.get('fake.c', ['-DONE'], unsaved_files=files)
+    assert pool.memory_usage > 1
+    pool.get('fake.c', ['-DTWO'], unsaved_files=files)
+
+    # Only the most recently used translation unit survives the budget.
+    assert len(pool) == 1
+    assert ('fake.c', ['-DTWO']) in pool
+    assert pool.stats['evictions'] == 1
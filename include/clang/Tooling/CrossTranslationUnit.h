@@ -18,6 +18,10 @@
 #include "llvm/ADT/SmallPtrSet.h"
 #include "llvm/ADT/StringMap.h"
 
+namespace llvm {
+class MemoryBuffer;
+}
+
 namespace clang {
 class CompilerInstance;
 class ASTContext;
@@ -37,7 +41,9 @@ namespace tooling {
 /// The loaded definition will be merged back to the original AST using the
 /// AST Importer.
 /// In order to use this class, an index file is required that describes
-/// the locations of the AST files for each function definition.
+/// the locations of the AST files for each function definition. When the
+/// indexed (".idx") variant of the index file exists, it is memory mapped and
+/// searched with binary search instead of reading the text index file.
 ///
 /// Note that this class also implements caching.
 class CrossTranslationUnit {
@@ -77,6 +83,8 @@ private:
   llvm::StringMap<std::unique_ptr<clang::ASTUnit>> FileASTUnitMap;
   llvm::StringMap<clang::ASTUnit *> FunctionAstUnitMap;
   llvm::StringMap<std::string> FunctionFileMap;
+  std::unique_ptr<llvm::MemoryBuffer> FunctionIndex;
+  bool FunctionMapLoaded = false;
   llvm::DenseMap<TranslationUnitDecl *, std::unique_ptr<ASTImporter>>
       ASTUnitImporterMap;
   llvm::SmallPtrSet<const FunctionDecl *, 8> InvalidFunctions;
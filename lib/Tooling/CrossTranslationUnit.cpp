@@ -25,6 +25,8 @@
 #include "clang/Tooling/Tooling.h"
 #include "llvm/ADT/Statistic.h"
 #include "llvm/ADT/Triple.h"
+#include "llvm/Support/Endian.h"
+#include "llvm/Support/MemoryBuffer.h"
 #include "llvm/Support/Path.h"
 #include "llvm/Support/raw_ostream.h"
 #include <fstream>
@@ -41,6 +43,76 @@ STATISTIC(NumGetCTUSuccess, "The # of getCTUDefinition successfully return the "
                             "requested function's body");
 STATISTIC(NumUnsupportedNodeFound, "The # of imports when the ASTImporter "
                                    "encountered an unsupported AST Node");
+
+// The indexed function map, written by xtu-build next to the text map. The
+// integers are little-endian. The header has the magic, the version, the
+// count and offset of the entry table and of the AST path table. Both tables
+// have 16 byte records: the offset (u64) and the length (u32) of a string,
+// and for the entries the index of the AST path (u32). The entries are
+// sorted by the bytes of the function names.
+const char FunctionIndexMagic[] = "XTUFNMAP";
+const uint32_t FunctionIndexVersion = 1;
+const size_t FunctionIndexHeaderSize = 48;
+const size_t FunctionIndexRecordSize = 16;
+
+bool isTableInBounds(StringRef Data, uint64_t Count, uint64_t Offset) {
+  return Offset <= Data.size() &&
+         Count <= (Data.size() - Offset) / FunctionIndexRecordSize;
+}
+
+/// Checks the header of an indexed function map, and that its tables are
+/// within the file.
+bool isValidFunctionIndex(StringRef Data) {
+  using namespace llvm::support::endian;
+  if (Data.size() < FunctionIndexHeaderSize ||
+      !Data.startswith(FunctionIndexMagic) ||
+      read32le(Data.data() + 8) != FunctionIndexVersion)
+    return false;
+  return isTableInBounds(Data, read64le(Data.data() + 16),
+                         read64le(Data.data() + 24)) &&
+         isTableInBounds(Data, read64le(Data.data() + 32),
+                         read64le(Data.data() + 40));
+}
+
+/// Returns the string referred by a record of an indexed function map.
+StringRef getFunctionIndexString(StringRef Data, const char *Record) {
+  using namespace llvm::support::endian;
+  uint64_t Offset = read64le(Record);
+  uint32_t Length = read32le(Record + 8);
+  if (Offset > Data.size() || Length > Data.size() - Offset)
+    return StringRef();
+  return Data.substr(Offset, Length);
+}
+
+/// Looks up the AST file of a function in an indexed function map with
+/// binary search. Returns an empty string when the function is not found,
+/// otherwise \p EntryIndex is set to the index of its entry.
+StringRef lookupFunctionIndex(StringRef Data, StringRef FunctionName,
+                              uint64_t &EntryIndex) {
+  using namespace llvm::support::endian;
+  const char *Base = Data.data();
+  uint64_t Low = 0, High = read64le(Base + 16);
+  const char *Entries = Base + read64le(Base + 24);
+  while (Low < High) {
+    uint64_t Middle = Low + (High - Low) / 2;
+    const char *Entry = Entries + Middle * FunctionIndexRecordSize;
+    int Compare = getFunctionIndexString(Data, Entry).compare(FunctionName);
+    if (Compare < 0) {
+      Low = Middle + 1;
+    } else if (Compare > 0) {
+      High = Middle;
+    } else {
+      uint32_t PathIndex = read32le(Entry + 12);
+      if (PathIndex >= read64le(Base + 32))
+        return StringRef();
+      EntryIndex = Middle;
+      const char *Paths = Base + read64le(Base + 40);
+      return getFunctionIndexString(
+          Data, Paths + PathIndex * FunctionIndexRecordSize);
+    }
+  }
+  return StringRef();
+}
 }
 
 namespace clang {
@@ -94,7 +166,38 @@ const FunctionDecl *CrossTranslationUnit::getCrossTUDefinition(
   ASTUnit *Unit = nullptr;
   auto FnUnitCacheEntry = FunctionAstUnitMap.find(LookupFnName);
   if (FnUnitCacheEntry == FunctionAstUnitMap.end()) {
-    if (FunctionFileMap.empty()) {
+    SmallString<256> IndexedFunctionMap = CrossTUDir;
+    llvm::sys::path::append(IndexedFunctionMap, IndexName);
+    llvm::sys::path::replace_extension(IndexedFunctionMap, "idx");
+    if (!FunctionMapLoaded) {
+      auto Buffer = llvm::MemoryBuffer::getFile(
+          IndexedFunctionMap, /*FileSize=*/-1,
+          /*RequiresNullTerminator=*/false);
+      if (Buffer && isValidFunctionIndex((*Buffer)->getBuffer())) {
+        FunctionIndex = std::move(*Buffer);
+        FunctionMapLoaded = true;
+      }
+    }
+    if (FunctionIndex) {
+      uint64_t EntryIndex = 0;
+      StringRef FileName = lookupFunctionIndex(FunctionIndex->getBuffer(),
+                                               LookupFnName, EntryIndex);
+      if (!FileName.empty()) {
+        SmallString<256> FilePath;
+        if (llvm::sys::path::is_absolute(FileName)) {
+          FilePath = FileName;
+        } else {
+          FilePath = CrossTUDir;
+          llvm::sys::path::append(FilePath, FileName);
+          // The entries are numbered like the lines of the text map.
+          if (!CompilationDatabase.empty()) {
+            Context.getDiagnostics().Report(diag::err_fnmap_absolute)
+                << IndexedFunctionMap << unsigned(EntryIndex + 1);
+          }
+        }
+        FunctionFileMap[LookupFnName] = FilePath.str().str();
+      }
+    } else if (!FunctionMapLoaded) {
       SmallString<256> ExternalFunctionMap = CrossTUDir;
       llvm::sys::path::append(ExternalFunctionMap, IndexName);
       std::ifstream ExternalFnMapFile(ExternalFunctionMap.c_str());
@@ -131,6 +234,7 @@ const FunctionDecl *CrossTranslationUnit::getCrossTUDefinition(
         }
         LineNo++;
       }
+      FunctionMapLoaded = true;
     }
 
     StringRef ASTFileName;
@@ -0,0 +1 @@
+int broken_function() { return undeclared_variable; }
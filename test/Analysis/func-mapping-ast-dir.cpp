@@ -0,0 +1,19 @@
+// REQUIRES: shell
+// RUN: rm -rf %t && mkdir -p %t
+// RUN: not clang-func-mapping -ast-dir=%t/ast %s %S/Inputs/func-mapping-broken.cpp -- -std=c++11 > %t/fnmap.txt 2> %t/errors.txt
+// RUN: FileCheck %s < %t/fnmap.txt
+// RUN: FileCheck --check-prefix=ERRORS %s < %t/errors.txt
+// RUN: find %t/ast -name '*.ast' | FileCheck --check-prefix=AST %s
+
+// The functions of a source with errors are not mapped, since its AST is
+// not written.
+
+// CHECK: c:@F@mapped# {{.*}}func-mapping-ast-dir.cpp
+// CHECK-NOT: broken_function
+
+// ERRORS: error: {{.*}}func-mapping-broken.cpp has errors, its functions are not mapped
+
+// AST: func-mapping-ast-dir.cpp.ast
+// AST-NOT: func-mapping-broken.cpp.ast
+
+int mapped() { return 0; }
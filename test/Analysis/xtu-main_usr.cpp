@@ -4,6 +4,11 @@
 // RUN: cp %S/Inputs/externalFnMap_usr.txt %T/xtudir/externalFnMap.txt
 // RUN: %clang_cc1 -triple x86_64-pc-linux-gnu -fsyntax-only -analyze -analyzer-checker=core,debug.ExprInspection -analyzer-config xtu-dir=%T/xtudir -analyzer-config use-usr=true -analyzer-config reanalyze-xtu-visited=true -std=c++11 -verify %s
 // RUN: %clang_cc1 -triple x86_64-pc-linux-gnu -fsyntax-only -analyze -analyzer-checker=core,debug.ExprInspection -analyzer-config xtu-dir=%T/xtudir -analyzer-config use-usr=true -analyzer-config reanalyze-xtu-visited=true -std=c++11 -analyzer-display-ctu-progress 2>&1 %s | FileCheck %s
+// RUN: mkdir -p %T/xtudir-idx
+// RUN: cp %T/xtudir/xtu-other.cpp.ast %T/xtudir/xtu-chain.cpp.ast %T/xtudir-idx
+// RUN: %python %S/../../tools/xtu-build-new/lib/function_map.py to-index %S/Inputs/externalFnMap_usr.txt %T/xtudir-idx/externalFnMap.idx
+// RUN: %clang_cc1 -triple x86_64-pc-linux-gnu -fsyntax-only -analyze -analyzer-checker=core,debug.ExprInspection -analyzer-config xtu-dir=%T/xtudir-idx -analyzer-config use-usr=true -analyzer-config reanalyze-xtu-visited=true -std=c++11 -verify %s
+// RUN: %clang_cc1 -triple x86_64-pc-linux-gnu -fsyntax-only -analyze -analyzer-checker=core,debug.ExprInspection -analyzer-config xtu-dir=%T/xtudir-idx -analyzer-config use-usr=true -analyzer-config reanalyze-xtu-visited=true -std=c++11 -analyzer-display-ctu-progress 2>&1 %s | FileCheck %s
 
 // CHECK: ANALYZE (CTU loaded AST for source file): {{.*}}/xtu-other.cpp
 // CHECK: ANALYZE (CTU loaded AST for source file): {{.*}}/xtu-chain.cpp
@@ -18,14 +18,18 @@
 #include "clang/AST/StmtVisitor.h"
 #include "clang/Basic/SourceManager.h"
 #include "clang/Basic/TargetInfo.h"
+#include "clang/Frontend/ASTUnit.h"
 #include "clang/Frontend/CompilerInstance.h"
 #include "clang/Frontend/FrontendActions.h"
 #include "clang/Index/USRGeneration.h"
+#include "clang/Tooling/ArgumentsAdjusters.h"
 #include "clang/Tooling/CommonOptionsParser.h"
 #include "clang/Tooling/Tooling.h"
 #include "llvm/Support/CommandLine.h"
+#include "llvm/Support/FileSystem.h"
 #include "llvm/Support/Path.h"
 #include "llvm/Support/Signals.h"
+#include <set>
 #include <sstream>
 #include <string>
 #include <vector>
@@ -36,6 +40,21 @@ using namespace clang::tooling;
 
 static cl::OptionCategory ClangFnMapGenCategory("clang-fnmapgen options");
 
+static cl::opt<std::string>
+    ASTDir("ast-dir",
+           cl::desc("Also write the AST of every source file into this "
+                    "directory, under the real path of the source file with "
+                    "the .ast extension. The source files are parsed only "
+                    "once for all the outputs."),
+           cl::cat(ClangFnMapGenCategory));
+
+static cl::opt<std::string>
+    DepsFile("deps-file",
+             cl::desc("Write the real paths of the files read by the source "
+                      "files (the sources and the included files) into this "
+                      "file, one per line."),
+             cl::cat(ClangFnMapGenCategory));
+
 class MapFunctionNamesConsumer : public ASTConsumer {
 public:
   MapFunctionNamesConsumer(ASTContext &Context) : Ctx(Context) {}
@@ -109,6 +128,78 @@ protected:
 
 static cl::extrahelp CommonHelp(CommonOptionsParser::HelpMessage);
 
+/// Writes the AST of the translation unit into the AST directory. Returns
+/// true on error.
+static bool saveAST(ASTUnit &Unit) {
+  char *Path = realpath(Unit.getMainFileName().str().c_str(), nullptr);
+  if (!Path)
+    return true;
+  SmallString<256> ASTPath(ASTDir);
+  sys::path::append(ASTPath, sys::path::relative_path(Path));
+  free(Path);
+  ASTPath += ".ast";
+  if (sys::fs::create_directories(sys::path::parent_path(ASTPath))) {
+    errs() << "error: cannot create the directory of " << ASTPath << "\n";
+    return true;
+  }
+  if (Unit.Save(ASTPath)) {
+    errs() << "error: cannot write " << ASTPath << "\n";
+    return true;
+  }
+  return false;
+}
+
+/// Parses the source file, writes its AST into the AST directory (when
+/// given), prints its defined functions and adds the files it read to
+/// \p Inputs. The functions are printed only when the AST is written, so
+/// that the function map never refers to a missing AST file. Returns true
+/// on error.
+static bool processSource(const CompilationDatabase &Compilations,
+                          const std::string &Source,
+                          std::set<std::string> &Inputs) {
+  ClangTool Tool(Compilations, Source);
+  Tool.appendArgumentsAdjuster(
+      getInsertArgumentAdjuster("-w", ArgumentInsertPosition::END));
+  std::vector<std::unique_ptr<ASTUnit>> ASTs;
+  if (Tool.buildASTs(ASTs) != 0 || ASTs.size() != 1) {
+    errs() << "error: cannot parse " << Source << "\n";
+    return true;
+  }
+  ASTUnit &Unit = *ASTs[0];
+  const SourceManager &SM = Unit.getSourceManager();
+  for (auto I = SM.fileinfo_begin(), E = SM.fileinfo_end(); I != E; ++I) {
+    if (char *Path = realpath(I->first->getName().str().c_str(), nullptr)) {
+      Inputs.insert(Path);
+      free(Path);
+    }
+  }
+  if (Unit.getDiagnostics().hasErrorOccurred()) {
+    errs() << "error: " << Source
+           << " has errors, its functions are not mapped\n";
+    return true;
+  }
+  if (!ASTDir.empty() && saveAST(Unit))
+    return true;
+
+  MapFunctionNamesConsumer Consumer(Unit.getASTContext());
+  Consumer.HandleTranslationUnit(Unit.getASTContext());
+  return false;
+}
+
+/// Writes the input files into the dependency file. Returns true on error.
+static bool writeDepsFile(const std::set<std::string> &Inputs) {
+  std::error_code EC;
+  raw_fd_ostream OS(DepsFile, EC, sys::fs::F_Text);
+  if (EC) {
+    errs() << "error: cannot write " << DepsFile << ": " << EC.message()
+           << "\n";
+    return true;
+  }
+  for (const std::string &Input : Inputs)
+    OS << Input << "\n";
+  return false;
+}
+
 int main(int argc, const char **argv) {
   // Print a stack trace if we signal out.
   sys::PrintStackTraceOnErrorSignal(argv[0], false);
@@ -120,6 +211,17 @@ int main(int argc, const char **argv) {
   CommonOptionsParser OptionsParser(argc, argv, ClangFnMapGenCategory,
                                     cl::ZeroOrMore, Overview);
 
+  if (!ASTDir.empty() || !DepsFile.empty()) {
+    int Status = 0;
+    std::set<std::string> Inputs;
+    for (const std::string &Source : OptionsParser.getSourcePathList())
+      if (processSource(OptionsParser.getCompilations(), Source, Inputs))
+        Status = 1;
+    if (!DepsFile.empty() && writeDepsFile(Inputs))
+      Status = 1;
+    return Status;
+  }
+
   ClangTool Tool(OptionsParser.getCompilations(),
                  OptionsParser.getSourcePathList());
   Tool.run(newFrontendActionFactory<MapFunctionNamesAction>().get());
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" Benchmark of reading and writing large compilation databases.
+
+It generates a compilation database of the requested size, then measures
+the time and the peak memory use of the `json` module and of the streaming
+methods of `libscanbuild.database`. Every measurement runs in a separate
+process, to have its own peak memory use.
+
+    $ python benchmarks/bench_database.py --size 300 """
+
+import os
+import os.path
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libscanbuild.database import read_entries, write_entries, entry_digest
+from libscanbuild.intercept import entry_hash
+from libscanbuild import duplicate_check
+
+
+def generate(filename, megabytes):
+    """ Writes a compilation database of the given size. """
+
+    flags = ' '.join('-I/src/include/dir{0}'.format(i) for i in range(40))
+
+    def entries():
+        index = 0
+        size = 0
+        while size < megabytes << 20:
+            entry = {
+                'directory': '/src/module{0}'.format(index // 100),
+                'command': 'cc -c {0} -DINDEX={1} file{1}.c'.format(flags,
+                                                                   index),
+                'file': '/src/module{0}/file{1}.c'.format(index // 100, index)
+            }
+            size += len(json.dumps(entry)) + 40
+            index += 1
+            yield entry
+
+    return write_entries(filename, entries())
+
+
+def case_json_load(filename):
+    with open(filename, 'r') as handle:
+        return len(json.load(handle))
+
+
+def case_stream_read(filename):
+    return sum(1 for _ in read_entries(filename))
+
+
+def case_json_append(filename):
+    """ What the append mode of intercept-build was doing. """
+
+    with open(filename, 'r') as handle:
+        previous = json.load(handle)
+    duplicate = duplicate_check(entry_hash)
+    entries = [entry for entry in previous if not duplicate(entry)]
+    output = filename + '.out'
+    with open(output, 'w') as handle:
+        json.dump(entries, handle, sort_keys=True, indent=4)
+    os.remove(output)
+    return len(entries)
+
+
+def case_stream_append(filename):
+    """ What the append mode of intercept-build is doing. """
+
+    duplicate = duplicate_check(
+        lambda entry: entry_digest(entry_hash(entry)))
+    output = filename + '.out'
+    count = write_entries(output, (entry for entry in read_entries(filename)
+                                   if not duplicate(entry)))
+    os.remove(output)
+    return count
+
+
+CASES = {
+    'json_load': case_json_load,
+    'stream_read': case_stream_read,
+    'json_append': case_json_append,
+    'stream_append': case_stream_append
+}
+
+
+def measure(case, filename):
+    """ Runs a case in a new process, returns its time and peak memory. """
+
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--case', case, filename])
+    count, seconds, rss = output.decode('utf-8').split()
+    return int(count), float(seconds), int(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=300,
+                        help='size of the generated database in MB')
+    parser.add_argument('--case', choices=sorted(CASES), help=argparse.SUPPRESS)
+    parser.add_argument('filename', nargs='?', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        start = time.time()
+        count = CASES[args.case](args.filename)
+        elapsed = time.time() - start
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print('{0} {1} {2}'.format(count, elapsed, rss))
+        return
+
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'compile_commands.json')
+    try:
+        count = generate(filename, args.size)
+        print('{0} entries, {1:.1f} MB'.format(
+            count, os.path.getsize(filename) / float(1 << 20)))
+        for case in sorted(CASES):
+            count, seconds, rss = measure(case, filename)
+            # ru_maxrss is in kilobytes on Linux, in bytes on OS X
+            if sys.platform == 'darwin':
+                rss //= 1024
+            print('{0:<16} {1:8.2f}s {2:8.1f} MB peak'.format(
+                case, seconds, rss / 1024.0))
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" Benchmark of the execution report writing and parsing.
+
+It writes the requested number of execution reports with the former,
+separator based format (a file per process) and with the length prefixed
+format (a file per process and a single shared file), then measures the
+parsing of them. With the `--build` option it also runs a shell loop,
+which starts the requested number of processes, with the interception
+library preloaded and without it.
+
+    $ python benchmarks/bench_intercept.py --count 100000 --build 2000 """
+
+import os
+import os.path
+import sys
+import time
+import glob
+import shutil
+import argparse
+import itertools
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libear import build_libear, TemporaryDirectory
+from libscanbuild import intercept
+
+GS = chr(0x1d)
+RS = chr(0x1e)
+US = chr(0x1f)
+
+
+class Execution(object):
+    def __init__(self, pid, cwd, cmd):
+        self.pid = pid
+        self.cwd = cwd
+        self.cmd = cmd
+
+
+def executions(count):
+    flags = ['-I/src/include/dir{0}'.format(i) for i in range(20)]
+    for index in range(count):
+        yield Execution(10000 + index, '/src/module{0}'.format(index // 100),
+                        ['cc', '-c'] + flags + ['file{0}.c'.format(index)])
+
+
+def write_text(directory, execution):
+    """ The former writer of the compiler wrappers. """
+
+    filename = os.path.join(directory, '{0}.cmd'.format(execution.pid))
+    with open(filename, 'ab') as handler:
+        pid = str(execution.pid)
+        command = US.join(execution.cmd) + US
+        content = RS.join([pid, pid, 'wrapper', execution.cwd, command]) + GS
+        handler.write(content.encode('utf-8'))
+
+
+def parse_text(filename):
+    """ The former parser of the execution reports. """
+
+    with open(filename, 'r') as handler:
+        content = handler.read()
+        for group in filter(bool, content.split(GS)):
+            records = group.split(RS)
+            yield {
+                'pid': records[0],
+                'ppid': records[1],
+                'function': records[2],
+                'directory': records[3],
+                'command': records[4].split(US)[:-1]
+            }
+
+
+def write_binary(directory, execution):
+    filename = os.path.join(directory, '{0}.cmd'.format(execution.pid))
+    intercept.write_exec_trace(filename, execution)
+
+
+def write_shared(directory, execution):
+    filename = os.path.join(directory, intercept.SHARED_TRACE_FILE)
+    intercept.write_exec_trace(filename, execution)
+
+
+def read_all(directory, parser):
+    files = sorted(glob.iglob(os.path.join(directory, '*.cmd')))
+    return sum(1 for _ in itertools.chain.from_iterable(
+        parser(filename) for filename in files))
+
+
+def measure_formats(count):
+    cases = [('text per process', write_text, parse_text),
+             ('binary per process', write_binary, intercept.parse_exec_trace),
+             ('binary shared', write_shared, intercept.parse_exec_trace)]
+    for name, writer, parser in cases:
+        with TemporaryDirectory(prefix='bench-') as directory:
+            start = time.time()
+            for execution in executions(count):
+                writer(directory, execution)
+            written = time.time() - start
+            files = len(os.listdir(directory))
+            start = time.time()
+            parsed = read_all(directory, parser)
+            elapsed = time.time() - start
+            assert parsed == count
+            print('{0:<20} write {1:7.2f}s  parse {2:7.2f}s  {3:7d} files'
+                  .format(name, written, elapsed, files))
+
+
+def measure_build(count):
+    script = 'i=0; while [ $i -lt {0} ]; do /bin/true; i=$((i+1)); done'\
+        .format(count)
+    with TemporaryDirectory(prefix='bench-') as directory:
+        library = build_libear('cc', directory)
+        cases = [('no interception', None, False),
+                 ('libear per process', library, False),
+                 ('libear shared', library, True)]
+        for name, preload, shared in cases:
+            output = os.path.join(directory, name.replace(' ', '-'))
+            os.mkdir(output)
+            if shared:
+                open(os.path.join(output, intercept.SHARED_TRACE_FILE),
+                     'wb').close()
+            environment = dict(os.environ)
+            if preload:
+                environment.update({'INTERCEPT_BUILD_TARGET_DIR': output,
+                                    'LD_PRELOAD': preload})
+            start = time.time()
+            subprocess.check_call(['sh', '-c', script], env=environment)
+            elapsed = time.time() - start
+            start = time.time()
+            parsed = read_all(output, intercept.parse_exec_trace)
+            parsing = time.time() - start
+            print('{0:<20} build {1:7.2f}s  parse {2:7.2f}s  {3:7d} records'
+                  .format(name, elapsed, parsing, parsed))
+            shutil.rmtree(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100000,
+                        help='number of execution reports to write')
+    parser.add_argument('--build', type=int, metavar='<processes>',
+                        help='run a build of this many processes')
+    args = parser.parse_args()
+
+    measure_formats(args.count)
+    if args.build:
+        measure_build(args.build)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" Benchmark of the cover report generation of large reports.
+
+It generates the requested number of html bug reports into a temporary
+directory, then measures the report parsing and the generation of the
+cover: as a single page and split into pages. It prints the size of the cover page and of the largest page,
+which is what a browser has to load at once.
+
+    $ python benchmarks/bench_report.py --bugs 30000 """
+
+import os
+import os.path
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libscanbuild import report
+
+
+def generate(directory, count):
+    """ Writes bug reports like the analyzer does. (Only the meta part.) """
+
+    for index in range(count):
+        name = os.path.join(directory, 'report-{0:06d}.html'.format(index))
+        with open(name, 'w') as handle:
+            handle.write('<html>\n'
+                         '<!-- BUGTYPE Bug type {0} -->\n'
+                         '<!-- BUGCATEGORY Category {1} -->\n'
+                         '<!-- BUGFILE /src/module{2}/file{3}.c -->\n'
+                         '<!-- BUGLINE {4} -->\n'
+                         '<!-- BUGPATHLENGTH {5} -->\n'
+                         '<!-- FUNCTIONNAME function{4} -->\n'
+                         '<!-- BUGDESC Description of the bug -->\n'
+                         '<!-- BUGMETAEND -->\n'
+                         '{6}\n'
+                         '</html>\n'.format(index % 40, index % 7,
+                                            index % 50, index % 3000,
+                                            index, index % 20, 'x' * 2000))
+
+
+def measure(function):
+    start = time.time()
+    result = function()
+    return time.time() - start, result
+
+
+def cover(directory, fragments):
+    """ Puts together the fragments like the cover would be, and removes
+    them. Returns the size of the cover. """
+
+    size = sum(os.path.getsize(fragment) for fragment in fragments)
+    for fragment in fragments:
+        os.remove(fragment)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bugs', type=int, default=30000,
+                        help='number of bug reports')
+    parser.add_argument('--page-size', type=int, default=report.PAGE_SIZE,
+                        help='number of bugs on a page')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        generate(directory, args.bugs)
+
+        seconds, index = measure(
+            lambda: report.read_index(directory, True))
+        print('{0:<24} {1:8.2f}s'.format('parse', seconds))
+
+        counter = report.create_counters()
+        for bug in index['bugs']:
+            counter(bug)
+
+        def single():
+            return cover(directory, [
+                report.bug_summary(directory, counter),
+                report.bug_report(directory, '/src',
+                                  [dict(bug) for bug in index['bugs']])])
+
+        seconds, size = measure(single)
+        print('{0:<24} {1:8.2f}s  cover {2:8.1f} KB'.format(
+            'single page', seconds, size / 1024.0))
+
+        def paginated():
+            return cover(directory, [
+                report.bug_summary(directory, counter, False),
+                report.file_summary(directory, '/src', index['bugs']),
+                report.bug_pages(directory, '/src', index['bugs'],
+                                 args.page_size, 'benchmark')])
+
+        seconds, size = measure(paginated)
+        largest = max(os.path.getsize(os.path.join(directory, name))
+                      for name in os.listdir(directory)
+                      if name.startswith('bugs-'))
+        print('{0:<24} {1:8.2f}s  cover {2:8.1f} KB, largest page '
+              '{3:8.1f} KB'.format('paginated', seconds, size / 1024.0,
+                                   largest / 1024.0))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,10 @@
 #include <unistd.h>
 #include <dlfcn.h>
 #include <pthread.h>
+#include <fcntl.h>
+#include <errno.h>
+#include <stdint.h>
+#include <arpa/inet.h>
 
 #if defined HAVE_POSIX_SPAWN || defined HAVE_POSIX_SPAWNP
 #include <spawn.h>
@@ -41,6 +45,8 @@ extern char **environ;
 #endif
 
 #define ENV_OUTPUT "INTERCEPT_BUILD_TARGET_DIR"
+#define SHARED_LOG "shared.cmd"
+#define RECORD_MAGIC 0x7f454152
 #ifdef APPLE
 # define ENV_FLAT    "DYLD_FORCE_FLAT_NAMESPACE"
 # define ENV_PRELOAD "DYLD_INSERT_LIBRARIES"
@@ -403,13 +409,49 @@ static int call_posix_spawnp(pid_t *restrict pid, const char *restrict file,
 }
 #endif
 
-/* this method is to write log about the process creation. */
+/* this method is to write log about the process creation.
+ *
+ * A record is written with a single `write` call into a file opened in
+ * append mode. The record starts with a magic number, the size of the rest
+ * of the record, the pid and the parent pid. (These are 32 bit numbers in
+ * network byte order.) Then comes the function name, the working directory
+ * and the arguments as zero terminated strings.
+ *
+ * When the shared log file exists in the output directory, all processes
+ * append to it. (Appends with a single `write` are not interleaved.)
+ * Otherwise a file per process is created. */
 
-static void bear_report_call(char const *fun, char const *const argv[]) {
-    static int const GS = 0x1d;
-    static int const RS = 0x1e;
-    static int const US = 0x1f;
+static size_t bear_record_put(char *buffer, size_t offset, uint32_t value) {
+    uint32_t const encoded = htonl(value);
+    memcpy(buffer + offset, &encoded, sizeof(encoded));
+    return offset + sizeof(encoded);
+}
+
+static size_t bear_record_put_string(char *buffer, size_t offset,
+                                     char const *value) {
+    size_t const length = strlen(value) + 1;
+    memcpy(buffer + offset, value, length);
+    return offset + length;
+}
+
+static int bear_open_trace(char const *out_dir) {
+    size_t const path_max_length = strlen(out_dir) + 32;
+    char filename[path_max_length];
+    if (-1 == snprintf(filename, path_max_length, "%s/%s", out_dir, SHARED_LOG)) {
+        perror("bear: snprintf");
+        exit(EXIT_FAILURE);
+    }
+    int fd = open(filename, O_WRONLY | O_APPEND);
+    if (-1 != fd || ENOENT != errno)
+        return fd;
+    if (-1 == snprintf(filename, path_max_length, "%s/%d.cmd", out_dir, getpid())) {
+        perror("bear: snprintf");
+        exit(EXIT_FAILURE);
+    }
+    return open(filename, O_WRONLY | O_APPEND | O_CREAT, 0666);
+}
 
+static void bear_report_call(char const *fun, char const *const argv[]) {
     if (!initialized)
         return;
 
@@ -419,31 +461,46 @@ static void bear_report_call(char const *fun, char const *const argv[]) {
         perror("bear: getcwd");
         exit(EXIT_FAILURE);
     }
-    char const * const out_dir = initial_env[0];
-    size_t const path_max_length = strlen(out_dir) + 32;
-    char filename[path_max_length];
-    if (-1 == snprintf(filename, path_max_length, "%s/%d.cmd", out_dir, getpid())) {
-        perror("bear: snprintf");
-        exit(EXIT_FAILURE);
+    size_t const argc = bear_strings_length(argv);
+    size_t size = 4 * sizeof(uint32_t) + strlen(fun) + 1 + strlen(cwd) + 1;
+    for (size_t it = 0; it < argc; ++it) {
+        size += strlen(argv[it]) + 1;
     }
-    FILE * fd = fopen(filename, "a+");
-    if (0 == fd) {
-        perror("bear: fopen");
+    char *buffer = (char *)malloc(size);
+    if (0 == buffer) {
+        perror("bear: malloc");
         exit(EXIT_FAILURE);
     }
-    fprintf(fd, "%d%c", getpid(), RS);
-    fprintf(fd, "%d%c", getppid(), RS);
-    fprintf(fd, "%s%c", fun, RS);
-    fprintf(fd, "%s%c", cwd, RS);
-    size_t const argc = bear_strings_length(argv);
+    size_t offset = 0;
+    offset = bear_record_put(buffer, offset, RECORD_MAGIC);
+    offset = bear_record_put(buffer, offset, (uint32_t)(size - 8));
+    offset = bear_record_put(buffer, offset, (uint32_t)getpid());
+    offset = bear_record_put(buffer, offset, (uint32_t)getppid());
+    offset = bear_record_put_string(buffer, offset, fun);
+    offset = bear_record_put_string(buffer, offset, cwd);
     for (size_t it = 0; it < argc; ++it) {
-        fprintf(fd, "%s%c", argv[it], US);
+        offset = bear_record_put_string(buffer, offset, argv[it]);
+    }
+    int const fd = bear_open_trace(initial_env[0]);
+    if (-1 == fd) {
+        perror("bear: open");
+        exit(EXIT_FAILURE);
+    }
+    for (size_t written = 0; written < size;) {
+        ssize_t const result = write(fd, buffer + written, size - written);
+        if (-1 == result) {
+            if (EINTR == errno)
+                continue;
+            perror("bear: write");
+            exit(EXIT_FAILURE);
+        }
+        written += (size_t)result;
     }
-    fprintf(fd, "%c", GS);
-    if (fclose(fd)) {
-        perror("bear: fclose");
+    if (close(fd)) {
+        perror("bear: close");
         exit(EXIT_FAILURE);
     }
+    free(buffer);
     free((void *)cwd);
     pthread_mutex_unlock(&mutex);
 }
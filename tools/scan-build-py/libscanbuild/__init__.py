@@ -41,6 +41,24 @@ def duplicate_check(method):
     return predicate
 
 
+def replace_file(source, destination):
+    """ Renames the source file to the destination, and replaces the
+    destination if it exists (like `os.replace` does, which is missing on
+    python 2). On Windows `os.rename` fails when the destination exists, so
+    there the file is removed first on python 2. """
+
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        try:
+            os.rename(source, destination)
+        except OSError:
+            if not os.path.exists(destination):
+                raise
+            os.remove(destination)
+            os.rename(source, destination)
+
+
 def run_build(command, *args, **kwargs):
     """ Run and report build command execution
 
@@ -13,15 +13,17 @@ To run the static analyzer against a build is done in multiple steps:
 
 import re
 import os
-import os.path
 import json
+import os.path
 import logging
 import multiprocessing
 import tempfile
 import functools
 import subprocess
 import contextlib
+import shutil
 import datetime
+import time
 
 from libscanbuild import command_entry_point, compiler_wrapper, \
     wrapper_environment, run_build, run_command
@@ -31,7 +33,15 @@ from libscanbuild.intercept import capture
 from libscanbuild.report import document
 from libscanbuild.compilation import split_command, classify_source, \
     compiler_language
-from libscanbuild.clang import get_version, get_arguments
+from libscanbuild.clang import get_version, get_arguments, \
+    get_cached_arguments
+from libscanbuild.database import read_entries
+from libscanbuild.incremental import Manifest, parse_dependencies, \
+    copy_reports
+from libscanbuild.schedule import CostHistory, Utilization, schedule, \
+    source_path
+from libscanbuild.limits import run_limited, LimitExceeded, RETRY_TIERS
+from libscanbuild.telemetry import TelemetrySink, make_record
 from libscanbuild.shell import decode
 
 __all__ = ['scan_build', 'analyze_build', 'analyze_compiler_wrapper']
@@ -109,22 +119,121 @@ def run_analyzer_parallel(args):
         'output_format': args.output_format,
         'output_failures': args.output_failures,
         'direct_args': analyzer_params(args),
-        'force_debug': args.force_debug
+        'force_debug': args.force_debug,
+        'expansion_cache': expansion_cache_dir(args),
+        'verify_expansion': args.verify_expansion,
+        'resource_limits': analyzer_limits(args),
+        'telemetry': bool(args.telemetry)
     }
 
     logging.debug('run analyzer against compilation database')
-    with open(args.cdb, 'r') as handle:
-        generator = (dict(cmd, **consts)
-                     for cmd in json.load(handle) if not exclude(cmd['file']))
-        # when verbose output requested execute sequentially
-        pool = multiprocessing.Pool(1 if args.verbose > 2 else None)
-        for current in pool.imap_unordered(run, generator):
-            if current is not None:
-                # display error message from the static analyzer
-                for line in current['error_output']:
-                    logging.info(line.rstrip())
-        pool.close()
-        pool.join()
+    # The entries are kept in memory to schedule them (the longest first),
+    # but those are merged with the constant parameters only when these are
+    # passed to the workers.
+    entries = [cmd for cmd in read_entries(args.cdb)
+               if not exclude(cmd['file'])]
+    manifest = None
+    if args.incremental:
+        manifest = Manifest(os.path.join(cache_dir(args), 'incremental'))
+        fingerprint = Manifest.fingerprint([
+            get_version(args.clang), consts['direct_args'],
+            consts['force_debug'], consts['output_format'],
+            consts['output_failures']])
+        entries = select_changed(entries, manifest, fingerprint, args.output)
+    # start the long running entries first, to not wait for them at the end
+    history = CostHistory(os.path.join(cache_dir(args), 'durations.json'))
+    entries = schedule(entries, history)
+    utilization = Utilization()
+    telemetry = TelemetrySink(args.telemetry) if args.telemetry else None
+    # when verbose output requested execute sequentially
+    jobs = args.jobs if args.jobs else (1 if args.verbose > 2 else None)
+    pool = multiprocessing.Pool(jobs)
+    for current in pool.imap_unordered(run_measured,
+                                       (dict(consts, **entry)
+                                        for entry in entries)):
+        utilization.add(current['worker'], current['start'], current['end'])
+        history.update(source_path(current),
+                       current['end'] - current['start'])
+        if manifest is not None:
+            record_analyzed(current, manifest, fingerprint, args.output)
+        if current['result'] is not None and telemetry is not None:
+            telemetry.write(make_record(current['file'], current['directory'],
+                                        current['start'], current['end'],
+                                        current['result']))
+        if current['result'] is not None:
+            # display error message from the static analyzer
+            for line in current['result']['error_output']:
+                logging.info(line.rstrip())
+    pool.close()
+    pool.join()
+    history.save()
+    if manifest is not None:
+        manifest.save()
+    utilization.log()
+
+
+def select_changed(entries, manifest, fingerprint, output_dir):
+    """ Returns the entries which need to be analyzed in an incremental
+    run. The reports of the unchanged entries are copied to the output
+    directory. The others are set up to write their reports into the
+    manifest, and to collect their dependencies. """
+
+    result = []
+    keys = set()
+    for entry in entries:
+        key = Manifest.key(entry)
+        if key in keys:
+            continue
+        keys.add(key)
+        reports_dir = manifest.reports_dir(key)
+        if manifest.is_current(key, fingerprint):
+            copy_reports(reports_dir, output_dir)
+            continue
+        manifest.remove(key)
+        if os.path.isdir(reports_dir):
+            shutil.rmtree(reports_dir)
+        os.makedirs(reports_dir)
+        entry.update({'output_dir': reports_dir,
+                      'incremental_key': key,
+                      'collect_dependencies': True})
+        result.append(entry)
+    manifest.prune(keys)
+    logging.info('incremental analysis: %d of %d entries changed',
+                 len(result), len(keys))
+    return result
+
+
+def record_analyzed(current, manifest, fingerprint, output_dir):
+    """ Records the result of an analyzed entry in the manifest, and
+    copies its reports to the output directory. Entries which failed are
+    not recorded, to analyze them again in the next run. """
+
+    key = current['key']
+    result = current['result']
+    copy_reports(manifest.reports_dir(key), output_dir)
+    if result is not None and result['exit_code'] == 0 and \
+            'dependencies' in result:
+        manifest.update(key, fingerprint, result['dependencies'])
+
+
+def run_measured(opts):
+    """ Runs the analyzer against an entry like `run` does, and measures
+    the duration of it. """
+
+    source = opts['file']
+    directory = opts['directory']
+    key = opts.pop('incremental_key', None)
+    start = time.time()
+    result = run(opts)
+    return {
+        'file': source,
+        'directory': directory,
+        'key': key,
+        'result': result,
+        'worker': os.getpid(),
+        'start': start,
+        'end': time.time()
+    }
 
 
 def setup_environment(args):
@@ -140,11 +249,47 @@ def setup_environment(args):
         'ANALYZE_BUILD_REPORT_FORMAT': args.output_format,
         'ANALYZE_BUILD_REPORT_FAILURES': 'yes' if args.output_failures else '',
         'ANALYZE_BUILD_PARAMETERS': ' '.join(analyzer_params(args)),
-        'ANALYZE_BUILD_FORCE_DEBUG': 'yes' if args.force_debug else ''
+        'ANALYZE_BUILD_FORCE_DEBUG': 'yes' if args.force_debug else '',
+        'ANALYZE_BUILD_EXPANSION_CACHE': expansion_cache_dir(args) or '',
+        'ANALYZE_BUILD_VERIFY_EXPANSION': str(args.verify_expansion),
+        'ANALYZE_BUILD_LIMITS': json.dumps(analyzer_limits(args)),
+        'ANALYZE_BUILD_TELEMETRY': args.telemetry or ''
     })
     return environment
 
 
+def cache_dir(args):
+    """ Returns the directory where data is kept between runs.
+
+    It's next to the report directories (in the directory given by the
+    `--output` flag), to be reused by the following runs. """
+
+    return os.path.join(os.path.dirname(args.output), '.scan-build-cache')
+
+
+def expansion_cache_dir(args):
+    """ Returns the directory of the front-end invocation cache, or None
+    when it's not requested. """
+
+    if not args.expansion_cache:
+        return None
+    return os.path.join(cache_dir(args), 'expansions')
+
+
+def analyzer_limits(args):
+    """ Returns the resource limits of the analyzer runs, or None when no
+    limit is requested. """
+
+    limits = dict((key, value) for key, value in [
+        ('timeout', args.analyzer_timeout),
+        ('memory', args.analyzer_memory_limit),
+        ('cpu', args.analyzer_cpu_limit)] if value)
+    if not limits:
+        return None
+    limits['retries'] = args.limit_retries
+    return limits
+
+
 @command_entry_point
 def analyze_compiler_wrapper():
     """ Entry point for `analyze-cc` and `analyze-c++` compiler wrappers. """
@@ -173,6 +318,12 @@ def analyze_compiler_wrapper_impl(result, execution):
         'direct_args': os.getenv('ANALYZE_BUILD_PARAMETERS',
                                  '').split(' '),
         'force_debug': os.getenv('ANALYZE_BUILD_FORCE_DEBUG'),
+        'expansion_cache': os.getenv('ANALYZE_BUILD_EXPANSION_CACHE'),
+        'verify_expansion': float(
+            os.getenv('ANALYZE_BUILD_VERIFY_EXPANSION', '0')),
+        'resource_limits': json.loads(
+            os.getenv('ANALYZE_BUILD_LIMITS') or 'null'),
+        'telemetry': os.getenv('ANALYZE_BUILD_TELEMETRY'),
         'directory': execution.cwd,
         'command': [execution.cmd[0], '-c'] + compilation.flags
     }
@@ -180,7 +331,11 @@ def analyze_compiler_wrapper_impl(result, execution):
     for source in compilation.files:
         parameters.update({'file': source})
         logging.debug('analyzer parameters %s', parameters)
+        start = time.time()
         current = run(parameters)
+        if current is not None and parameters['telemetry']:
+            TelemetrySink(parameters['telemetry']).write(make_record(
+                source, execution.cwd, start, time.time(), current))
         # display error message from the static analyzer
         if current is not None:
             for line in current['error_output']:
@@ -345,10 +500,15 @@ def report_failure(opts):
             os.makedirs(failures_dir)
         return failures_dir
 
-    # Classify error type: when Clang terminated by a signal it's a 'Crash'.
+    # Classify error type: when a resource limit stopped Clang, it's named
+    # after the limit. When Clang terminated by a signal it's a 'Crash'.
     # (python subprocess Popen.returncode is negative when child terminated
     # by signal.) Everything else is 'Other Error'.
-    error = 'crash' if opts['exit_code'] < 0 else 'other_error'
+    hits = opts.get('limit_hits', [])
+    if hits:
+        error = hits[0]['limit']
+    else:
+        error = 'crash' if opts['exit_code'] < 0 else 'other_error'
     # Create preprocessor output file name. (This is blindly following the
     # Perl implementation.)
     (handle, name) = tempfile.mkstemp(suffix=extension(),
@@ -368,6 +528,13 @@ def report_failure(opts):
         handle.write(' '.join(cmd) + os.linesep)
         handle.write(' '.join(os.uname()) + os.linesep)
         handle.write(get_version(opts['clang']))
+        for hit in hits:
+            handle.write(os.linesep + 'Stopped by {0} with: {1}'.format(
+                hit['limit'].replace('_', ' '),
+                ' '.join(hit['arguments']) or 'default options'))
+        if hits and opts['exit_code'] == 0:
+            handle.write(os.linesep + 'Succeeded with: {0}'.format(
+                ' '.join(RETRY_TIERS[len(hits) - 1])))
         handle.close()
     # write the captured output too
     with open(name + '.stderr.txt', 'w') as handle:
@@ -394,12 +561,22 @@ def run_analyzer(opts, continuation=report_failure):
 
     try:
         cwd = opts['directory']
-        cmd = get_arguments([opts['clang'], '--analyze'] +
-                            opts['direct_args'] + opts['flags'] +
-                            [opts['file'], '-o', target()],
-                            cwd)
-        output = run_command(cmd, cwd=cwd)
-        return {'error_output': output, 'exit_code': 0}
+        output_file = target()
+        cmd = get_cached_arguments([opts['clang'], '--analyze'] +
+                                   opts['direct_args'] + opts['flags'] +
+                                   [opts['file'], '-o', output_file],
+                                   cwd, opts['file'], output_file,
+                                   opts.get('expansion_cache'),
+                                   opts.get('verify_expansion', 0.0))
+        limits = opts.get('resource_limits')
+        if not limits and not opts.get('telemetry'):
+            output = run_command(cmd, cwd=cwd)
+            return {'error_output': output, 'exit_code': 0}
+        result = run_analyzer_limited(opts, cmd, limits or dict(),
+                                      continuation)
+        if os.path.isfile(output_file):
+            result['output_size'] = os.path.getsize(output_file)
+        return result
     except subprocess.CalledProcessError as ex:
         result = {'error_output': ex.output, 'exit_code': ex.returncode}
         if opts.get('output_failures', False):
@@ -408,8 +585,81 @@ def run_analyzer(opts, continuation=report_failure):
         return result
 
 
+def run_analyzer_limited(opts, cmd, limits, continuation):
+    """ Executes the analyzer with resource limits. When a limit is hit, it
+    executes the analyzer again with cheaper options, till it succeeds or
+    runs out of the retries. The limit hits are reported as failures, even
+    when a retry succeeded. The resource usage of the analyzer processes is
+    added to the result. """
+
+    cwd = opts['directory']
+    tiers = [[]] + RETRY_TIERS[:limits.get('retries', len(RETRY_TIERS))]
+    hits = []
+    usage = dict()
+    for tier in tiers:
+        try:
+            output = run_limited(cmd + tier, cwd=cwd, limits=limits,
+                                 usage=usage)
+            result = {'error_output': output, 'exit_code': 0}
+            break
+        except LimitExceeded as ex:
+            logging.warning('analyzer stopped by %s: %s',
+                            ex.limit.replace('_', ' '), opts['file'])
+            hits.append({'limit': ex.limit, 'arguments': tier})
+            result = {'error_output': ex.output, 'exit_code': ex.returncode}
+        except subprocess.CalledProcessError as ex:
+            result = {'error_output': ex.output, 'exit_code': ex.returncode}
+            break
+    if hits:
+        result['limit_hits'] = hits
+    if (hits or result['exit_code']) and opts.get('output_failures', False):
+        opts.update(result)
+        continuation(opts)
+    result['usage'] = usage
+    return result
+
+
+@require(['clang', 'directory', 'flags', 'file'])
+def collect_dependencies(opts, continuation=run_analyzer):
+    """ Collect the files which the entry depends on, when it's requested
+    for the incremental analysis. It runs the preprocessor after the
+    analyzer succeeded, and adds the file names to the analyzer result. """
+
+    if not opts.pop('collect_dependencies', False):
+        return continuation(opts)
+
+    result = continuation(opts)
+    if result is not None and result['exit_code'] == 0:
+        flags = filter_dependency_flags(opts['flags'])
+        cwd = opts['directory']
+        try:
+            output = run_command([opts['clang'], '-M', '-w'] + flags +
+                                 [opts['file']], cwd=cwd)
+            result['dependencies'] = parse_dependencies(output, cwd)
+        except (subprocess.CalledProcessError, OSError):
+            logging.debug('dependencies of %s are not known', opts['file'])
+    return result
+
+
+def filter_dependency_flags(flags):
+    """ Remove the dependency file generation flags, to get the dependency
+    list on the standard output. """
+
+    ignored = {'-MD': 0, '-MMD': 0, '-MG': 0, '-MP': 0, '-MF': 1, '-MT': 1,
+               '-MQ': 1}
+    result = []
+    args = iter(flags)
+    for arg in args:
+        if arg in ignored:
+            for _ in range(ignored[arg]):
+                next(args)
+        else:
+            result.append(arg)
+    return result
+
+
 @require(['flags', 'force_debug'])
-def filter_debug_flags(opts, continuation=run_analyzer):
+def filter_debug_flags(opts, continuation=collect_dependencies):
     """ Filter out nondebug macros when requested. """
 
     if opts.pop('force_debug'):
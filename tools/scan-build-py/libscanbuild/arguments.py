@@ -22,7 +22,7 @@ from libscanbuild import reconfigure_logging
 from libscanbuild.clang import get_checkers
 
 __all__ = ['parse_args_for_intercept_build', 'parse_args_for_analyze_build',
-           'parse_args_for_scan_build']
+           'parse_args_for_scan_build', 'parse_args_for_telemetry_summary']
 
 
 def parse_args_for_intercept_build():
@@ -74,6 +74,17 @@ def parse_args_for_scan_build():
     return args
 
 
+def parse_args_for_telemetry_summary():
+    """ Parse command-line arguments for telemetry-summary. """
+
+    parser = create_telemetry_parser()
+    args = parser.parse_args()
+
+    reconfigure_logging(args.verbose)
+    logging.debug('Parsed arguments: %s', args)
+    return args
+
+
 def normalize_args_for_analyze(args, from_build_command):
     """ Normalize parsed arguments for analyze-build and scan-build.
 
@@ -81,6 +92,10 @@ def normalize_args_for_analyze(args, from_build_command):
     :param from_build_command: Boolean value tells is the command suppose
     to run the analyzer against a build command or a compilation db. """
 
+    # the telemetry file is written by processes in other directories too
+    if args.telemetry:
+        args.telemetry = os.path.abspath(args.telemetry)
+
     # make plugins always a list. (it might be None when not specified.)
     if args.plugins is None:
         args.plugins = []
@@ -141,6 +156,14 @@ def create_intercept_parser():
         Duplicate entries are detected and not present in the final output.
         The output is not continuously updated, it's done when the build
         command finished. """)
+    advanced.add_argument(
+        '--shared-trace',
+        action='store_true',
+        help="""Log the intercepted process creations into a single file
+        instead of a file per process. It keeps the temporary directory
+        small for builds with many processes, but needs a file system
+        where appends from many processes are not interleaved (local file
+        systems are fine, NFS is not).""")
 
     parser.add_argument(
         dest='build', nargs=argparse.REMAINDER, help="""Command to run.""")
@@ -173,6 +196,13 @@ def create_analyze_parser(from_build_command):
         help="""The exit status of '%(prog)s' is the same as the executed
         build command. This option ignores the build exit status and sets to
         be non zero if it found potential bugs or zero otherwise.""")
+    parser.add_argument(
+        '--jobs',
+        metavar='<number>',
+        type=int,
+        help="""Number of analyzer processes to run in parallel. The
+        default is the number of CPUs (or one when the verbose level is
+        above two).""")
     parser.add_argument(
         '--exclude',
         metavar='<directory>',
@@ -201,6 +231,16 @@ def create_analyze_parser(from_build_command):
         metavar='<title>',
         help="""Specify the title used on generated HTML pages.
         If not specified, a default title will be used.""")
+    output.add_argument(
+        '--report-page-size',
+        metavar='<number>',
+        dest='report_page_size',
+        type=int,
+        default=1000,
+        help="""When there are more bugs than this, the bug table of the
+        cover page is split into pages of this size, and the cover shows the
+        bug counts per type and per file with links to the pages. Zero keeps
+        every bug on the cover page.""")
     format_group = output.add_mutually_exclusive_group()
     format_group.add_argument(
         '--plist',
@@ -251,6 +291,40 @@ def create_analyze_parser(from_build_command):
         '--internal-stats',
         action='store_true',
         help="""Generate internal analyzer statistics.""")
+    advanced.add_argument(
+        '--telemetry',
+        metavar='<file>',
+        help="""Append a record of every analyzed translation unit to this
+        file (JSON Lines): wall clock and CPU time, peak memory use, exit
+        status, output size and the analyzer statistics (with
+        '--internal-stats'). Use 'telemetry-summary' to read it.""")
+    advanced.add_argument(
+        '--analyzer-timeout',
+        metavar='<seconds>',
+        type=int,
+        help="""Stop the analysis of a single translation unit after the
+        given wall clock time.""")
+    advanced.add_argument(
+        '--analyzer-memory-limit',
+        metavar='<megabytes>',
+        type=int,
+        help="""Limit the address space of a single analyzer process. (Not
+        available on Windows.)""")
+    advanced.add_argument(
+        '--analyzer-cpu-limit',
+        metavar='<seconds>',
+        type=int,
+        help="""Limit the CPU time of a single analyzer process. (Not
+        available on Windows.)""")
+    advanced.add_argument(
+        '--limit-retries',
+        metavar='<number>',
+        type=int,
+        default=2,
+        help="""When the analysis of a translation unit is stopped by a
+        limit, it is repeated with cheaper options (lower loop and inlining
+        budgets). This sets the number of such attempts (default: 2, which
+        is the maximum). The stopped analyses are reported as failures.""")
     advanced.add_argument(
         '--maxloop',
         '-maxloop',
@@ -292,6 +366,32 @@ def create_analyze_parser(from_build_command):
         Switch the page naming to:
         report-<filename>-<function/method name>-<id>.html
         instead of report-XXXXXX.html""")
+    advanced.add_argument(
+        '--incremental',
+        action='store_true',
+        help="""Analyze only the entries of the compilation database, which
+        changed since the previous run. Entries are considered unchanged when
+        their command, the source file and its dependencies, the analyzer
+        version and the analyzer options are the same. The reports of the
+        unchanged entries are copied from the previous run. The state is kept
+        next to the report directories.""")
+    advanced.add_argument(
+        '--cache-expansions',
+        dest='expansion_cache',
+        action='store_true',
+        help="""Cache the front-end invocations of the compilations (the
+        'clang -###' output) next to the report directories, and reuse them
+        for compilations which differ only in the source and output file.
+        It saves a compiler run per analyzed file, also for later runs.""")
+    advanced.add_argument(
+        '--verify-expansions',
+        metavar='<ratio>',
+        dest='verify_expansion',
+        type=float,
+        default=0.0,
+        help="""Check this ratio (between 0 and 1) of the cached front-end
+        invocations against the real 'clang -###' output. Mismatches are
+        reported and replaced in the cache.""")
     advanced.add_argument(
         '--force-analyze-debug-code',
         dest='force_debug',
@@ -336,6 +436,28 @@ def create_analyze_parser(from_build_command):
     return parser
 
 
+def create_telemetry_parser():
+    """ Creates a parser for command-line arguments to 'telemetry-summary'. """
+
+    parser = create_default_parser()
+    parser.add_argument(
+        '--top',
+        metavar='<number>',
+        type=int,
+        default=10,
+        help="""Number of the slowest entries to list.""")
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help="""Print the summary as JSON.""")
+    parser.add_argument(
+        dest='telemetry',
+        metavar='<file>',
+        help="""The telemetry file written by analyze-build, scan-build or
+        xtu-analyze (with the '--telemetry' flag).""")
+    return parser
+
+
 def create_default_parser():
     """ Creates command line parser for all build wrapper commands. """
 
@@ -9,13 +9,27 @@ Since Clang command line interface is so rich, but this project is using only
 a subset of that, it makes sense to create a function specific wrapper. """
 
 import re
-from libscanbuild import run_command
+import os
+import sys
+import os.path
+import json
+import hashlib
+import logging
+import random
+import tempfile
+import functools
+import itertools
+from multiprocessing.pool import ThreadPool
+from libscanbuild import run_command, replace_file
 from libscanbuild.shell import decode
 
-__all__ = ['get_version', 'get_arguments', 'get_checkers']
+__all__ = ['get_version', 'get_arguments', 'get_checkers',
+           'get_cached_arguments', 'ArgumentsCache']
 
 # regex for activated checker
 ACTIVE_CHECKER_PATTERN = re.compile(r'^-analyzer-checker=(.*)$')
+# the languages which are queried for active checkers
+LANGUAGES = ['c', 'c++', 'objective-c', 'objective-c++']
 
 
 def get_version(clang):
@@ -48,6 +62,276 @@ def get_arguments(command, cwd):
     return decode(last_line)
 
 
+# placeholders of the per file paths in the cached front-end invocations
+SOURCE_PLACEHOLDER = '%%SOURCE%%'
+OUTPUT_PLACEHOLDER = '%%OUTPUT%%'
+BASENAME_PLACEHOLDER = '%%BASENAME%%'
+
+
+class ArgumentsCache(object):
+    """ Memoizes the `get_arguments` calls of compilations which differ only
+    in the source and the output file.
+
+    The `clang -###` output for a compilation depends on the compiler, the
+    flags and the working directory, while the source and the output file
+    names are only copied into it. The cache stores the front-end
+    invocation with placeholders instead of these names, and creates the
+    invocation of other files by substituting their names back. Invocations
+    which refer to the source or output file in any other way (like a
+    dependency or coverage file name) are not cached.
+
+    The entries are stored one per file in the given directory, so the
+    cache persists across runs and can be shared by concurrent processes.
+    When the verify ratio is non zero, that ratio of the cache hits is
+    compared against the real `clang -###` output. On mismatch the real
+    invocation is used and stored. """
+
+    def __init__(self, directory, verify=0.0):
+        self.directory = directory
+        self.verify = verify
+        self.entries = dict()
+        self.stamps = dict()
+        self.stats = {'hits': 0, 'misses': 0, 'uncacheable': 0,
+                      'verified': 0, 'mismatches': 0}
+
+    def get_arguments(self, command, cwd, source, output):
+        """ Capture Clang invocation, like `get_arguments` does.
+
+        :param command: the compilation command
+        :param cwd:     the current working directory
+        :param source:  the source file name in the command
+        :param output:  the output file name in the command
+        :return:        the detailed front-end invocation command """
+
+        key = self.key(command, cwd, source, output)
+        template = self.load(key)
+        if template is None:
+            self.stats['misses'] += 1
+            arguments = get_arguments(command, cwd)
+            self.store(key, make_template(arguments, source, output))
+            return arguments
+
+        self.stats['hits'] += 1
+        arguments = fill_template(template, source, output)
+        if self.verify and random.random() < self.verify:
+            self.stats['verified'] += 1
+            expected = get_arguments(command, cwd)
+            if expected != arguments:
+                self.stats['mismatches'] += 1
+                logging.warning('cached front-end invocation differs for %s',
+                                source)
+                logging.debug('cached: %s, real: %s', arguments, expected)
+                self.store(key, make_template(expected, source, output))
+                return expected
+        return arguments
+
+    def key(self, command, cwd, source, output):
+        """ Returns the cache key of a compilation. """
+
+        def placeholder(arg):
+            """ Replaces the per file names in the command. """
+            if arg == source:
+                return SOURCE_PLACEHOLDER
+            elif arg == output:
+                return OUTPUT_PLACEHOLDER
+            return arg
+
+        # the driver picks the language by the source file extension
+        _, extension = os.path.splitext(source)
+        return json.dumps([self.compiler_stamp(command[0]),
+                           [placeholder(arg) for arg in command[1:]],
+                           os.path.abspath(cwd), extension])
+
+    def compiler_stamp(self, compiler):
+        """ Identifies the compiler executable, to invalidate the entries
+        when the compiler is replaced. """
+
+        if compiler not in self.stamps:
+            self.stamps[compiler] = [compiler] + \
+                (file_stamp(find_executable(compiler)) or [])
+        return self.stamps[compiler]
+
+    def filename(self, key):
+        """ Returns the file name which stores the given entry. """
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def load(self, key):
+        """ Returns the cached template of the key, or None when missing. """
+
+        if key not in self.entries:
+            try:
+                with open(self.filename(key), 'r') as handle:
+                    content = json.load(handle)
+                if content['key'] != key:
+                    return None
+                self.entries[key] = content['arguments']
+            except (IOError, OSError, ValueError, KeyError):
+                return None
+        return self.entries[key]
+
+    def store(self, key, template):
+        """ Writes the template into the cache. The file is written under a
+        temporary name and renamed, so readers never see partial entries. """
+
+        if template is None:
+            self.stats['uncacheable'] += 1
+            return
+        self.entries[key] = template
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+        except OSError:
+            # another process might have created it meanwhile
+            if not os.path.isdir(self.directory):
+                raise
+        (handle, name) = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(handle, 'w') as stream:
+            json.dump({'key': key, 'arguments': template}, stream)
+        replace_file(name, self.filename(key))
+
+
+def make_template(arguments, source, output):
+    """ Replace the source and output file names in the front-end
+    invocation with placeholders.
+
+    :return: the template, or None when the file names are used in any
+    other form than the placeholders can restore. """
+
+    basename = os.path.basename(source)
+    result = []
+    args = iter(arguments)
+    for arg in args:
+        if arg == source:
+            result.append(SOURCE_PLACEHOLDER)
+        elif arg == output:
+            result.append(OUTPUT_PLACEHOLDER)
+        elif arg == '-main-file-name':
+            value = next(args, None)
+            if value != basename:
+                return None
+            result.extend([arg, BASENAME_PLACEHOLDER])
+        elif source in arg or output in arg or basename in arg:
+            return None
+        else:
+            result.append(arg)
+    return result
+
+
+def fill_template(template, source, output):
+    """ Substitute the file names into the template made by
+    `make_template`. """
+
+    mapping = {
+        SOURCE_PLACEHOLDER: source,
+        OUTPUT_PLACEHOLDER: output,
+        BASENAME_PLACEHOLDER: os.path.basename(source)
+    }
+    return [mapping.get(arg, arg) for arg in template]
+
+
+def find_executable(name):
+    """ Returns the path of the executable as the shell would find it, or
+    None when it's not found. """
+
+    if os.path.dirname(name):
+        return name if os.path.isfile(name) else None
+    for directory in os.getenv('PATH', os.defpath).split(os.pathsep):
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def file_stamp(filename):
+    """ Identifies the content of a file without reading it.
+
+    :return: the real path, the size and the modification time of the file,
+    or None when the file does not exist. """
+
+    if filename is None or not os.path.isfile(filename):
+        return None
+    stat = os.stat(filename)
+    return [os.path.realpath(filename), stat.st_size, stat.st_mtime]
+
+
+def user_cache_dir():
+    """ Returns the directory for the cache files of the current user. """
+
+    base = os.getenv('XDG_CACHE_HOME')
+    if not base and sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    elif not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'scan-build')
+
+
+def cached_query(name, clang, plugins, query):
+    """ Returns the result of a query, which depends only on the compiler and
+    the plugins, from the user cache.
+
+    The entries are identified by the path, the size and the modification
+    time of the compiler and the plugins. On miss the query is executed and
+    its result is stored. Errors of the cache itself are not fatal, the
+    query is executed in that case.
+
+    :param name:    the name of the query
+    :param clang:   the compiler we are using
+    :param plugins: list of plugins which was requested by the user
+    :param query:   the method which computes the result (JSON value)
+    :return:        the result of the query """
+
+    stamps = [file_stamp(find_executable(clang))] + \
+        [file_stamp(plugin) for plugin in plugins]
+    if any(stamp is None for stamp in stamps):
+        return query()
+
+    key = json.dumps([name, stamps])
+    directory = os.path.join(user_cache_dir(), 'checkers')
+    filename = os.path.join(
+        directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+    try:
+        with open(filename, 'r') as handle:
+            content = json.load(handle)
+        if content['key'] == key:
+            logging.debug('%s of %s from the cache %s', name, clang, filename)
+            return content['value']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    value = query()
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        (handle, temporary) = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(handle, 'w') as stream:
+            json.dump({'key': key, 'value': value}, stream)
+        replace_file(temporary, filename)
+    except (IOError, OSError):
+        logging.debug('could not write the cache %s', filename)
+    return value
+
+
+# one cache object per directory in a process, to keep the loaded entries
+# between the calls of the pool workers
+ARGUMENTS_CACHES = dict()
+
+
+def get_cached_arguments(command, cwd, source, output, directory,
+                         verify=0.0):
+    """ Capture Clang invocation through the cache in the given directory.
+    Without directory it's the same as `get_arguments`. """
+
+    if not directory:
+        return get_arguments(command, cwd)
+    if directory not in ARGUMENTS_CACHES:
+        ARGUMENTS_CACHES[directory] = ArgumentsCache(directory)
+    cache = ARGUMENTS_CACHES[directory]
+    cache.verify = verify
+    return cache.get_arguments(command, cwd, source, output)
+
+
 def get_active_checkers(clang, plugins):
     """ Get the active checker list.
 
@@ -58,23 +342,35 @@ def get_active_checkers(clang, plugins):
     To get the default checkers we execute Clang to print how this
     compilation would be called. And take out the enabled checker from the
     arguments. For input file we specify stdin and pass only language
-    information. """
+    information. The languages are queried concurrently, and the result is
+    kept in the user cache. """
+
+    def query():
+        """ Returns the active checkers of all languages. """
 
-    def get_active_checkers_for(language):
-        """ Returns a list of active checkers for the given language. """
+        pool = ThreadPool(len(LANGUAGES))
+        try:
+            checkers = pool.map(
+                functools.partial(get_active_checkers_for, clang, plugins),
+                LANGUAGES)
+        finally:
+            pool.close()
+            pool.join()
+        return sorted(set(itertools.chain.from_iterable(checkers)))
 
-        load_args = [arg
-                     for plugin in plugins
-                     for arg in ['-Xclang', '-load', '-Xclang', plugin]]
-        cmd = [clang, '--analyze'] + load_args + ['-x', language, '-']
-        return [ACTIVE_CHECKER_PATTERN.match(arg).group(1)
-                for arg in get_arguments(cmd, '.')
-                if ACTIVE_CHECKER_PATTERN.match(arg)]
+    return frozenset(cached_query('active checkers', clang, plugins, query))
 
-    result = set()
-    for language in ['c', 'c++', 'objective-c', 'objective-c++']:
-        result.update(get_active_checkers_for(language))
-    return frozenset(result)
+
+def get_active_checkers_for(clang, plugins, language):
+    """ Returns a list of active checkers for the given language. """
+
+    load_args = [arg
+                 for plugin in plugins
+                 for arg in ['-Xclang', '-load', '-Xclang', plugin]]
+    cmd = [clang, '--analyze'] + load_args + ['-x', language, '-']
+    return [ACTIVE_CHECKER_PATTERN.match(arg).group(1)
+            for arg in get_arguments(cmd, '.')
+            if ACTIVE_CHECKER_PATTERN.match(arg)]
 
 
 def is_active(checkers):
@@ -137,18 +433,27 @@ def get_checkers(clang, plugins):
 
     {<checker name>: (<checker description>, <is active by default>)} """
 
-    load = [elem for plugin in plugins for elem in ['-load', plugin]]
-    cmd = [clang, '-cc1'] + load + ['-analyzer-checker-help']
-
-    lines = run_command(cmd)
-
-    is_active_checker = is_active(get_active_checkers(clang, plugins))
-
-    checkers = {
-        name: (description, is_active_checker(name))
-        for name, description in parse_checkers(lines)
-    }
-    if not checkers:
-        raise Exception('Could not query Clang for available checkers.')
-
-    return checkers
+    def query():
+        """ Returns the checkers with their description and status. """
+
+        load = [elem for plugin in plugins for elem in ['-load', plugin]]
+        cmd = [clang, '-cc1'] + load + ['-analyzer-checker-help']
+
+        pool = ThreadPool(1)
+        try:
+            lines = pool.apply_async(run_command, (cmd,))
+            is_active_checker = is_active(get_active_checkers(clang, plugins))
+            lines = lines.get()
+        finally:
+            pool.close()
+            pool.join()
+
+        checkers = dict(
+            (name, [description, is_active_checker(name)])
+            for name, description in parse_checkers(lines))
+        if not checkers:
+            raise Exception('Could not query Clang for available checkers.')
+        return checkers
+
+    return dict((name, tuple(value)) for name, value in
+                cached_query('checkers', clang, plugins, query).items())
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" This module is responsible to read and write the compilation database.
+
+A compilation database of a large project can be hundreds of megabytes.
+Loading it with the `json` module creates every entry at once, and the
+text of the whole file is also kept in memory during the parse. These
+methods process the entries one by one instead, so memory use does not
+depend on the size of the database. """
+
+import re
+import os
+import os.path
+import json
+import stat
+import hashlib
+import tempfile
+from libscanbuild import replace_file
+
+__all__ = ['read_entries', 'write_entries', 'entry_digest']
+
+# the size of the text read at once
+CHUNK_SIZE = 1 << 16
+# regex for whitespace characters between the entries
+WHITESPACE = re.compile(r'\s*')
+
+
+def read_entries(filename, chunk_size=CHUNK_SIZE):
+    """ Generate the entries of a compilation database file.
+
+    The file is read in chunks, and only the unparsed part of the text is
+    kept in memory.
+
+    :param filename:    the compilation database file
+    :param chunk_size:  the size of the text read at once
+    :return:            generator of the entries """
+
+    decoder = json.JSONDecoder()
+    with open(filename, 'r') as handle:
+        buffer = ''
+        position = 0
+        expected = '['
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                # need more text to continue
+                chunk = handle.read(chunk_size)
+                if not chunk:
+                    raise ValueError(
+                        'unexpected end of compilation database {0}'.format(
+                            filename))
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            current = buffer[position]
+            if current == ']' and expected in {',', 'entry'}:
+                return
+            elif current in '[,' and current == expected:
+                position += 1
+                expected = 'entry'
+                continue
+            elif expected != 'entry':
+                raise ValueError(
+                    'expected "{0}" in compilation database {1}'.format(
+                        expected, filename))
+            try:
+                entry, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # might be incomplete, read the next chunk
+                chunk = handle.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            position = end
+            expected = ','
+            yield entry
+
+
+def write_entries(filename, entries):
+    """ Write the entries into a compilation database file.
+
+    The output is the same as `json.dump(list(entries), handle,
+    sort_keys=True, indent=4)` would create, but entries are written one
+    by one. The file is written under a temporary name and renamed at the
+    end, so the entries might come from the same file.
+
+    :param filename:    the compilation database file
+    :param entries:     iterable of entries
+    :return:            the number of written entries """
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    (handle, name) = tempfile.mkstemp(prefix='.compile_commands-',
+                                      suffix='.tmp', dir=directory)
+    count = 0
+    done = False
+    try:
+        with os.fdopen(handle, 'w') as stream:
+            for entry in entries:
+                stream.write('[\n' if count == 0 else ',\n')
+                text = json.dumps(entry, sort_keys=True, indent=4)
+                stream.write('\n'.join('    ' + line
+                                       for line in text.split('\n')))
+                count += 1
+            stream.write('\n]' if count else '[]')
+        # the temporary file is private, give it the mode of a new file
+        os.chmod(name, file_mode(filename))
+        replace_file(name, filename)
+        done = True
+    finally:
+        if not done:
+            os.remove(name)
+    return count
+
+
+def file_mode(filename):
+    """ Returns the permissions of an existing file, or the permissions a
+    new file would get with the current umask. """
+
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def entry_digest(key):
+    """ Returns a fixed size digest of an entry key.
+
+    Duplicate checks keep the keys of every seen entry. The digest is used
+    instead of the key, to keep the memory use per entry small and constant,
+    independent of the length of the commands. """
+
+    return hashlib.sha1(key.encode('utf-8')).digest()
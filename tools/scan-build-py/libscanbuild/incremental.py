@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" This module implements the bookkeeping of the incremental analysis.
+
+An entry of the compilation database is analyzed again only when one of its
+inputs changed since the previous run. The inputs are the compilation
+command, the analyzer (its version and the parameters, which select the
+checkers) and the content of the source file and its dependencies. For
+every analyzed entry the manifest records these inputs and keeps a copy of
+the reports, which are carried forward into the next reports when the entry
+is unchanged. """
+
+import re
+import os
+import os.path
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from libscanbuild import replace_file
+
+__all__ = ['Manifest', 'parse_dependencies', 'copy_reports']
+
+
+class Manifest(object):
+    """ The inputs and the reports of the previously analyzed entries.
+
+    The manifest is stored in a directory, with the reports of the entries
+    in separate subdirectories. """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.filename = os.path.join(directory, 'manifest.json')
+        self.entries = dict()
+        # the state of the files in this run, to read each of them once
+        self.states = dict()
+        try:
+            with open(self.filename, 'r') as handle:
+                self.entries = json.load(handle)
+        except (IOError, OSError, ValueError):
+            logging.debug('no incremental analysis manifest at %s',
+                          self.filename)
+
+    @staticmethod
+    def key(entry):
+        """ Returns the identifier of a compilation database entry. """
+
+        command = entry.get('command', entry.get('arguments'))
+        return digest(json.dumps([entry['directory'], entry['file'], command],
+                                 sort_keys=True).encode('utf-8'))
+
+    @staticmethod
+    def fingerprint(parameters):
+        """ Returns the hash of the analyzer parameters, which are the same
+        for all entries. """
+
+        return digest(json.dumps(parameters, sort_keys=True).encode('utf-8'))
+
+    def reports_dir(self, key):
+        """ Returns the directory which keeps the reports of an entry. """
+
+        return os.path.join(self.directory, 'reports', key)
+
+    def is_current(self, key, fingerprint):
+        """ Returns True when the entry was analyzed with the same analyzer
+        parameters and none of its dependencies has changed since. """
+
+        previous = self.entries.get(key)
+        if previous is None or previous['fingerprint'] != fingerprint:
+            return False
+        if not os.path.isdir(self.reports_dir(key)):
+            return False
+        dependencies = previous['dependencies']
+        for filename, state in dependencies.items():
+            current = self.state(filename, state)
+            if current is None or current[2] != state[2]:
+                return False
+            # keep the last modification time, to not hash again next time
+            dependencies[filename] = current
+        return True
+
+    def state(self, filename, previous=None):
+        """ Returns the modification time, size and content hash of a file,
+        or None when it's missing. The content is not read when the
+        modification time and the size are the same as the previous. """
+
+        if filename not in self.states:
+            try:
+                stat = os.stat(filename)
+                current = [stat.st_mtime, stat.st_size]
+                if previous is not None and previous[:2] == current:
+                    current.append(previous[2])
+                else:
+                    current.append(digest_file(filename))
+                self.states[filename] = current
+            except (IOError, OSError):
+                self.states[filename] = None
+        return self.states[filename]
+
+    def update(self, key, fingerprint, dependencies):
+        """ Records the inputs of an analyzed entry. """
+
+        states = dict((filename, self.state(filename))
+                      for filename in dependencies)
+        if any(state is None for state in states.values()):
+            logging.debug('dependency is missing, not recorded: %s', key)
+            self.remove(key)
+            return
+        self.entries[key] = {'fingerprint': fingerprint,
+                             'dependencies': states}
+
+    def remove(self, key):
+        """ Forgets an entry. (It will be analyzed in the next run.) """
+
+        self.entries.pop(key, None)
+
+    def prune(self, keys):
+        """ Forgets the entries which are not in the given set, and deletes
+        their reports. """
+
+        keys = set(keys)
+        for key in set(self.entries) - keys:
+            self.remove(key)
+        reports = os.path.join(self.directory, 'reports')
+        if os.path.isdir(reports):
+            for key in set(os.listdir(reports)) - keys:
+                shutil.rmtree(os.path.join(reports, key), ignore_errors=True)
+
+    def save(self):
+        """ Writes the manifest into its directory. """
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        (handle, name) = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(handle, 'w') as stream:
+            json.dump(self.entries, stream)
+        replace_file(name, self.filename)
+
+
+def digest(content):
+    """ Returns the hash of the given bytes. """
+
+    return hashlib.sha1(content).hexdigest()
+
+
+def digest_file(filename):
+    """ Returns the hash of the file content. """
+
+    result = hashlib.sha1()
+    with open(filename, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 16), b''):
+            result.update(chunk)
+    return result.hexdigest()
+
+
+def parse_dependencies(lines, cwd):
+    """ Parse the output of the compiler `-M` flag.
+
+    :param lines:   the lines of the make rule
+    :param cwd:     the directory where the compiler was running
+    :return:        list of absolute file names the target depends on """
+
+    content = ' '.join(line[:-1] if line.endswith('\\') else line
+                       for line in (line.rstrip() for line in lines))
+    # skip the target(s) of the rule
+    match = re.search(r'(?<!\\):(\s|$)', content)
+    if match:
+        content = content[match.end():]
+    files = [re.sub(r'\\(.)', r'\1', name).replace('$$', '$')
+             for name in re.split(r'(?<!\\)\s+', content) if name]
+    return [os.path.normpath(os.path.join(cwd, name)) for name in files]
+
+
+def copy_reports(source, destination):
+    """ Copy report files from one directory to another, and keep their
+    relative path. Files which exist in the destination are copied with a
+    new name.
+
+    :return:    the number of copied files """
+
+    count = 0
+    for root, _, files in os.walk(source):
+        target_dir = os.path.join(destination, os.path.relpath(root, source))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        for name in files:
+            target = os.path.join(target_dir, name)
+            if os.path.exists(target):
+                stem, extension = name.split('.', 1) if '.' in name \
+                    else (name, '')
+                (handle, target) = tempfile.mkstemp(
+                    prefix=stem + '-',
+                    suffix='.' + extension if extension else '',
+                    dir=target_dir)
+                os.close(handle)
+            shutil.copy2(os.path.join(root, name), target)
+            count += 1
+    return count
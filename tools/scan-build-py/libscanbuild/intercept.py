@@ -11,7 +11,8 @@ mechanisms provided by the dynamic linker. The related library is implemented
 in C language and can be found under 'libear' directory.
 
 The 'libear' library is capturing all child process creation and logging the
-relevant information about it into separate files in a specified directory.
+relevant information about it into separate files (or into a single shared
+file) in a specified directory.
 The parameter of this process is the output directory name, where the report
 files shall be placed. This parameter is passed as an environment variable.
 
@@ -24,8 +25,9 @@ import sys
 import os
 import os.path
 import re
+import codecs
+import struct
 import itertools
-import json
 import glob
 import logging
 from libear import build_libear, TemporaryDirectory
@@ -33,6 +35,7 @@ from libscanbuild import command_entry_point, compiler_wrapper, \
     wrapper_environment, run_command, run_build
 from libscanbuild import duplicate_check
 from libscanbuild.compilation import split_command
+from libscanbuild.database import read_entries, write_entries, entry_digest
 from libscanbuild.arguments import parse_args_for_intercept_build
 from libscanbuild.shell import encode, decode
 
@@ -45,6 +48,11 @@ US = chr(0x1f)
 COMPILER_WRAPPER_CC = 'intercept-cc'
 COMPILER_WRAPPER_CXX = 'intercept-c++'
 TRACE_FILE_EXTENSION = '.cmd'  # same as in ear.c
+SHARED_TRACE_FILE = 'shared' + TRACE_FILE_EXTENSION  # same as in ear.c
+TRACE_MAGIC = 0x7f454152  # same as in ear.c
+TRACE_CHUNK_SIZE = 1 << 16
+HEADER_STRUCT = struct.Struct('!II')  # magic, size of the rest
+PIDS_STRUCT = struct.Struct('!II')  # pid, ppid
 WRAPPER_ONLY_PLATFORMS = frozenset({'win32', 'cygwin'})
 
 
@@ -74,29 +82,33 @@ def capture(args):
             format_entry(command) for command in commands)
         # read entries from previous run
         if 'append' in args and args.append and os.path.isfile(args.cdb):
-            with open(args.cdb) as handle:
-                previous = iter(json.load(handle))
+            previous = read_entries(args.cdb)
         else:
             previous = iter([])
         # filter out duplicate entries from both
-        duplicate = duplicate_check(entry_hash)
+        duplicate = duplicate_check(
+            lambda entry: entry_digest(entry_hash(entry)))
         return (entry
                 for entry in itertools.chain(previous, current)
                 if os.path.exists(entry['file']) and not duplicate(entry))
 
     with TemporaryDirectory(prefix='intercept-') as tmp_dir:
+        # the interception library and the wrappers append to this file,
+        # instead of creating a file per process, when it exists
+        if 'shared_trace' in args and args.shared_trace:
+            open(os.path.join(tmp_dir, SHARED_TRACE_FILE), 'wb').close()
         # run the build command
         environment = setup_environment(args, tmp_dir)
         exit_code = run_build(args.build, env=environment)
         # read the intercepted exec calls
         exec_traces = itertools.chain.from_iterable(
             parse_exec_trace(os.path.join(tmp_dir, filename))
-            for filename in sorted(glob.iglob(os.path.join(tmp_dir, '*.cmd'))))
+            for filename in sorted(glob.iglob(
+                os.path.join(tmp_dir, '*' + TRACE_FILE_EXTENSION))))
         # do post processing
         entries = post_processing(exec_traces)
-        # dump the compilation database
-        with open(args.cdb, 'w+') as handle:
-            json.dump(list(entries), handle, sort_keys=True, indent=4)
+        # dump the compilation database, entries are streamed through
+        write_entries(args.cdb, entries)
         return exit_code
 
 
@@ -155,10 +167,12 @@ def intercept_compiler_wrapper_impl(_, execution):
     if not target_dir:
         logging.warning(message_prefix, 'missing target directory')
         return
-    # write current execution info to the pid file
+    # write current execution info to the shared or to the pid file
     try:
-        target_file_name = str(os.getpid()) + TRACE_FILE_EXTENSION
-        target_file = os.path.join(target_dir, target_file_name)
+        target_file = os.path.join(target_dir, SHARED_TRACE_FILE)
+        if not os.path.exists(target_file):
+            target_file_name = str(os.getpid()) + TRACE_FILE_EXTENSION
+            target_file = os.path.join(target_dir, target_file_name)
         logging.debug('writing execution report to: %s', target_file)
         write_exec_trace(target_file, execution)
     except IOError:
@@ -169,16 +183,38 @@ def write_exec_trace(filename, entry):
     """ Write execution report file.
 
     This method shall be sync with the execution report writer in interception
-    library. The entry in the file is a JSON objects.
+    library. The record is appended with a single write call, so processes
+    can share the same file.
 
     :param filename:    path to the output execution trace file,
     :param entry:       the Execution object to append to that file. """
 
-    with open(filename, 'ab') as handler:
-        pid = str(entry.pid)
-        command = US.join(entry.cmd) + US
-        content = RS.join([pid, pid, 'wrapper', entry.cwd, command]) + GS
-        handler.write(content.encode('utf-8'))
+    record = encode_exec_trace(entry.pid, entry.pid, 'wrapper', entry.cwd,
+                               entry.cmd)
+    # the record is binary, no newline translation on Windows
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+    handle = os.open(filename, flags, 0o666)
+    try:
+        written = 0
+        while written < len(record):
+            written += os.write(handle, record[written:])
+    finally:
+        os.close(handle)
+
+
+def encode_exec_trace(pid, ppid, function, cwd, command):
+    """ Returns the bytes of an execution report record.
+
+    A record starts with a magic number and the size of the rest of the
+    record. Then comes the pid and the parent pid, followed by the function
+    name, the working directory and the command arguments as zero terminated
+    strings. (Process arguments can not contain zero bytes.) The numbers are
+    32 bit unsigned integers in network byte order. """
+
+    strings = b''.join(value.encode('utf-8') + b'\0'
+                       for value in [function, cwd] + command)
+    body = PIDS_STRUCT.pack(int(pid), int(ppid)) + strings
+    return HEADER_STRUCT.pack(TRACE_MAGIC, len(body)) + body
 
 
 def parse_exec_trace(filename):
@@ -186,12 +222,73 @@ def parse_exec_trace(filename):
 
     Given filename points to a file which contains the basic report
     generated by the interception library or wrapper command. A single
-    report file _might_ contain multiple process creation info. """
+    report file _might_ contain multiple process creation info.
+
+    The file is read in chunks, the records are generated one by one.
+    Files in the former, separator based format are also understood. """
 
     logging.debug('parse exec trace file: %s', filename)
-    with open(filename, 'r') as handler:
-        content = handler.read()
-        for group in filter(bool, content.split(GS)):
+    with open(filename, 'rb') as handle:
+        head = handle.read(HEADER_STRUCT.size)
+        if len(head) == HEADER_STRUCT.size and \
+                HEADER_STRUCT.unpack(head)[0] == TRACE_MAGIC:
+            records = parse_binary_trace(handle, head)
+        else:
+            records = parse_text_trace(handle, head)
+        for record in records:
+            yield record
+
+
+def parse_binary_trace(handle, head=b'', chunk_size=TRACE_CHUNK_SIZE):
+    """ Generate the records of a length prefixed execution report.
+
+    :param handle:      the file to read from,
+    :param head:        the bytes which were already read from the file,
+    :param chunk_size:  the size of the content read at once. """
+
+    header_size = HEADER_STRUCT.size
+    pids_size = PIDS_STRUCT.size
+    unpack_header = HEADER_STRUCT.unpack_from
+    unpack_pids = PIDS_STRUCT.unpack_from
+    buffer = head
+    for chunk in iter(lambda: handle.read(chunk_size), b''):
+        buffer = buffer + chunk if buffer else chunk
+        position = 0
+        end = len(buffer)
+        while end - position >= header_size:
+            magic, size = unpack_header(buffer, position)
+            if magic != TRACE_MAGIC or size < pids_size + 2:
+                raise ValueError('corrupt execution report: {0}'.format(
+                    handle.name))
+            start = position + header_size
+            if end - start < size:
+                break
+            position = start + size
+            pid, ppid = unpack_pids(buffer, start)
+            strings = buffer[start + pids_size:position - 1]\
+                .decode('utf-8', 'replace').split('\0')
+            yield {
+                'pid': str(pid),
+                'ppid': str(ppid),
+                'function': strings[0],
+                'directory': strings[1],
+                'command': strings[2:]
+            }
+        buffer = buffer[position:]
+    if buffer:
+        logging.warning('execution report is truncated: %s', handle.name)
+
+
+def parse_text_trace(handle, head=b'', chunk_size=TRACE_CHUNK_SIZE):
+    """ Generate the records of a separator based execution report. """
+
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    remainder = ''
+    for chunk in itertools.chain([head], iter(lambda: handle.read(chunk_size),
+                                              b'')):
+        groups = (remainder + decoder.decode(chunk)).split(GS)
+        remainder = groups.pop()
+        for group in filter(bool, groups):
             records = group.split(RS)
             yield {
                 'pid': records[0],
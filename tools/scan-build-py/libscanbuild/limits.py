@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" This module implements the resource limits of the analyzer runs.
+
+A single translation unit can keep the analyzer busy for hours, or make it
+allocate all the memory of the machine (and get the other workers killed).
+The analyzer processes are started with an address space and a CPU time
+limit, and killed when a wall clock timeout expires. When a limit is hit,
+the analysis is repeated with cheaper analyzer options: with lower loop
+and inlining budgets. """
+
+import os
+import re
+import sys
+import signal
+import logging
+import threading
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where only the timeout is applied
+    resource = None
+
+__all__ = ['run_limited', 'LimitExceeded', 'RETRY_TIERS']
+
+# the analyzer front-end options of the retries, in the order of their use
+RETRY_TIERS = [
+    ['-analyzer-max-loop', '2', '-analyzer-inline-max-stack-depth', '2'],
+    ['-analyzer-max-loop', '1', '-analyzer-config', 'ipa=none']
+]
+# regex for the messages of a failed allocation
+OUT_OF_MEMORY_PATTERN = re.compile(
+    r'out of memory|std::bad_alloc|Cannot allocate memory')
+# the CPU time after the limit, until the process gets killed
+CPU_GRACE_SECONDS = 5
+
+
+class LimitExceeded(subprocess.CalledProcessError):
+    """ The command was stopped by a resource limit.
+
+    The `limit` attribute tells which limit was hit: 'timeout',
+    'memory_limit' or 'cpu_limit'. """
+
+    def __init__(self, limit, returncode, cmd, output=None):
+        subprocess.CalledProcessError.__init__(self, returncode, cmd, output)
+        self.limit = limit
+
+    def __str__(self):
+        return 'Command {0} stopped by {1}'.format(
+            self.cmd, self.limit.replace('_', ' '))
+
+
+def run_limited(command, cwd=None, limits=None, usage=None):
+    """ Run a given command with resource limits, like `run_command` does.
+
+    :param command: array of tokens
+    :param cwd:     the working directory where the command will be executed
+    :param limits:  dictionary of the limits, the values might be missing:
+                    'timeout' (wall clock seconds), 'memory' (megabytes of
+                    address space), 'cpu' (CPU seconds)
+    :param usage:   dictionary to add the resource usage of the command to
+                    (see `wait`), or None
+    :return:        output of the command
+
+    Raises LimitExceeded when the command was stopped by a limit, and
+    CalledProcessError when it failed otherwise. """
+
+    limits = limits or dict()
+    timeout = limits.get('timeout')
+    memory = limits.get('memory')
+    cpu = limits.get('cpu')
+
+    def preexec():
+        """ Runs in the child process, before the command is executed. """
+
+        # a new process group, to kill the children at timeout too
+        os.setsid()
+        if memory:
+            size = memory << 20
+            resource.setrlimit(resource.RLIMIT_AS, (size, size))
+        if cpu:
+            resource.setrlimit(resource.RLIMIT_CPU,
+                               (cpu, cpu + CPU_GRACE_SECONDS))
+
+    directory = os.path.abspath(cwd) if cwd else os.getcwd()
+    logging.debug('exec command %s in %s with limits %s', command, directory,
+                  limits)
+    process = subprocess.Popen(
+        command,
+        cwd=directory,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        preexec_fn=preexec if resource is not None else None)
+    expired = threading.Event()
+
+    def kill():
+        """ Kills the process group of the command at timeout. """
+
+        expired.set()
+        try:
+            if resource is not None:
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except OSError:
+            pass
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer is not None:
+        timer.start()
+    try:
+        output = process.stdout.read()
+        process.stdout.close()
+        code = wait(process, usage)
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    output = output.decode('utf-8', 'replace').splitlines()
+    if code == 0:
+        return output
+    limit = classify(code, output, expired.is_set(), limits)
+    if limit is not None:
+        raise LimitExceeded(limit, code, command, output)
+    raise subprocess.CalledProcessError(code, command, output)
+
+
+def wait(process, usage):
+    """ Waits for the process to terminate and returns its exit code.
+
+    When the usage dictionary is given, the resource usage of the process
+    (and its children) is added to it: 'user' and 'sys' CPU seconds and the
+    'max_rss' in kilobytes. It's the same as `getrusage(RUSAGE_CHILDREN)`
+    would tell, but only about this process, while other processes might
+    run concurrently. """
+
+    if usage is None or not hasattr(os, 'wait4'):
+        return process.wait()
+
+    _, status, rusage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    # the maximum resident set size is in bytes on OS X
+    max_rss = rusage.ru_maxrss // 1024 if sys.platform == 'darwin' \
+        else rusage.ru_maxrss
+    usage['user'] = usage.get('user', 0.0) + rusage.ru_utime
+    usage['sys'] = usage.get('sys', 0.0) + rusage.ru_stime
+    usage['max_rss'] = max(usage.get('max_rss', 0), max_rss)
+    return process.returncode
+
+
+def classify(returncode, output, expired, limits):
+    """ Returns the name of the limit which stopped the command, or None
+    when it failed for another reason. """
+
+    if expired:
+        return 'timeout'
+    if limits.get('cpu') and -returncode in {getattr(signal, 'SIGXCPU', 0),
+                                             getattr(signal, 'SIGKILL', 0)}:
+        return 'cpu_limit'
+    if limits.get('memory') and \
+            any(OUT_OF_MEMORY_PATTERN.search(line) for line in output):
+        return 'memory_limit'
+    return None
@@ -16,14 +16,21 @@ import shutil
 import itertools
 import plistlib
 import glob
-import json
 import logging
 import datetime
+import collections
+import multiprocessing
 from libscanbuild import duplicate_check
 from libscanbuild.clang import get_version
+from libscanbuild.database import read_entries
 
 __all__ = ['document']
 
+# parse the report files in parallel above this number of files
+PARALLEL_THRESHOLD = 256
+# the number of bugs on a page of a large report
+PAGE_SIZE = 1000
+
 
 def document(args):
     """ Generates cover report and returns the number of bugs/crashes. """
@@ -31,9 +38,11 @@ def document(args):
     html_reports_available = args.output_format in {'html', 'plist-html'}
 
     logging.debug('count crashes and bugs')
-    crash_count = sum(1 for _ in read_crashes(args.output))
+    index = read_index(args.output, html_reports_available,
+                       getattr(args, 'jobs', None))
+    crash_count = len(index['crashes'])
     bug_counter = create_counters()
-    for bug in read_bugs(args.output, html_reports_available):
+    for bug in index['bugs']:
         bug_counter(bug)
     result = crash_count + bug_counter.total
 
@@ -43,14 +52,27 @@ def document(args):
         logging.debug('generate index.html file')
         # common prefix for source files to have sorter path
         prefix = commonprefix_from(args.cdb) if use_cdb else os.getcwd()
+        if args.html_title is None:
+            args.html_title = os.path.basename(prefix) + ' - analyzer results'
+        # large reports are split into pages, to keep those loadable
+        page_size = getattr(args, 'report_page_size', PAGE_SIZE)
+        paginate = page_size and bug_counter.total > page_size
         # assemble the cover from multiple fragments
         fragments = []
         try:
-            if bug_counter.total:
+            if bug_counter.total and paginate:
+                fragments.append(bug_summary(args.output, bug_counter, False))
+                fragments.append(file_summary(args.output, prefix,
+                                              index['bugs']))
+                fragments.append(bug_pages(args.output, prefix, index['bugs'],
+                                           page_size, args.html_title))
+            elif bug_counter.total:
                 fragments.append(bug_summary(args.output, bug_counter))
-                fragments.append(bug_report(args.output, prefix))
+                fragments.append(bug_report(args.output, prefix,
+                                            index['bugs']))
             if crash_count:
-                fragments.append(crash_report(args.output, prefix))
+                fragments.append(crash_report(args.output, prefix,
+                                              index['crashes']))
             assemble_cover(args, prefix, fragments)
             # copy additional files to the report
             copy_resource_files(args.output)
@@ -68,20 +90,9 @@ def assemble_cover(args, prefix, fragments):
     import getpass
     import socket
 
-    if args.html_title is None:
-        args.html_title = os.path.basename(prefix) + ' - analyzer results'
-
     with open(os.path.join(args.output, 'index.html'), 'w') as handle:
         indent = 0
-        handle.write(reindent("""
-        |<!DOCTYPE html>
-        |<html>
-        |  <head>
-        |    <title>{html_title}</title>
-        |    <link type="text/css" rel="stylesheet" href="scanview.css"/>
-        |    <script type='text/javascript' src="sorttable.js"></script>
-        |    <script type='text/javascript' src='selectable.js'></script>
-        |  </head>""", indent).format(html_title=args.html_title))
+        handle.write(page_head(args.html_title))
         handle.write(comment('SUMMARYENDHEAD'))
         handle.write(reindent("""
         |  <body>
@@ -109,8 +120,37 @@ def assemble_cover(args, prefix, fragments):
         |</html>""", indent))
 
 
-def bug_summary(output_dir, bug_counter):
-    """ Bug summary is a HTML table to give a better overview of the bugs. """
+def page_head(title):
+    """ Returns the beginning of a report page, till the end of the head. """
+
+    return reindent("""
+        |<!DOCTYPE html>
+        |<html>
+        |  <head>
+        |    <title>{html_title}</title>
+        |    <link type="text/css" rel="stylesheet" href="scanview.css"/>
+        |    <script type='text/javascript' src="sorttable.js"></script>
+        |    <script type='text/javascript' src='selectable.js'></script>
+        |  </head>""", 0).format(html_title=title)
+
+
+def bug_summary(output_dir, bug_counter, toggles=True):
+    """ Bug summary is a HTML table to give a better overview of the bugs.
+
+    The toggles are the check boxes, which hide or show the bugs of a type.
+    Those work only when the bugs are on the same page. """
+
+    def toggle(element):
+        """ Returns the check box cell of a row. """
+
+        if not toggles:
+            return ''
+        return reindent("""
+        |      <td>
+        |        <center>
+        |          <input checked type="checkbox"{0}/>
+        |        </center>
+        |      </td>""", indent).format(element)
 
     name = os.path.join(output_dir, 'summary.html.fragment')
     with open(name, 'w') as handle:
@@ -121,39 +161,38 @@ def bug_summary(output_dir, bug_counter):
         |  <thead>
         |    <tr>
         |      <td>Bug Type</td>
-        |      <td>Quantity</td>
-        |      <td class="sorttable_nosort">Display?</td>
+        |      <td>Quantity</td>""", indent))
+        if toggles:
+            handle.write(reindent("""
+        |      <td class="sorttable_nosort">Display?</td>""", indent))
+        handle.write(reindent("""
         |    </tr>
         |  </thead>
         |  <tbody>""", indent))
         handle.write(reindent("""
         |    <tr style="font-weight:bold">
         |      <td class="SUMM_DESC">All Bugs</td>
-        |      <td class="Q">{0}</td>
-        |      <td>
-        |        <center>
-        |          <input checked type="checkbox" id="AllBugsCheck"
-        |                 onClick="CopyCheckedStateToCheckButtons(this);"/>
-        |        </center>
-        |      </td>
-        |    </tr>""", indent).format(bug_counter.total))
+        |      <td class="Q">{0}</td>""", indent).format(bug_counter.total))
+        handle.write(toggle(' id="AllBugsCheck"\n' + ' ' * (indent + 17) +
+                            'onClick="CopyCheckedStateToCheckButtons(this);"'))
+        handle.write(reindent("""
+        |    </tr>""", indent))
         for category, types in bug_counter.categories.items():
             handle.write(reindent("""
         |    <tr>
-        |      <th>{0}</th><th colspan=2></th>
-        |    </tr>""", indent).format(category))
+        |      <th>{0}</th><th colspan={1}></th>
+        |    </tr>""", indent).format(category, 2 if toggles else 1))
             for bug_type in types.values():
                 handle.write(reindent("""
         |    <tr>
         |      <td class="SUMM_DESC">{bug_type}</td>
-        |      <td class="Q">{bug_count}</td>
-        |      <td>
-        |        <center>
-        |          <input checked type="checkbox"
-        |                 onClick="ToggleDisplay(this,'{bug_type_class}');"/>
-        |        </center>
-        |      </td>
-        |    </tr>""", indent).format(**bug_type))
+        |      <td class="Q">{bug_count}</td>""", indent).format(**bug_type))
+                handle.write(toggle(
+                    '\n' + ' ' * (indent + 17) +
+                    'onClick="ToggleDisplay(this,\'{0}\');"'.format(
+                        bug_type['bug_type_class'])))
+                handle.write(reindent("""
+        |    </tr>""", indent))
         handle.write(reindent("""
         |  </tbody>
         |</table>""", indent))
@@ -161,17 +200,28 @@ def bug_summary(output_dir, bug_counter):
     return name
 
 
-def bug_report(output_dir, prefix):
-    """ Creates a fragment from the analyzer reports. """
+def bug_report(output_dir, prefix, bugs=None):
+    """ Creates a fragment from the analyzer reports. The bugs are read
+    from the output directory, when those are not given. """
 
     pretty = prettify_bug(prefix, output_dir)
-    bugs = (pretty(bug) for bug in read_bugs(output_dir, True))
+    if bugs is None:
+        bugs = read_bugs(output_dir, True)
+    bugs = (pretty(bug) for bug in bugs)
 
     name = os.path.join(output_dir, 'bugs.html.fragment')
     with open(name, 'w') as handle:
         indent = 4
         handle.write(reindent("""
-        |<h2>Reports</h2>
+        |<h2>Reports</h2>""", indent))
+        write_bug_table(handle, bugs, indent)
+    return name
+
+
+def write_bug_table(handle, bugs, indent):
+    """ Writes the table of bugs. The bugs shall be prettified already. """
+
+    handle.write(reindent("""
         |<table class="sortable" style="table-layout:automatic">
         |  <thead>
         |    <tr>
@@ -188,9 +238,9 @@ def bug_report(output_dir, prefix):
         |    </tr>
         |  </thead>
         |  <tbody>""", indent))
-        handle.write(comment('REPORTBUGCOL'))
-        for current in bugs:
-            handle.write(reindent("""
+    handle.write(comment('REPORTBUGCOL'))
+    for current in bugs:
+        handle.write(reindent("""
         |    <tr class="{bug_type_class}">
         |      <td class="DESC">{bug_category}</td>
         |      <td class="DESC">{bug_type}</td>
@@ -200,19 +250,135 @@ def bug_report(output_dir, prefix):
         |      <td class="Q">{bug_path_length}</td>
         |      <td><a href="{report_file}#EndPath">View Report</a></td>
         |    </tr>""", indent).format(**current))
-            handle.write(comment('REPORTBUG', {'id': current['report_file']}))
+        handle.write(comment('REPORTBUG', {'id': current['report_file']}))
+    handle.write(reindent("""
+        |  </tbody>
+        |</table>""", indent))
+    handle.write(comment('REPORTBUGEND'))
+
+
+def bug_pages(output_dir, prefix, bugs, page_size, title):
+    """ Writes the bugs into separate pages, and creates a fragment which
+    links those pages.
+
+    A browser can not handle a page with many thousands of sortable rows.
+    So the bugs are sorted here by type, file and line (what the table
+    shows by default), and every page gets a slice of them. The pages are
+    written one by one, only the slice is formatted in memory. """
+
+    pretty = prettify_bug(prefix, output_dir)
+
+    def order(bug):
+        """ The sort key of the bugs. """
+        return (bug.get('bug_type', ''), bug.get('bug_file', ''),
+                bug.get('bug_line', 0))
+
+    ordered = sorted(bugs, key=order)
+    count = (len(ordered) + page_size - 1) // page_size
+    pages = []
+    for number in range(1, count + 1):
+        chunk = [pretty(dict(bug)) for bug in
+                 ordered[(number - 1) * page_size:number * page_size]]
+        page = 'bugs-{0}.html'.format(number)
+        pages.append({'page': page, 'number': number, 'count': len(chunk),
+                      'first': chunk[0]['bug_type'],
+                      'last': chunk[-1]['bug_type']})
+        with open(os.path.join(output_dir, page), 'w') as handle:
+            handle.write(page_head(
+                '{0} - reports {1}/{2}'.format(title, number, count)))
+            handle.write(reindent("""
+        |  <body>
+        |    <h1>{0}</h1>""", 0).format(title))
+            navigation = page_navigation(number, count)
+            handle.write(navigation)
+            write_bug_table(handle, chunk, 4)
+            handle.write(navigation)
+            handle.write(reindent("""
+        |  </body>
+        |</html>""", 0))
+
+    name = os.path.join(output_dir, 'bugs.html.fragment')
+    with open(name, 'w') as handle:
+        indent = 4
+        handle.write(reindent("""
+        |<h2>Reports</h2>
+        |<table>
+        |  <thead>
+        |    <tr>
+        |      <td>Page</td>
+        |      <td>Bug Types</td>
+        |      <td class="Q">Quantity</td>
+        |    </tr>
+        |  </thead>
+        |  <tbody>""", indent))
+        for current in pages:
+            handle.write(reindent("""
+        |    <tr>
+        |      <td><a href="{page}">Reports {number}</a></td>
+        |      <td class="DESC">{first} &ndash; {last}</td>
+        |      <td class="Q">{count}</td>
+        |    </tr>""", indent).format(**current))
         handle.write(reindent("""
         |  </tbody>
         |</table>""", indent))
-        handle.write(comment('REPORTBUGEND'))
+        handle.write(comment('REPORTBUGPAGES'))
     return name
 
 
-def crash_report(output_dir, prefix):
-    """ Creates a fragment from the compiler crashes. """
+def page_navigation(number, count):
+    """ Returns the links to the cover, the previous and the next pages. """
+
+    links = ['<a href="index.html">Summary</a>']
+    if number > 1:
+        links.append('<a href="bugs-{0}.html">Previous</a>'.format(number - 1))
+    links.append('Page {0} of {1}'.format(number, count))
+    if number < count:
+        links.append('<a href="bugs-{0}.html">Next</a>'.format(number + 1))
+    return reindent("""
+        |    <p>{0}</p>""", 0).format(' | '.join(links))
+
+
+def file_summary(output_dir, prefix, bugs):
+    """ Creates a fragment with the number of bugs per source file. """
+
+    counts = collections.Counter(bug.get('bug_file', '') for bug in bugs)
+
+    name = os.path.join(output_dir, 'files.html.fragment')
+    with open(name, 'w') as handle:
+        indent = 4
+        handle.write(reindent("""
+        |<h2>Files</h2>
+        |<table class="sortable">
+        |  <thead>
+        |    <tr>
+        |      <td>File</td>
+        |      <td class="Q">Quantity</td>
+        |    </tr>
+        |  </thead>
+        |  <tbody>""", indent))
+        for filename, count in sorted(counts.items(),
+                                      key=lambda item: (-item[1], item[0])):
+            handle.write(reindent("""
+        |    <tr>
+        |      <td>{0}</td>
+        |      <td class="Q">{1}</td>
+        |    </tr>""", indent).format(
+                escape(chop(prefix, filename)) if filename else '', count))
+        handle.write(reindent("""
+        |  </tbody>
+        |</table>""", indent))
+        handle.write(comment('SUMMARYFILEEND'))
+    return name
+
+
+def crash_report(output_dir, prefix, crashes=None):
+    """ Creates a fragment from the compiler crashes. The crashes are read
+    from the output directory, when those are not given. """
 
     pretty = prettify_crash(prefix, output_dir)
-    crashes = (pretty(crash) for crash in read_crashes(output_dir))
+    if crashes is None:
+        crashes = read_crashes(output_dir)
+    crashes = (pretty(crash) for crash in crashes)
 
     name = os.path.join(output_dir, 'crashes.html.fragment')
     with open(name, 'w') as handle:
@@ -246,6 +412,70 @@ def crash_report(output_dir, prefix):
     return name
 
 
+def read_index(output_dir, html, jobs=None):
+    """ Parse every report file of the output directory once.
+
+    When there are many files to parse, those are parsed in a process
+    pool.
+
+    :param output_dir:  the report directory
+    :param html:        parse the html reports (or the plist files)
+    :param jobs:        the number of parser processes
+    :return:            a dictionary of the unique bugs and the crashes
+
+    {'bugs': [<bug>], 'crashes': [<crash>]} """
+
+    # the cover and its pages (index.html, bugs-N.html) are not reports
+    bug_files = sorted(glob.iglob(
+        os.path.join(output_dir, 'report-*.html' if html else '*.plist')))
+    crash_files = sorted(
+        glob.iglob(os.path.join(output_dir, 'failures', '*.info.txt')))
+
+    logging.debug('parse %d report files', len(bug_files) + len(crash_files))
+    index = dict(parse_report_files(
+        list(itertools.chain(bug_files, crash_files)), jobs))
+
+    duplicate = duplicate_check(
+        lambda bug: '{bug_line}.{bug_path_length}:{bug_file}'.format(**bug))
+    bugs = [bug
+            for filename in bug_files
+            for bug in index[filename]
+            if not duplicate(bug)]
+    crashes = [index[filename] for filename in crash_files]
+    return {'bugs': bugs, 'crashes': crashes}
+
+
+def parse_report_files(filenames, jobs=None):
+    """ Generate the parsed content of the given report files. Many files
+    are parsed in parallel, few files in this process.
+
+    :return: generator of (filename, content) tuples """
+
+    if len(filenames) < PARALLEL_THRESHOLD:
+        for filename in filenames:
+            yield parse_report_file(filename)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for result in pool.imap_unordered(parse_report_file, filenames,
+                                              chunksize=64):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+
+def parse_report_file(filename):
+    """ Parse a single report file. The content is the crash dictionary for
+    failure reports, and the list of bugs for the analyzer reports. """
+
+    if filename.endswith('.info.txt'):
+        return filename, parse_crash(filename)
+    elif filename.endswith('.plist'):
+        return filename, list(parse_bug_plist(filename))
+    return filename, list(parse_bug_html(filename))
+
+
 def read_crashes(output_dir):
     """ Generate a unique sequence of crashes from given output directory. """
 
@@ -262,7 +492,7 @@ def read_bugs(output_dir, html):
     the final report (cover) only once. """
 
     parser = parse_bug_html if html else parse_bug_plist
-    pattern = '*.html' if html else '*.plist'
+    pattern = 'report-*.html' if html else '*.plist'
 
     duplicate = duplicate_check(
         lambda bug: '{bug_line}.{bug_path_length}:{bug_file}'.format(**bug))
@@ -278,7 +508,7 @@ def read_bugs(output_dir, html):
 def parse_bug_plist(filename):
     """ Returns the generator of bugs from a single .plist file. """
 
-    content = plistlib.readPlist(filename)
+    content = read_plist(filename)
     files = content.get('files')
     for bug in content.get('diagnostics', []):
         if len(files) <= int(bug['location']['file']):
@@ -295,16 +525,31 @@ def parse_bug_plist(filename):
         }
 
 
+def read_plist(filename):
+    """ Returns the content of a .plist file. (`readPlist` is deprecated
+    since python 3.4 and removed in 3.9.) """
+
+    if hasattr(plistlib, 'load'):
+        with open(filename, 'rb') as handle:
+            return plistlib.load(handle)
+    return plistlib.readPlist(filename)
+
+
 def parse_bug_html(filename):
     """ Parse out the bug information from HTML output. """
 
-    patterns = [re.compile(r'<!-- BUGTYPE (?P<bug_type>.*) -->$'),
-                re.compile(r'<!-- BUGFILE (?P<bug_file>.*) -->$'),
-                re.compile(r'<!-- BUGPATHLENGTH (?P<bug_path_length>.*) -->$'),
-                re.compile(r'<!-- BUGLINE (?P<bug_line>.*) -->$'),
-                re.compile(r'<!-- BUGCATEGORY (?P<bug_category>.*) -->$'),
-                re.compile(r'<!-- BUGDESC (?P<bug_description>.*) -->$'),
-                re.compile(r'<!-- FUNCTIONNAME (?P<bug_function>.*) -->$')]
+    # the meta information lines and the bug attributes they set
+    keys = {
+        'BUGTYPE': 'bug_type',
+        'BUGFILE': 'bug_file',
+        'BUGPATHLENGTH': 'bug_path_length',
+        'BUGLINE': 'bug_line',
+        'BUGCATEGORY': 'bug_category',
+        'BUGDESC': 'bug_description',
+        'FUNCTIONNAME': 'bug_function'
+    }
+    pattern = re.compile(r'<!-- (?P<key>{0}) (?P<value>.*) -->$'.format(
+        '|'.join(keys)))
     endsign = re.compile(r'<!-- BUGMETAEND -->')
 
     bug = {
@@ -316,16 +561,14 @@ def parse_bug_html(filename):
     }
 
     with open(filename) as handler:
-        for line in handler.readlines():
+        for line in handler:
             # do not read the file further
             if endsign.match(line):
                 break
             # search for the right lines
-            for regex in patterns:
-                match = regex.match(line.strip())
-                if match:
-                    bug.update(match.groupdict())
-                    break
+            match = pattern.match(line.strip())
+            if match:
+                bug[keys[match.group('key')]] = match.group('value')
 
     encode_value(bug, 'bug_line', int)
     encode_value(bug, 'bug_path_length', int)
@@ -478,8 +721,7 @@ def comment(name, opts=dict()):
 def commonprefix_from(filename):
     """ Create file prefix from a compilation database entries. """
 
-    with open(filename, 'r') as handle:
-        return commonprefix(item['file'] for item in json.load(handle))
+    return commonprefix(item['file'] for item in read_entries(filename))
 
 
 def commonprefix(files):
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" This module is responsible for the order of the analyzer runs.
+
+The analyzer runs are independent, but their durations vary a lot. When a
+long one is started last, every other worker waits for it to finish. To
+avoid that the entries are started in the order of their expected duration,
+longest first. The expectation is based on the durations measured by the
+previous runs, or on the size and the number of includes of the source file
+when it was not analyzed before. """
+
+import re
+import os
+import math
+import os.path
+import json
+import time
+import logging
+import tempfile
+import itertools
+from libscanbuild import replace_file
+
+__all__ = ['CostHistory', 'schedule', 'source_path', 'Utilization']
+
+# regex for include directives
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*(include|import)\b')
+# the cost of an include directive compared to a byte of the source
+INCLUDE_COST = 8192
+# how much the last measurement counts in the expected duration
+SMOOTHING = 0.5
+# how many entries are used to convert source costs to durations
+CALIBRATION_SAMPLES = 100
+
+
+class CostHistory(object):
+    """ Durations of the previous analyzer runs per source file.
+
+    The durations are stored in a JSON file, which is read at construction
+    and written back by the `save` method. """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.durations = dict()
+        try:
+            with open(filename, 'r') as handle:
+                self.durations = json.load(handle)
+        except (IOError, OSError, ValueError):
+            logging.debug('no analyzer duration history at %s', filename)
+
+    def __len__(self):
+        return len(self.durations)
+
+    def get(self, source):
+        """ Returns the expected duration of the source, or None. """
+
+        return self.durations.get(source)
+
+    def update(self, source, seconds):
+        """ Records a measured duration. Previous measurements are kept
+        with decreasing weight, to damp the noise of busy machines. """
+
+        previous = self.durations.get(source)
+        if previous is not None:
+            seconds = SMOOTHING * seconds + (1 - SMOOTHING) * previous
+        self.durations[source] = seconds
+
+    def save(self):
+        """ Writes the history into its file. """
+
+        directory = os.path.dirname(self.filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        (handle, name) = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(handle, 'w') as stream:
+            json.dump(self.durations, stream)
+        replace_file(name, self.filename)
+
+
+def source_path(entry):
+    """ Returns the absolute path of the source file of a compilation
+    database entry. The file name of the entry might be relative to its
+    directory. """
+
+    return os.path.normpath(os.path.join(entry['directory'], entry['file']))
+
+
+def source_cost(filename):
+    """ Estimates the analysis cost of a source file from its size and the
+    number of include directives. It's not a duration, but should be
+    proportional to it. """
+
+    try:
+        size = os.path.getsize(filename)
+        with open(filename, 'rb') as handle:
+            includes = sum(1 for line in handle
+                           if INCLUDE_PATTERN.match(line.decode('latin-1')))
+        return size + includes * INCLUDE_COST
+    except (IOError, OSError):
+        return 0
+
+
+def schedule(entries, history):
+    """ Sort compilation database entries by their expected analysis
+    duration, longest first.
+
+    :param entries: list of compilation database entries
+    :param history: the durations of the previous runs (CostHistory)
+    :return:        the sorted list of entries """
+
+    sources = [source_path(entry) for entry in entries]
+    known = [history.get(source) for source in sources]
+    # Source costs are converted to durations with the median ratio of
+    # the entries which have both.
+    samples = itertools.islice(
+        ((duration, source_cost(source))
+         for source, duration in zip(sources, known) if duration is not None),
+        CALIBRATION_SAMPLES)
+    ratios = sorted(duration / cost for duration, cost in samples if cost > 0)
+    ratio = ratios[len(ratios) // 2] if ratios else None
+    durations = sorted(duration for duration in known if duration is not None)
+    default = durations[len(durations) // 2] if durations else 0
+
+    def expected(source, duration):
+        """ Returns the expected duration of an entry. """
+
+        if duration is not None:
+            return duration
+        cost = source_cost(source)
+        if ratio is None:
+            # without calibration the history and the source costs are not
+            # comparable, use the source costs only to order unknown entries
+            return cost if not durations else default
+        return cost * ratio
+
+    costs = [expected(source, duration)
+             for source, duration in zip(sources, known)]
+    order = sorted(range(len(entries)), key=lambda index: -costs[index])
+    logging.debug('scheduled %d entries, %d with known duration',
+                  len(entries), len(durations))
+    return [entries[index] for index in order]
+
+
+def percentile(values, ratio):
+    """ Returns the nearest rank percentile of the sorted values. """
+
+    if not values:
+        return 0.0
+    index = int(math.ceil(ratio * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+class Utilization(object):
+    """ Collects the analyzer runs per worker process, to report how busy
+    the workers were and how long the run was waiting for the last ones. """
+
+    def __init__(self):
+        self.start = time.time()
+        self.runs = dict()
+
+    def add(self, worker, start, end):
+        """ Records an analyzer run of a worker. """
+
+        self.runs.setdefault(worker, []).append((start, end))
+
+    def report(self):
+        """ Returns the statistics as a dictionary.
+
+        utilization: busy time per wall time of each worker,
+        durations:   percentiles of the analyzer run durations,
+        tail:        the time from the first worker going idle until the
+                     end, while the remaining runs were still working. """
+
+        end = max([e for runs in self.runs.values() for _, e in runs] +
+                  [self.start])
+        wall = max(end - self.start, 1e-9)
+        durations = sorted(e - s for runs in self.runs.values()
+                           for s, e in runs)
+        finished = [max(e for _, e in runs) for runs in self.runs.values()]
+        return {
+            'wall': wall,
+            'count': len(durations),
+            'utilization': dict(
+                (worker, sum(e - s for s, e in runs) / wall)
+                for worker, runs in self.runs.items()),
+            'durations': {
+                'p50': percentile(durations, 0.5),
+                'p90': percentile(durations, 0.9),
+                'p99': percentile(durations, 0.99),
+                'max': durations[-1] if durations else 0.0
+            },
+            'tail': end - min(finished) if finished else 0.0
+        }
+
+    def log(self):
+        """ Writes the statistics into the log. """
+
+        report = self.report()
+        logging.info('analyzed %d entries in %.2fs', report['count'],
+                     report['wall'])
+        for worker, ratio in sorted(report['utilization'].items()):
+            logging.info('worker %s utilization: %.1f%%', worker, 100 * ratio)
+        logging.info('analyzer run durations: p50 %.2fs, p90 %.2fs, '
+                     'p99 %.2fs, max %.2fs', report['durations']['p50'],
+                     report['durations']['p90'], report['durations']['p99'],
+                     report['durations']['max'])
+        logging.info('tail, while some workers were idle: %.2fs',
+                     report['tail'])
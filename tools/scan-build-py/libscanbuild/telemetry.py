@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+""" This module implements the telemetry of the analyzer runs.
+
+For every analyzed entry a record is appended to a JSON Lines file: the
+wall clock time, the CPU time and the peak memory use of the analyzer
+processes, the exit status, the size of the output and the statistics of
+the analyzer (when it was asked to print them). The summary of these
+records tells which translation units are the slowest, the distribution
+of the durations and the throughput of the whole run. """
+
+import re
+import os
+import sys
+import json
+import logging
+from libscanbuild import command_entry_point
+from libscanbuild.arguments import parse_args_for_telemetry_summary
+from libscanbuild.schedule import percentile
+
+__all__ = ['TelemetrySink', 'make_record', 'read_records', 'summarize',
+           'telemetry_summary']
+
+# regex for the lines of the LLVM statistics ('-analyzer-stats')
+STATISTIC_PATTERN = re.compile(r'^\s*(\d+)\s+(\S+)\s+-\s+(.*\S)\s*$')
+
+
+class TelemetrySink(object):
+    """ Appends telemetry records to a JSON Lines file.
+
+    Every record is written with a single write call into a file opened in
+    append mode, so concurrent processes (the compiler wrappers) can share
+    the same file. """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def write(self, record):
+        """ Appends a record to the file. """
+
+        line = (json.dumps(record, sort_keys=True) + '\n').encode('utf-8')
+        # no newline translation on Windows, the line is written as is
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | \
+            getattr(os, 'O_BINARY', 0)
+        handle = os.open(self.filename, flags, 0o666)
+        try:
+            os.write(handle, line)
+        finally:
+            os.close(handle)
+
+
+def make_record(source, directory, start, end, result):
+    """ Creates the telemetry record of an analyzed entry.
+
+    :param source:      the analyzed source file
+    :param directory:   the working directory of the analysis
+    :param start:       the start of the analysis (seconds since epoch)
+    :param end:         the end of the analysis (seconds since epoch)
+    :param result:      the result of `run_analyzer`
+    :return:            the record as dictionary """
+
+    usage = result.get('usage', dict())
+    return {
+        'file': source,
+        'directory': directory,
+        'start': start,
+        'wall': end - start,
+        'user': usage.get('user'),
+        'sys': usage.get('sys'),
+        'max_rss': usage.get('max_rss'),
+        'exit_code': result['exit_code'],
+        'output_size': result.get('output_size'),
+        'limits': [hit['limit'] for hit in result.get('limit_hits', [])],
+        'stats': parse_stats(result['error_output'])
+    }
+
+
+def parse_stats(lines):
+    """ Parse the statistics printed by the analyzer.
+
+    :param lines:   the output of the analyzer
+    :return:        dictionary of the statistic names and values """
+
+    result = dict()
+    for line in lines:
+        match = STATISTIC_PATTERN.match(line)
+        if match:
+            name = '{0}: {1}'.format(match.group(2), match.group(3))
+            result[name] = int(match.group(1))
+    return result
+
+
+def read_records(filename):
+    """ Generate the records of a telemetry file. Broken lines (the last
+    line of an interrupted run) are skipped. """
+
+    with open(filename, 'r') as handle:
+        for line in handle:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logging.debug('broken telemetry record: %s', line)
+
+
+def summarize(records, top=10):
+    """ Returns the summary of the telemetry records as a dictionary.
+
+    count:      the number of analyzed entries,
+    failed:     the number of failed analyses,
+    limited:    the number of entries stopped by a resource limit,
+    span:       the time from the first start to the last end,
+    wall/cpu:   the sum of the wall clock and the CPU times,
+    throughput: the analyzed entries per minute,
+    durations:  percentiles of the wall clock times,
+    max_rss:    percentiles of the peak memory use (kilobytes),
+    slowest:    the records of the slowest entries. """
+
+    records = list(records)
+    durations = sorted(record['wall'] for record in records)
+    memory = sorted(record['max_rss'] for record in records
+                    if record.get('max_rss') is not None)
+    first = min([record['start'] for record in records] or [0.0])
+    last = max([record['start'] + record['wall'] for record in records] or
+               [0.0])
+    span = last - first
+    return {
+        'count': len(records),
+        'failed': sum(1 for record in records if record['exit_code'] != 0),
+        'limited': sum(1 for record in records if record.get('limits')),
+        'span': span,
+        'wall': sum(durations),
+        'cpu': sum((record.get('user') or 0.0) + (record.get('sys') or 0.0)
+                   for record in records),
+        'throughput': len(records) * 60.0 / span if span > 0 else 0.0,
+        'durations': dict((name, percentile(durations, ratio))
+                          for name, ratio in [('p50', 0.5), ('p95', 0.95),
+                                              ('p99', 0.99), ('max', 1.0)]),
+        'max_rss': dict((name, percentile(memory, ratio))
+                        for name, ratio in [('p50', 0.5), ('p95', 0.95),
+                                            ('max', 1.0)]),
+        'slowest': sorted(records, key=lambda record: -record['wall'])[:top]
+    }
+
+
+def format_summary(summary):
+    """ Generate the lines of the human readable summary. """
+
+    yield 'analyzed entries: {0} ({1} failed, {2} stopped by limits)'.format(
+        summary['count'], summary['failed'], summary['limited'])
+    yield 'elapsed: {0:.1f}s, analyzer wall time: {1:.1f}s, CPU time: ' \
+        '{2:.1f}s'.format(summary['span'], summary['wall'], summary['cpu'])
+    yield 'throughput: {0:.1f} entries/minute'.format(summary['throughput'])
+    yield 'wall time per entry: p50 {p50:.2f}s, p95 {p95:.2f}s, ' \
+        'p99 {p99:.2f}s, max {max:.2f}s'.format(**summary['durations'])
+    yield 'peak memory per entry: p50 {p50:.0f}MB, p95 {p95:.0f}MB, ' \
+        'max {max:.0f}MB'.format(**dict(
+            (name, value / 1024.0)
+            for name, value in summary['max_rss'].items()))
+    yield 'slowest entries:'
+    for record in summary['slowest']:
+        yield '  {0:8.2f}s {1:8.0f}MB  exit {2:<4} {3}'.format(
+            record['wall'], (record.get('max_rss') or 0) / 1024.0,
+            record['exit_code'], record['file'])
+
+
+@command_entry_point
+def telemetry_summary():
+    """ Entry point for 'telemetry-summary' command. """
+
+    args = parse_args_for_telemetry_summary()
+    summary = summarize(read_records(args.telemetry), args.top)
+    if args.json:
+        json.dump(summary, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        for line in format_summary(summary):
+            print(line)
+    return 0
@@ -11,6 +11,11 @@ from . import test_report
 from . import test_analyze
 from . import test_intercept
 from . import test_shell
+from . import test_schedule
+from . import test_incremental
+from . import test_database
+from . import test_limits
+from . import test_telemetry
 
 
 def load_tests(loader, suite, _):
@@ -21,4 +26,9 @@ def load_tests(loader, suite, _):
     suite.addTests(loader.loadTestsFromModule(test_analyze))
     suite.addTests(loader.loadTestsFromModule(test_intercept))
     suite.addTests(loader.loadTestsFromModule(test_shell))
+    suite.addTests(loader.loadTestsFromModule(test_schedule))
+    suite.addTests(loader.loadTestsFromModule(test_incremental))
+    suite.addTests(loader.loadTestsFromModule(test_database))
+    suite.addTests(loader.loadTestsFromModule(test_limits))
+    suite.addTests(loader.loadTestsFromModule(test_telemetry))
     return suite
@@ -10,6 +10,7 @@ import unittest
 import re
 import os
 import os.path
+import sys
 
 
 class ReportDirectoryTest(unittest.TestCase):
@@ -168,6 +169,60 @@ class RunAnalyzerTest(unittest.TestCase):
         self.assertTrue(len(fwds['error_output']) > 0)
 
 
+class RunAnalyzerLimitedTest(unittest.TestCase):
+
+    @staticmethod
+    def create_compiler(directory):
+        """ Creates a fake compiler, which prints itself as the front-end
+        invocation, and runs forever unless the loop budget is lowered. """
+
+        filename = os.path.join(directory, 'fake-clang')
+        content = """#!{0}
+import sys
+import time
+if '-###' in sys.argv:
+    print('"' + sys.argv[0] + '" "-cc1" "-analyze"')
+elif '-analyzer-max-loop' not in sys.argv:
+    time.sleep(30)
+""".format(sys.executable)
+        with open(filename, 'w') as handle:
+            handle.write(content)
+        os.chmod(filename, 0x1ff)
+        return filename
+
+    def run_analyzer(self, retries):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.c')
+            opts = {
+                'clang': self.create_compiler(tmpdir),
+                'directory': tmpdir,
+                'flags': [],
+                'direct_args': [],
+                'file': filename,
+                'output_dir': tmpdir,
+                'output_format': 'plist',
+                'output_failures': True,
+                'resource_limits': {'timeout': 1, 'retries': retries}
+            }
+            spy = Spy()
+            result = sut.run_analyzer(opts, spy.call)
+            return (result, spy.arg)
+
+    def test_retry_succeeds(self):
+        (result, fwds) = self.run_analyzer(2)
+        self.assertEqual(0, result['exit_code'])
+        self.assertEqual([{'limit': 'timeout', 'arguments': []}],
+                         result['limit_hits'])
+        self.assertEqual(0, fwds['exit_code'])
+        self.assertEqual(result['limit_hits'], fwds['limit_hits'])
+
+    def test_without_retries(self):
+        (result, fwds) = self.run_analyzer(0)
+        self.assertNotEqual(0, result['exit_code'])
+        self.assertEqual(1, len(result['limit_hits']))
+        self.assertEqual('timeout', fwds['limit_hits'][0]['limit'])
+
+
 class ReportFailureTest(unittest.TestCase):
 
     def assertUnderFailures(self, path):
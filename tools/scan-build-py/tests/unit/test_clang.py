@@ -92,3 +92,147 @@ class ClangGetCheckersTest(unittest.TestCase):
         self.assertEqual('Checker One description', result.get('checker.one'))
         self.assertTrue('checker.two' in result)
         self.assertEqual('Checker Two description', result.get('checker.two'))
+
+
+class CheckersCacheTest(unittest.TestCase):
+
+    @staticmethod
+    def create_compiler(directory):
+        """ Creates a fake compiler, which answers the checker queries and
+        counts its executions. """
+
+        filename = os.path.join(directory, 'fake-clang')
+        content = """#!{0}
+import sys
+with open(sys.argv[0] + '.log', 'a') as handle:
+    handle.write('x')
+if '-analyzer-checker-help' in sys.argv:
+    print('CHECKERS:')
+    print('  core.one    One description')
+    print('  lang.two    Two description')
+else:
+    language = sys.argv[sys.argv.index('-x') + 1]
+    print('"clang" "-cc1" "-analyzer-checker=core" '
+          '"-analyzer-checker=lang.' + language + '"')
+""".format(sys.executable)
+        with open(filename, 'w') as handle:
+            handle.write(content)
+        os.chmod(filename, 0x1ff)
+        return filename
+
+    @staticmethod
+    def executions(compiler):
+        with open(compiler + '.log', 'r') as handle:
+            return len(handle.read())
+
+    def test_checkers_are_cached(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            saved = os.environ.get('XDG_CACHE_HOME')
+            os.environ['XDG_CACHE_HOME'] = os.path.join(tmpdir, 'cache')
+            try:
+                compiler = self.create_compiler(tmpdir)
+                expected = {'core.one': ('One description', True),
+                            'lang.two': ('Two description', False)}
+
+                self.assertEqual(expected, sut.get_checkers(compiler, []))
+                self.assertEqual(5, self.executions(compiler))
+                self.assertEqual(expected, sut.get_checkers(compiler, []))
+                self.assertEqual(
+                    frozenset(['core', 'lang.c', 'lang.c++',
+                               'lang.objective-c', 'lang.objective-c++']),
+                    sut.get_active_checkers(compiler, []))
+                self.assertEqual(5, self.executions(compiler))
+
+                # a modified compiler is queried again
+                stat = os.stat(compiler)
+                os.utime(compiler, (stat.st_atime, stat.st_mtime + 10))
+                self.assertEqual(expected, sut.get_checkers(compiler, []))
+                self.assertEqual(10, self.executions(compiler))
+            finally:
+                if saved is None:
+                    del os.environ['XDG_CACHE_HOME']
+                else:
+                    os.environ['XDG_CACHE_HOME'] = saved
+
+
+class ArgumentsCacheTest(unittest.TestCase):
+
+    @staticmethod
+    def create_compiler(directory):
+        """ Creates a fake compiler, which prints the front-end invocation
+        like 'clang -###' does and counts its executions. """
+
+        filename = os.path.join(directory, 'fake-clang')
+        content = """#!{0}
+import os.path
+import sys
+with open(sys.argv[0] + '.log', 'a') as handle:
+    handle.write('x')
+args = [arg for arg in sys.argv[1:] if arg != '-###']
+source = [arg for arg in args if arg.endswith('.c')][0]
+print(' '.join('"' + arg + '"' for arg in
+               ['clang', '-cc1', '-main-file-name', os.path.basename(source)] +
+               args))
+""".format(sys.executable)
+        with open(filename, 'w') as handle:
+            handle.write(content)
+        os.chmod(filename, 0x1ff)
+        return filename
+
+    @staticmethod
+    def executions(compiler):
+        with open(compiler + '.log', 'r') as handle:
+            return len(handle.read())
+
+    def test_template(self):
+        arguments = ['clang', '-cc1', '-main-file-name', 'a.c', '-DX',
+                     '/src/a.c', '-o', '/out/a.plist']
+        template = sut.make_template(arguments, '/src/a.c', '/out/a.plist')
+        self.assertEqual(['clang', '-cc1', '-main-file-name',
+                          sut.BASENAME_PLACEHOLDER, '-DX',
+                          sut.SOURCE_PLACEHOLDER, '-o',
+                          sut.OUTPUT_PLACEHOLDER], template)
+        self.assertEqual(['clang', '-cc1', '-main-file-name', 'b.c', '-DX',
+                          '/src/b.c', '-o', '/out/b.plist'],
+                         sut.fill_template(template, '/src/b.c',
+                                           '/out/b.plist'))
+
+    def test_template_not_possible(self):
+        arguments = ['clang', '-cc1', '-dependency-file', '/out/a.plist.d',
+                     '/src/a.c', '-o', '/out/a.plist']
+        self.assertIsNone(
+            sut.make_template(arguments, '/src/a.c', '/out/a.plist'))
+
+    def test_cache_hit(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            compiler = self.create_compiler(tmpdir)
+            cache_dir = os.path.join(tmpdir, 'cache')
+
+            def get(cache, name):
+                source = os.path.join(tmpdir, name + '.c')
+                output = os.path.join(tmpdir, name + '.plist')
+                command = [compiler, '--analyze', '-DX', source, '-o', output]
+                return cache.get_arguments(command, tmpdir, source, output)
+
+            cache = sut.ArgumentsCache(cache_dir)
+            first = get(cache, 'one')
+            self.assertEqual(1, self.executions(compiler))
+            second = get(cache, 'two')
+            self.assertEqual(1, self.executions(compiler))
+            self.assertEqual(first[:3], second[:3])
+            self.assertEqual('two.c', second[3])
+            self.assertEqual(os.path.join(tmpdir, 'two.c'), second[-3])
+            self.assertEqual(os.path.join(tmpdir, 'two.plist'), second[-1])
+            self.assertEqual(1, cache.stats['hits'])
+
+            # the entries are persisted
+            cache = sut.ArgumentsCache(cache_dir)
+            self.assertEqual(second, get(cache, 'two'))
+            self.assertEqual(1, self.executions(compiler))
+
+            # verification runs the compiler again
+            cache = sut.ArgumentsCache(cache_dir, verify=1.0)
+            self.assertEqual(second, get(cache, 'two'))
+            self.assertEqual(2, self.executions(compiler))
+            self.assertEqual(1, cache.stats['verified'])
+            self.assertEqual(0, cache.stats['mismatches'])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+
+import libear
+import libscanbuild.database as sut
+import unittest
+import json
+import os.path
+
+
+def create_entries(count):
+    return [{'directory': '/src/dir{0}'.format(i),
+             'command': 'cc -c -DNAME="va lue" file{0}.c'.format(i),
+             'file': '/src/dir{0}/file{0}.c'.format(i)}
+            for i in range(count)]
+
+
+class ReadEntriesTest(unittest.TestCase):
+
+    def read(self, content, chunk_size=sut.CHUNK_SIZE):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'compile_commands.json')
+            with open(filename, 'w') as handle:
+                handle.write(content)
+            return list(sut.read_entries(filename, chunk_size))
+
+    def test_read(self):
+        entries = create_entries(100)
+        content = json.dumps(entries, indent=4)
+        self.assertEqual(entries, self.read(content))
+        # entries are split between the chunks
+        self.assertEqual(entries, self.read(content, 7))
+        self.assertEqual(entries, self.read(json.dumps(entries), 1))
+
+    def test_read_empty(self):
+        self.assertEqual([], self.read('[]'))
+        self.assertEqual([], self.read(' [\n ] '))
+
+    def test_read_malformed(self):
+        with self.assertRaises(ValueError):
+            self.read('')
+        with self.assertRaises(ValueError):
+            self.read('{}')
+        with self.assertRaises(ValueError):
+            self.read('[{"file": "a.c"}')
+        with self.assertRaises(ValueError):
+            self.read('[{"file": "a.c"} {"file": "b.c"}]')
+
+
+class WriteEntriesTest(unittest.TestCase):
+
+    def test_write_same_as_json(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'compile_commands.json')
+            for count in [0, 1, 10]:
+                entries = create_entries(count)
+                self.assertEqual(count,
+                                 sut.write_entries(filename, iter(entries)))
+                with open(filename, 'r') as handle:
+                    self.assertEqual(
+                        json.dumps(entries, sort_keys=True, indent=4),
+                        handle.read())
+            self.assertEqual(['compile_commands.json'], os.listdir(tmpdir))
+
+    def test_write_from_same_file(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'compile_commands.json')
+            entries = create_entries(1000)
+            sut.write_entries(filename, entries)
+            sut.write_entries(filename, (entry for entry
+                                         in sut.read_entries(filename, 64)
+                                         if entry['file'].endswith('1.c')))
+            self.assertEqual([entry for entry in entries
+                              if entry['file'].endswith('1.c')],
+                             list(sut.read_entries(filename)))
+
+    def test_write_mode(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'compile_commands.json')
+            umask = os.umask(0o022)
+            try:
+                sut.write_entries(filename, create_entries(1))
+            finally:
+                os.umask(umask)
+            self.assertEqual(0o644, os.stat(filename).st_mode & 0o777)
+            # the mode of an existing file is kept
+            os.chmod(filename, 0o664)
+            sut.write_entries(filename, create_entries(2))
+            self.assertEqual(0o664, os.stat(filename).st_mode & 0o777)
+
+    def test_write_failure_cleanup(self):
+        def entries():
+            yield create_entries(1)[0]
+            raise KeyboardInterrupt()
+
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'compile_commands.json')
+            with self.assertRaises(KeyboardInterrupt):
+                sut.write_entries(filename, entries())
+            self.assertEqual([], os.listdir(tmpdir))
+
+    def test_replace_without_os_replace(self):
+        # python 2 on Windows: rename fails when the destination exists
+        rename = os.rename
+
+        def windows_rename(source, destination):
+            if os.path.exists(destination):
+                raise OSError('file exists')
+            rename(source, destination)
+
+        replace = getattr(os, 'replace', None)
+        try:
+            if replace is not None:
+                del os.replace
+            os.rename = windows_rename
+            with libear.TemporaryDirectory() as tmpdir:
+                filename = os.path.join(tmpdir, 'compile_commands.json')
+                sut.write_entries(filename, create_entries(1))
+                sut.write_entries(filename, create_entries(2))
+                self.assertEqual(2, len(list(sut.read_entries(filename))))
+        finally:
+            os.rename = rename
+            if replace is not None:
+                os.replace = replace
+
+    def test_digest(self):
+        self.assertEqual(sut.entry_digest('a'), sut.entry_digest('a'))
+        self.assertNotEqual(sut.entry_digest('a'), sut.entry_digest('b'))
+        self.assertEqual(20, len(sut.entry_digest('a' * 1000)))
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+
+import libear
+import libscanbuild.incremental as sut
+import unittest
+import os
+import os.path
+
+
+class ParseDependenciesTest(unittest.TestCase):
+
+    def test_parse(self):
+        lines = ['main.o: main.c /usr/include/stdio.h \\',
+                 '  include/my\\ header.h ../other.h']
+        self.assertEqual(['/src/main.c', '/usr/include/stdio.h',
+                          '/src/include/my header.h', '/other.h'],
+                         sut.parse_dependencies(lines, '/src'))
+
+    def test_parse_empty(self):
+        self.assertEqual([], sut.parse_dependencies([], '/src'))
+
+
+class ManifestTest(unittest.TestCase):
+
+    @staticmethod
+    def write(filename, content):
+        with open(filename, 'w') as handle:
+            handle.write(content)
+
+    def test_key(self):
+        entry = {'directory': '/src', 'file': 'a.c', 'command': 'cc -c a.c'}
+        self.assertEqual(sut.Manifest.key(entry), sut.Manifest.key(entry))
+        other = dict(entry, command='cc -c -DX a.c')
+        self.assertNotEqual(sut.Manifest.key(entry), sut.Manifest.key(other))
+
+    def test_is_current(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            source = os.path.join(tmpdir, 'a.c')
+            header = os.path.join(tmpdir, 'a.h')
+            self.write(source, '#include "a.h"')
+            self.write(header, 'int a;')
+            directory = os.path.join(tmpdir, 'manifest')
+
+            manifest = sut.Manifest(directory)
+            self.assertFalse(manifest.is_current('key', 'fp'))
+            os.makedirs(manifest.reports_dir('key'))
+            manifest.update('key', 'fp', [source, header])
+            manifest.save()
+
+            manifest = sut.Manifest(directory)
+            self.assertTrue(manifest.is_current('key', 'fp'))
+            self.assertFalse(manifest.is_current('key', 'other'))
+
+            # content change is detected
+            self.write(header, 'int b;')
+            manifest = sut.Manifest(directory)
+            self.assertFalse(manifest.is_current('key', 'fp'))
+
+            # missing dependency is detected
+            manifest.update('key', 'fp', [source, header])
+            os.remove(header)
+            manifest = sut.Manifest(directory)
+            self.assertFalse(manifest.is_current('key', 'fp'))
+
+    def test_prune(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            source = os.path.join(tmpdir, 'a.c')
+            self.write(source, '')
+            manifest = sut.Manifest(os.path.join(tmpdir, 'manifest'))
+            for key in ['one', 'two']:
+                os.makedirs(manifest.reports_dir(key))
+                manifest.update(key, 'fp', [source])
+            manifest.prune(['one'])
+            self.assertEqual(['one'], list(manifest.entries))
+            self.assertTrue(os.path.isdir(manifest.reports_dir('one')))
+            self.assertFalse(os.path.isdir(manifest.reports_dir('two')))
+
+
+class CopyReportsTest(unittest.TestCase):
+
+    def test_copy(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            source = os.path.join(tmpdir, 'source')
+            target = os.path.join(tmpdir, 'target')
+            os.makedirs(os.path.join(source, 'failures'))
+            os.makedirs(target)
+            for name in ['report-1.plist', 'failures/crash.i']:
+                ManifestTest.write(os.path.join(source, name), name)
+            ManifestTest.write(os.path.join(target, 'report-1.plist'), 'old')
+
+            self.assertEqual(2, sut.copy_reports(source, target))
+            self.assertTrue(
+                os.path.exists(os.path.join(target, 'failures', 'crash.i')))
+            plists = [name for name in os.listdir(target)
+                      if name.endswith('.plist')]
+            self.assertEqual(2, len(plists))
@@ -88,3 +88,68 @@ class InterceptUtilTest(unittest.TestCase):
             self.assertFalse(sut.is_preload_disabled('unix'))
         finally:
             os.environ['PATH'] = saved
+
+
+class ExecTraceTest(unittest.TestCase):
+
+    class Execution(object):
+        def __init__(self, pid, cwd, cmd):
+            self.pid = pid
+            self.cwd = cwd
+            self.cmd = cmd
+
+    def test_write_and_parse(self):
+        executions = [
+            self.Execution(12, '/opt/src', ['cc', '-c', 'file.c']),
+            self.Execution(13, '/opt/src/é', ['c++', '-DX="a b"', 'a.cc']),
+            self.Execution(14, '/', [])
+        ]
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'shared.cmd')
+            for execution in executions:
+                sut.write_exec_trace(filename, execution)
+            result = list(sut.parse_exec_trace(filename))
+        self.assertEqual(3, len(result))
+        for execution, record in zip(executions, result):
+            self.assertEqual(str(execution.pid), record['pid'])
+            self.assertEqual(str(execution.pid), record['ppid'])
+            self.assertEqual('wrapper', record['function'])
+            self.assertEqual(execution.cwd, record['directory'])
+            self.assertEqual(execution.cmd, record['command'])
+
+    def test_parse_across_chunks(self):
+        records = [sut.encode_exec_trace(index, 1, 'execve', '/tmp',
+                                         ['cc', 'file{0}.c'.format(index)])
+                   for index in range(100)]
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, '1.cmd')
+            with open(filename, 'wb') as handle:
+                handle.write(b''.join(records))
+            with open(filename, 'rb') as handle:
+                result = list(sut.parse_binary_trace(handle, chunk_size=7))
+        self.assertEqual(100, len(result))
+        self.assertEqual(['cc', 'file99.c'], result[-1]['command'])
+        self.assertEqual('99', result[-1]['pid'])
+
+    def test_parse_truncated(self):
+        record = sut.encode_exec_trace(1, 1, 'execve', '/tmp', ['cc'])
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, '1.cmd')
+            with open(filename, 'wb') as handle:
+                handle.write(record + record[:-3])
+            result = list(sut.parse_exec_trace(filename))
+        self.assertEqual(1, len(result))
+
+    def test_parse_text_format(self):
+        content = '12\x1e11\x1eexecve\x1e/opt/src\x1ecc\x1f-c\x1ffile.c\x1f\x1d' \
+                  '13\x1e12\x1eexecvp\x1e/opt\x1els\x1f\x1d'
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, '12.cmd')
+            with open(filename, 'wb') as handle:
+                handle.write(content.encode('utf-8'))
+            result = list(sut.parse_exec_trace(filename))
+        self.assertEqual(2, len(result))
+        self.assertEqual({'pid': '12', 'ppid': '11', 'function': 'execve',
+                          'directory': '/opt/src',
+                          'command': ['cc', '-c', 'file.c']}, result[0])
+        self.assertEqual(['ls'], result[1]['command'])
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+
+import libscanbuild.limits as sut
+import unittest
+import subprocess
+import sys
+import time
+
+
+def python(script):
+    return [sys.executable, '-c', script]
+
+
+class RunLimitedTest(unittest.TestCase):
+
+    def test_success(self):
+        result = sut.run_limited(python('print("hello")'),
+                                 limits={'timeout': 10, 'memory': 2048,
+                                         'cpu': 10})
+        self.assertEqual(['hello'], result)
+
+    @unittest.skipIf(sut.resource is None, 'no resource usage')
+    def test_usage(self):
+        usage = dict()
+        sut.run_limited(python('data = bytearray(64 << 20)'), usage=usage)
+        self.assertTrue(usage['max_rss'] > 64 << 10)
+        self.assertTrue(usage['user'] + usage['sys'] > 0)
+
+    def test_failure_is_not_a_limit(self):
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            sut.run_limited(python('import sys; sys.exit(3)'),
+                            limits={'timeout': 10})
+        self.assertEqual(3, context.exception.returncode)
+        self.assertFalse(isinstance(context.exception, sut.LimitExceeded))
+
+    def test_timeout(self):
+        start = time.time()
+        with self.assertRaises(sut.LimitExceeded) as context:
+            sut.run_limited(python('import time; time.sleep(30)'),
+                            limits={'timeout': 1})
+        self.assertEqual('timeout', context.exception.limit)
+        self.assertTrue(time.time() - start < 10)
+
+    @unittest.skipIf(sut.resource is None, 'no resource limits')
+    def test_cpu_limit(self):
+        with self.assertRaises(sut.LimitExceeded) as context:
+            sut.run_limited(python('while True: pass'),
+                            limits={'timeout': 30, 'cpu': 1})
+        self.assertEqual('cpu_limit', context.exception.limit)
+
+    @unittest.skipIf(sut.resource is None, 'no resource limits')
+    def test_memory_limit(self):
+        script = '\n'.join([
+            'import sys',
+            'try:',
+            '    data = bytearray(1 << 30)',
+            'except MemoryError:',
+            '    print("LLVM ERROR: out of memory")',
+            '    sys.exit(1)'])
+        with self.assertRaises(sut.LimitExceeded) as context:
+            sut.run_limited(python(script), limits={'memory': 512})
+        self.assertEqual('memory_limit', context.exception.limit)
+        self.assertEqual(['LLVM ERROR: out of memory'],
+                         context.exception.output)
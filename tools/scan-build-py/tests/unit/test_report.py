@@ -111,6 +111,121 @@ class ParseFileTest(unittest.TestCase):
             self.assertEqual(result['stderr'], pp_file + '.stderr.txt')
 
 
+class ReadIndexTest(unittest.TestCase):
+
+    @staticmethod
+    def write_bug(filename, bug_type, line):
+        with open(filename, 'w') as handle:
+            handle.writelines([
+                "<!-- BUGTYPE {0} -->\n".format(bug_type),
+                "<!-- BUGCATEGORY Logic error -->\n",
+                "<!-- BUGFILE /src/file.c -->\n",
+                "<!-- BUGLINE {0} -->\n".format(line),
+                "<!-- BUGPATHLENGTH 4 -->\n",
+                "<!-- BUGMETAEND -->\n"])
+
+    def create_reports(self, output_dir, count):
+        os.makedirs(os.path.join(output_dir, 'failures'))
+        for index in range(count):
+            self.write_bug(
+                os.path.join(output_dir, 'report-{0}.html'.format(index)),
+                'Division by zero', index)
+        # a duplicate of the first bug
+        self.write_bug(os.path.join(output_dir, 'report-x.html'),
+                       'Division by zero', 0)
+        crash = os.path.join(output_dir, 'failures', 'clang_crash_1.i')
+        with open(crash + '.info.txt', 'w') as handle:
+            handle.writelines(['/src/file.c\n', 'Crash\n'])
+
+    def test_read_index(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            self.create_reports(tmpdir, 3)
+            result = sut.read_index(tmpdir, True)
+            self.assertEqual(3, len(result['bugs']))
+            self.assertEqual([0, 1, 2],
+                             sorted(bug['bug_line'] for bug in result['bugs']))
+            self.assertEqual(1, len(result['crashes']))
+            self.assertEqual('Crash', result['crashes'][0]['problem'])
+            # the pages of a previous cover are not reports
+            with open(os.path.join(tmpdir, 'bugs-1.html'), 'w') as handle:
+                handle.write('<!-- BUGMETAEND -->\n')
+            self.assertEqual(3, len(sut.read_index(tmpdir, True)['bugs']))
+            os.remove(os.path.join(tmpdir, 'bugs-1.html'))
+
+            # nothing is written into the output directory
+            self.assertEqual(['failures', 'report-0.html', 'report-1.html',
+                              'report-2.html', 'report-x.html'],
+                             sorted(os.listdir(tmpdir)))
+
+    def test_read_index_parallel(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            self.create_reports(tmpdir, 20)
+            serial = sut.read_index(tmpdir, True)
+            threshold = sut.PARALLEL_THRESHOLD
+            try:
+                sut.PARALLEL_THRESHOLD = 1
+                parallel = sut.read_index(tmpdir, True, 2)
+            finally:
+                sut.PARALLEL_THRESHOLD = threshold
+            self.assertEqual(serial, parallel)
+            self.assertEqual(20, len(parallel['bugs']))
+
+
+class BugPagesTest(unittest.TestCase):
+
+    @staticmethod
+    def create_bugs(output_dir, count):
+        return [{'bug_category': 'Logic error',
+                 'bug_type': 'Type {0}'.format(index % 3),
+                 'bug_file': '/src/file{0}.c'.format(index % 2),
+                 'bug_function': 'f',
+                 'bug_line': index,
+                 'bug_path_length': 1,
+                 'report_file': os.path.join(output_dir,
+                                             'report-{0}.html'.format(index))}
+                for index in range(count)]
+
+    @staticmethod
+    def read(filename):
+        with open(filename, 'r') as handle:
+            return handle.read()
+
+    def test_bug_pages(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            bugs = self.create_bugs(tmpdir, 5)
+            fragment = sut.bug_pages(tmpdir, '/src', bugs, 2, 'title')
+
+            pages = sorted(name for name in os.listdir(tmpdir)
+                           if name.startswith('bugs-'))
+            self.assertEqual(['bugs-1.html', 'bugs-2.html', 'bugs-3.html'],
+                             pages)
+            rows = [self.read(os.path.join(tmpdir, page)).count('REPORTBUG ')
+                    for page in pages]
+            self.assertEqual([2, 2, 1], rows)
+            # the pages are sorted by bug type
+            first = self.read(os.path.join(tmpdir, 'bugs-1.html'))
+            self.assertTrue('Type 0' in first)
+            self.assertFalse('Type 2' in first)
+            self.assertTrue('href="report-0.html#EndPath"' in first)
+            self.assertTrue('href="bugs-2.html">Next' in first)
+            # the fragment links the pages
+            content = self.read(fragment)
+            for page in pages:
+                self.assertTrue('href="{0}"'.format(page) in content)
+            # the original bugs are not changed
+            self.assertEqual(os.path.join(tmpdir, 'report-0.html'),
+                             bugs[0]['report_file'])
+
+    def test_file_summary(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            bugs = self.create_bugs(tmpdir, 5)
+            content = self.read(sut.file_summary(tmpdir, '/src', bugs))
+            self.assertTrue(content.index('file0.c') <
+                            content.index('file1.c'))
+            self.assertTrue('<td class="Q">3</td>' in content)
+            self.assertTrue('<td class="Q">2</td>' in content)
+
+
 class ReportMethodTest(unittest.TestCase):
 
     def test_chop(self):
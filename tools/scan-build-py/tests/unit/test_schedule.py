@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+
+import libear
+import libscanbuild.schedule as sut
+import unittest
+import os.path
+
+
+class CostHistoryTest(unittest.TestCase):
+
+    def test_persisted(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'cache', 'durations.json')
+            history = sut.CostHistory(filename)
+            self.assertEqual(0, len(history))
+            history.update('a.c', 2.0)
+            history.save()
+
+            history = sut.CostHistory(filename)
+            self.assertEqual(2.0, history.get('a.c'))
+            self.assertIsNone(history.get('b.c'))
+            history.update('a.c', 4.0)
+            self.assertEqual(3.0, history.get('a.c'))
+
+
+class ScheduleTest(unittest.TestCase):
+
+    @staticmethod
+    def create_sources(directory, sizes):
+        entries = []
+        for name, size, includes in sizes:
+            filename = os.path.join(directory, name)
+            with open(filename, 'w') as handle:
+                handle.write('#include <stdio.h>\n' * includes)
+                handle.write('x' * size)
+            entries.append({'directory': directory, 'file': name})
+        return entries
+
+    @staticmethod
+    def names(entries):
+        return [os.path.basename(entry['file']) for entry in entries]
+
+    def test_source_cost_fallback(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            entries = self.create_sources(tmpdir, [('small.c', 10, 0),
+                                                   ('big.c', 10000, 0),
+                                                   ('includes.c', 10, 3)])
+            history = sut.CostHistory(os.path.join(tmpdir, 'none.json'))
+            self.assertEqual(['includes.c', 'big.c', 'small.c'],
+                             self.names(sut.schedule(entries, history)))
+
+    def test_history_first(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            entries = self.create_sources(tmpdir, [('small.c', 10, 0),
+                                                   ('big.c', 10000, 0),
+                                                   ('slow.c', 10, 0),
+                                                   ('new.c', 5000, 0)])
+            history = sut.CostHistory(os.path.join(tmpdir, 'none.json'))
+            history.update(os.path.join(tmpdir, 'small.c'), 0.1)
+            history.update(os.path.join(tmpdir, 'big.c'), 100.0)
+            history.update(os.path.join(tmpdir, 'slow.c'), 500.0)
+            # the new entry is estimated from the big one
+            self.assertEqual(['slow.c', 'big.c', 'new.c', 'small.c'],
+                             self.names(sut.schedule(entries, history)))
+
+    def test_relative_to_directory(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            entries = self.create_sources(tmpdir, [('small.c', 10, 0),
+                                                   ('big.c', 10000, 0)])
+            history = sut.CostHistory(os.path.join(tmpdir, 'none.json'))
+            history.update(os.path.join(tmpdir, 'small.c'), 100.0)
+            history.update(os.path.join(tmpdir, 'big.c'), 1.0)
+            # the sources are found from any working directory
+            self.assertEqual(['small.c', 'big.c'],
+                             self.names(sut.schedule(entries, history)))
+
+
+class UtilizationTest(unittest.TestCase):
+
+    def test_report(self):
+        utilization = sut.Utilization()
+        start = utilization.start
+        utilization.add(1, start, start + 4.0)
+        utilization.add(2, start, start + 1.0)
+        utilization.add(2, start + 1.0, start + 2.0)
+        report = utilization.report()
+
+        self.assertEqual(3, report['count'])
+        self.assertAlmostEqual(4.0, report['wall'])
+        self.assertAlmostEqual(1.0, report['utilization'][1])
+        self.assertAlmostEqual(0.5, report['utilization'][2])
+        self.assertAlmostEqual(2.0, report['tail'])
+        self.assertAlmostEqual(1.0, report['durations']['p50'])
+        self.assertAlmostEqual(4.0, report['durations']['max'])
+
+    def test_percentile(self):
+        self.assertEqual(0.0, sut.percentile([], 0.5))
+        self.assertEqual(3, sut.percentile([1, 2, 3, 4, 5], 0.5))
+        self.assertEqual(5, sut.percentile([1, 2, 3, 4, 5], 0.99))
+        self.assertEqual(1, sut.percentile([1, 2, 3, 4, 5], 0.0))
@@ -40,3 +40,10 @@ class ShellTest(unittest.TestCase):
                          'clang -DKEY=\\"VALUE\\"')
         self.assertEqual(sut.encode(['clang', '-DKEY="value with spaces"']),
                          'clang -DKEY=\\"value with spaces\\"')
+
+    def test_decode_whitespace(self):
+        self.assertEqual([], sut.decode(''))
+        self.assertEqual(['clang', '-c', 'file.c'],
+                         sut.decode(' clang\t-c \n file.c '))
+        self.assertEqual(['clang', '-DKEY=value with', 'spaces'],
+                         sut.decode('clang "-DKEY=value with" spaces'))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#                     The LLVM Compiler Infrastructure
+#
+# This file is distributed under the University of Illinois Open Source
+# License. See LICENSE.TXT for details.
+
+import libear
+import libscanbuild.telemetry as sut
+import unittest
+import os.path
+
+
+class ParseStatsTest(unittest.TestCase):
+
+    def test_parse_stats(self):
+        lines = [
+            'warning: something',
+            '===---------------------------------------------------------===',
+            '                      ... Statistics Collected ...',
+            '===---------------------------------------------------------===',
+            '',
+            '    18 AnalysisConsumer - The # of blocks in top level functions',
+            '  1024 ExprEngine       - The # of paths explored by the analyzer']
+        self.assertEqual({
+            'AnalysisConsumer: The # of blocks in top level functions': 18,
+            'ExprEngine: The # of paths explored by the analyzer': 1024
+        }, sut.parse_stats(lines))
+
+
+class TelemetryTest(unittest.TestCase):
+
+    @staticmethod
+    def result(exit_code=0, rss=1024):
+        return {'error_output': [], 'exit_code': exit_code,
+                'usage': {'user': 1.0, 'sys': 0.5, 'max_rss': rss},
+                'output_size': 100}
+
+    def test_write_and_read(self):
+        with libear.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'telemetry.jsonl')
+            sink = sut.TelemetrySink(filename)
+            sink.write(sut.make_record('/src/a.c', '/src', 10.0, 12.5,
+                                       self.result()))
+            sink.write(sut.make_record('/src/b.c', '/src', 11.0, 11.5,
+                                       self.result(1)))
+            # an interrupted write is skipped
+            with open(filename, 'a') as handle:
+                handle.write('{"file": ')
+            records = list(sut.read_records(filename))
+        self.assertEqual(2, len(records))
+        self.assertEqual('/src/a.c', records[0]['file'])
+        self.assertEqual(2.5, records[0]['wall'])
+        self.assertEqual(1.0, records[0]['user'])
+        self.assertEqual(1024, records[0]['max_rss'])
+        self.assertEqual(100, records[0]['output_size'])
+        self.assertEqual(1, records[1]['exit_code'])
+
+    def test_summarize(self):
+        records = [sut.make_record('/src/{0}.c'.format(index), '/src',
+                                   100.0 + index, 100.0 + 2 * index,
+                                   self.result(0 if index % 10 else 1,
+                                               index * 1024))
+                   for index in range(1, 101)]
+        summary = sut.summarize(records, top=3)
+        self.assertEqual(100, summary['count'])
+        self.assertEqual(10, summary['failed'])
+        self.assertEqual(0, summary['limited'])
+        self.assertEqual(199.0, summary['span'])
+        self.assertEqual(150.0, summary['cpu'])
+        self.assertEqual(50.0, summary['durations']['p50'])
+        self.assertEqual(95.0, summary['durations']['p95'])
+        self.assertEqual(99.0, summary['durations']['p99'])
+        self.assertEqual(100.0, summary['durations']['max'])
+        self.assertEqual(100 * 1024, summary['max_rss']['max'])
+        self.assertEqual(['/src/100.c', '/src/99.c', '/src/98.c'],
+                         [record['file'] for record in summary['slowest']])
+        self.assertTrue(list(sut.format_summary(summary)))
+
+    def test_summarize_empty(self):
+        summary = sut.summarize([])
+        self.assertEqual(0, summary['count'])
+        self.assertEqual(0.0, summary['throughput'])
+        self.assertTrue(list(sut.format_summary(summary)))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# Benchmark of the external function map lookups.
+#
+# It writes a text and an indexed function map of the requested number of
+# functions, then measures what an analyzer process pays for the given
+# number of lookups: reading the whole text map into a dictionary, or
+# memory-mapping the indexed map and searching it.
+#
+#   $ python benchmarks/bench_function_map.py --functions 1000000
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'lib'))
+import function_map
+
+
+def functions(count, per_tu):
+    for index in range(count):
+        name = ('c:@N@module%d@F@function%d#I#*C#@x86_64' %
+                (index % 97, index)).encode('ascii')
+        path = ('ast/x86_64/src/module%d/file%d.cpp.ast' %
+                (index % 97, index // per_tu)).encode('ascii')
+        yield name, path
+
+
+def load_text_map(filename):
+    """ Reads the text map like the analyzer does. """
+
+    result = {}
+    for name, path in function_map.read_text_map(filename):
+        result[name] = path
+    return result
+
+
+def measure(action):
+    start = time.time()
+    result = action()
+    return result, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Function map benchmark')
+    parser.add_argument('--functions', type=int, default=1000000,
+                        help='number of functions in the map')
+    parser.add_argument('--per-tu', type=int, default=200,
+                        help='number of functions per AST file')
+    parser.add_argument('--lookups', type=int, default=1000,
+                        help='number of lookups of an analyzer process')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-')
+    try:
+        text_file = os.path.join(directory, 'externalFnMap.txt')
+        index_file = os.path.join(directory, 'externalFnMap.idx')
+        entries = list(functions(args.functions, args.per_tu))
+        function_map.write_text_map(text_file, entries)
+        _, elapsed = measure(lambda: function_map.
+                             convert_text_to_index(text_file, index_file))
+        print('convert to index  %8.2fs' % elapsed)
+        print('text map size     %8.1fMB' %
+              (os.path.getsize(text_file) / 1048576.0))
+        print('indexed map size  %8.1fMB' %
+              (os.path.getsize(index_file) / 1048576.0))
+
+        names = [name for name, _ in random.sample(entries, args.lookups)]
+        names.extend(name + b'-missing' for name in names[:args.lookups // 10])
+
+        def text_lookups():
+            loaded = load_text_map(text_file)
+            return sum(1 for name in names if name in loaded)
+
+        def index_lookups():
+            with function_map.FunctionMap(index_file) as index:
+                return sum(1 for name in names
+                           if index.lookup(name) is not None)
+
+        text_found, text_elapsed = measure(text_lookups)
+        index_found, index_elapsed = measure(index_lookups)
+        assert text_found == index_found == args.lookups
+        print('text map load and %d lookups     %8.3fs' %
+              (len(names), text_elapsed))
+        print('indexed map open and %d lookups  %8.3fs' %
+              (len(names), index_elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# This module schedules the analyzer runs of xtu-analyze.
+#
+# The jobs are taken from a shared queue by a fixed number of workers (the
+# job limit), so an idle worker always takes the next job. A worker starts
+# the analysis of a job in its own process group and waits for it; the
+# analysis itself runs in the child processes.
+#
+# XTU analysis of a translation unit might need several gigabytes of memory.
+# When the expected memory of a job is given, a job is started only when
+# the available memory of the machine (MemAvailable) is enough for it. The
+# memory still to be allocated by the running jobs (their expected memory
+# minus the resident memory of their process group) counts as used. When no
+# job is running, the next job is always started.
+#
+# The number of running jobs, the time spent with each number of running
+# jobs and the progress are updated under a single lock. The memory is read
+# outside of it, at most once per poll interval for all the waiting workers.
+
+import os
+import signal
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# how often a job waiting for memory checks the available memory again
+ADMISSION_POLL_SECONDS = 1.0
+# the Popen arguments which start the analysis in a new session, so in its
+# own process group; preexec_fn is not safe when other threads are running,
+# so it's used on python 2 only, where start_new_session is missing
+if sys.version_info[0] >= 3:
+    NEW_SESSION = {'start_new_session': True}
+else:
+    NEW_SESSION = {'preexec_fn': os.setsid}
+
+
+class Job(object):
+    """ An analysis to run. The `pgid` is set by the runner when the process
+    group of the analysis is started, and the `max_rss` (in kilobytes) when
+    it is finished. """
+
+    def __init__(self, uid, directory, command):
+        self.uid = uid
+        self.directory = directory
+        self.command = command
+        self.pgid = None
+        self.max_rss = None
+
+
+def available_memory():
+    """ Returns the available memory of the machine in megabytes, or None
+    when it is not known (it's read from /proc/meminfo). """
+
+    try:
+        with open('/proc/meminfo', 'r') as in_file:
+            for line in in_file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def process_group_memory():
+    """ Returns the resident memory of the process groups in megabytes, as
+    a dictionary of process group ids (it's read from /proc). """
+
+    page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') \
+        else 4096
+    result = {}
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return result
+    for pid in pids:
+        try:
+            with open(os.path.join('/proc', pid, 'stat'), 'r') as in_file:
+                stat = in_file.read()
+        except (IOError, OSError):
+            continue
+        # the command name (in parentheses) might contain spaces
+        fields = stat[stat.rfind(')') + 2:].split()
+        pgid, rss = int(fields[2]), int(fields[21])
+        result[pgid] = result.get(pgid, 0) + rss * page_size
+    return dict((pgid, rss >> 20) for pgid, rss in result.items())
+
+
+class Scheduler(object):
+    """ Runs jobs with a job limit and optional memory admission control.
+
+    :param jobs:            the jobs to run, in the order to start them
+    :param run:             the callable which runs a job, returns its result
+    :param limit:           the maximum number of running jobs
+    :param job_memory:      the expected peak memory of a job in megabytes,
+                            0 turns off the admission control
+    :param reserved_memory: the memory in megabytes to leave available
+    :param report:          the callable which gets the finished job, its
+                            result, the number of finished and all jobs;
+                            called under the lock of the scheduler """
+
+    def __init__(self, jobs, run, limit, job_memory=0, reserved_memory=0,
+                 report=None):
+        self._queue = queue.Queue()
+        for job in jobs:
+            self._queue.put(job)
+        self._run = run
+        self._limit = limit
+        self._job_memory = job_memory
+        self._reserved_memory = reserved_memory
+        self._report = report
+        self._lock = threading.Condition()
+        self._memory_lock = threading.Lock()
+        self._memory = None
+        self._running = []
+        self._last_clock = time.time()
+        self._stopped = False
+        self.total = len(jobs)
+        self.finished = 0
+        # the time spent with the given number of running jobs
+        self.busy_times = [0.0] * (limit + 1)
+        self.admission_waits = 0
+        self.admission_wait_time = 0.0
+        self.peak_job_memory = 0
+
+    def run(self):
+        """ Runs all the jobs. Returns when all of them are finished. On
+        KeyboardInterrupt the running jobs are killed. """
+
+        workers = [threading.Thread(target=self._work)
+                   for _ in range(self._limit)]
+        for worker in workers:
+            worker.start()
+        try:
+            self._join(workers)
+        except KeyboardInterrupt:
+            self.stop()
+            self._join(workers)
+            raise
+        with self._lock:
+            self._account()
+
+    @staticmethod
+    def _join(workers):
+        for worker in workers:
+            # join with timeout, so that signals don't get ignored
+            while worker.is_alive():
+                worker.join(ADMISSION_POLL_SECONDS)
+
+    def stop(self):
+        """ Drops the queued jobs and kills the running ones. """
+
+        with self._lock:
+            self._stopped = True
+            for job in self._running:
+                if job.pgid is not None:
+                    try:
+                        os.killpg(job.pgid, signal.SIGKILL)
+                    except OSError:
+                        pass
+            self._lock.notify_all()
+
+    def _work(self):
+        while True:
+            job = self._admit()
+            if job is None:
+                return
+            result = None
+            try:
+                result = self._run(job)
+            finally:
+                self._finish(job, result)
+
+    def _admit(self):
+        """ Waits until a job can be started, and takes the next one from the
+        queue. Returns None when there are no more jobs, or the scheduler
+        was stopped. The memory is read outside the lock, so that it does
+        not hold up the finishing jobs. """
+
+        waiting_since = None
+        memory = None
+        while True:
+            with self._lock:
+                if self._stopped or self._queue.empty():
+                    return self._admitted(None, waiting_since)
+                if not self._running or not self._job_memory or \
+                        (memory is not None and self._fits(*memory)):
+                    job = self._queue.get_nowait()
+                    self._account()
+                    self._running.append(job)
+                    return self._admitted(job, waiting_since)
+                if memory is not None:
+                    if waiting_since is None:
+                        waiting_since = time.time()
+                        self.admission_waits += 1
+                    self._lock.wait(ADMISSION_POLL_SECONDS)
+            memory = self._read_memory()
+
+    def _admitted(self, job, waiting_since):
+        """ Accounts the time waited for memory. Has to be called under the
+        lock. """
+
+        if waiting_since is not None:
+            self.admission_wait_time += time.time() - waiting_since
+        return job
+
+    def _read_memory(self):
+        """ Returns the available memory and the resident memory of the
+        process groups. The reading is taken at most once per poll interval,
+        and shared by the waiting workers. """
+
+        with self._memory_lock:
+            now = time.time()
+            if self._memory is None or \
+                    now - self._memory[0] >= ADMISSION_POLL_SECONDS:
+                available = available_memory()
+                resident = process_group_memory() \
+                    if available is not None else {}
+                self._memory = (now, available, resident)
+            return self._memory[1:]
+
+    def _fits(self, available, resident):
+        """ Tells whether the available memory is enough for another job.
+        Has to be called under the lock. """
+
+        if available is None:
+            return True
+        pending = sum(max(self._job_memory - resident.get(job.pgid, 0), 0)
+                      for job in self._running)
+        return available - pending - self._reserved_memory >= \
+            self._job_memory
+
+    def _finish(self, job, result):
+        with self._lock:
+            self._account()
+            self._running.remove(job)
+            self.finished += 1
+            if job.max_rss is not None:
+                self.peak_job_memory = max(self.peak_job_memory,
+                                           job.max_rss // 1024)
+            if self._report is not None:
+                self._report(job, result, self.finished, self.total)
+            self._lock.notify_all()
+
+    def _account(self):
+        """ Adds the time since the last change to the number of the running
+        jobs. Has to be called under the lock. """
+
+        now = time.time()
+        self.busy_times[len(self._running)] += now - self._last_clock
+        self._last_clock = now
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# This module implements the per-source manifests of the incremental XTU
+# build.
+#
+# A manifest records what the outputs of a source file (its AST dump and its
+# part of the function map) were made from: the digest of the command, the
+# clang version, and the size, modification time and content digest of the
+# source file and of every file it includes. The outputs of a source file
+# are reused when none of these changed and they still exist. The content
+# digests are computed only for the files whose size or modification time
+# changed; when the content did not change, the new size and modification
+# time are recorded.
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+def digest(*parts):
+    """ Returns the digest of JSON serializable values. """
+
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')) \
+        .hexdigest()
+
+
+def file_digest(filename):
+    """ Returns the digest of the content of a file. """
+
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as in_file:
+        for chunk in iter(lambda: in_file.read(1 << 16), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def file_stamp(filename):
+    """ Returns the size and the modification time of a file, or None when
+    the file does not exist. """
+
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+
+def source_key(source):
+    """ Returns the name of the files which belong to a source file: the
+    digest of its real path. """
+
+    return hashlib.sha1(os.path.realpath(source).encode('utf-8')).hexdigest()
+
+
+def read_manifest(filename):
+    """ Returns the manifest in the file, or None when it does not exist or
+    it is broken. """
+
+    try:
+        with open(filename, 'r') as in_file:
+            return json.load(in_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_manifest(filename, manifest):
+    """ Writes the manifest into the file, atomically. """
+
+    handle, temp_name = tempfile.mkstemp(dir=os.path.dirname(filename))
+    with os.fdopen(handle, 'w') as out_file:
+        json.dump(manifest, out_file, sort_keys=True)
+    os.rename(temp_name, filename)
+
+
+def remove_manifest(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+def make_manifest(source, command, clang_version, inputs, **outputs):
+    """ Creates the manifest of a source file.
+
+    :param source:          the real path of the source file
+    :param command:         the digest of the command
+    :param clang_version:   the version of clang used
+    :param inputs:          the real paths of the files read by the source
+    :param outputs:         the outputs to record (the AST path, the
+                            number of shards of the function map and the
+                            written function map files)
+    :return:                the manifest as dictionary """
+
+    stamps = {}
+    for filename in set(inputs) | {source}:
+        stamp = file_stamp(filename)
+        if stamp is not None:
+            stamps[filename] = stamp + [file_digest(filename)]
+    manifest = {
+        'source': source,
+        'command': command,
+        'clang_version': clang_version,
+        'inputs': stamps
+    }
+    manifest.update(outputs)
+    return manifest
+
+
+def changed_inputs(manifest, refreshed=None):
+    """ Generate the inputs of a manifest, which have changed since it was
+    made. The recorded stamps of the inputs, which were touched but their
+    content did not change, are updated in the manifest, and their names
+    are appended to the `refreshed` list. """
+
+    for filename, recorded in manifest['inputs'].items():
+        stamp = file_stamp(filename)
+        if stamp is None:
+            yield filename
+        elif stamp != recorded[:2]:
+            if file_digest(filename) != recorded[2]:
+                yield filename
+            else:
+                recorded[:2] = stamp
+                if refreshed is not None:
+                    refreshed.append(filename)
+
+
+def outputs_exist(manifest):
+    """ Tells whether the AST dump and the function map files recorded by
+    the manifest exist. """
+
+    return (not manifest.get('ast') or os.path.exists(manifest['ast'])) and \
+        'map_files' in manifest and \
+        all(os.path.exists(filename) for filename in manifest['map_files'])
+
+
+def is_up_to_date(manifest, source, command, clang_version, refreshed=None):
+    """ Tells whether the outputs recorded by the manifest exist and were
+    made from the current state of the source file. The inputs which were
+    touched only are appended to `refreshed` (see changed_inputs). """
+
+    return manifest is not None and \
+        manifest['source'] == source and \
+        manifest['command'] == command and \
+        manifest['clang_version'] == clang_version and \
+        source in manifest['inputs'] and \
+        outputs_exist(manifest) and \
+        next(changed_inputs(manifest, refreshed), None) is None
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# This module reads and writes the indexed external function map of XTU.
+#
+# The text map (externalFnMap.txt) has a "mangled_name ast_path" line for
+# every function, and the analyzer has to read the whole file before the
+# first lookup. The indexed map (externalFnMap.idx) is sorted by the names,
+# so it can be memory-mapped and searched with binary search, and every AST
+# path is stored only once.
+#
+# Layout, all integers are little-endian:
+#
+#   header      magic "XTUFNMAP", u32 version, u32 reserved,
+#               u64 entry count, u64 entry table offset,
+#               u64 path count, u64 path table offset
+#   strings     the names and the AST paths (not terminated)
+#   paths       u64 offset, u32 length, u32 reserved (per AST path)
+#   entries     u64 name offset, u32 name length, u32 path index
+#               (per function, sorted by the bytes of the name)
+#
+# Usage as a script:
+#
+#   function_map.py to-index externalFnMap.txt externalFnMap.idx
+#   function_map.py to-text externalFnMap.idx externalFnMap.txt
+#   function_map.py lookup externalFnMap.idx <mangled_name>...
+#
+# The map is built without loading all the functions into memory: every
+# translation unit writes its functions into sorted temporary maps, one per
+# shard (the names are sharded by their hash). The temporary maps of a
+# shard are merged with a streaming k-way merge, which drops the names
+# defined in more than one AST file; the shards can be merged in parallel.
+# Then the merged shards are merged into the final map.
+
+import argparse
+import heapq
+import itertools
+import mmap
+import operator
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+
+INDEX_MAGIC = b'XTUFNMAP'
+INDEX_VERSION = 1
+HEADER_STRUCT = struct.Struct('<8sIIQQQQ')
+RECORD_STRUCT = struct.Struct('<QII')
+ALIGNMENT = 8
+# the maximum number of maps merged at once
+MAX_OPEN_FILES = 256
+
+
+def read_text_map(filename):
+    """ Generate the (name, path) pairs of a text function map. """
+
+    with open(filename, 'rb') as in_file:
+        for line in in_file:
+            line = line.rstrip(b'\r\n')
+            if line:
+                name, path = line.split(b' ', 1)
+                yield name, path
+
+
+def write_text_map(filename, entries):
+    """ Write (name, path) pairs into a text function map. """
+
+    with open(filename, 'wb') as out_file:
+        for name, path in entries:
+            out_file.write(name + b' ' + path + b'\n')
+
+
+def write_index(filename, entries):
+    """ Write (name, path) pairs into an indexed function map.
+
+    The pairs have to be sorted by the names, and the names have to be
+    unique. The entries are streamed through a temporary file, only the
+    table of the distinct AST paths is kept in memory. """
+
+    paths = {}
+    path_records = []
+    count = 0
+    previous = None
+    with open(filename + '.tmp', 'wb') as out_file:
+        out_file.write(b'\0' * HEADER_STRUCT.size)
+        offset = HEADER_STRUCT.size
+        with tempfile.TemporaryFile(dir=os.path.dirname(
+                os.path.abspath(filename))) as entry_file:
+            for name, path in entries:
+                if previous is not None and name <= previous:
+                    raise ValueError('function map is not sorted at %r' %
+                                     name)
+                previous = name
+                if path not in paths:
+                    paths[path] = len(path_records)
+                    path_records.append(RECORD_STRUCT.pack(offset, len(path),
+                                                           0))
+                    out_file.write(path)
+                    offset += len(path)
+                entry_file.write(RECORD_STRUCT.pack(offset, len(name),
+                                                    paths[path]))
+                out_file.write(name)
+                offset += len(name)
+                count += 1
+            padding = -offset % ALIGNMENT
+            out_file.write(b'\0' * padding)
+            path_table_offset = offset + padding
+            out_file.write(b''.join(path_records))
+            entry_table_offset = path_table_offset + \
+                len(path_records) * RECORD_STRUCT.size
+            entry_file.seek(0)
+            shutil.copyfileobj(entry_file, out_file)
+        out_file.seek(0)
+        out_file.write(HEADER_STRUCT.pack(INDEX_MAGIC, INDEX_VERSION, 0, count,
+                                          entry_table_offset,
+                                          len(path_records),
+                                          path_table_offset))
+    os.rename(filename + '.tmp', filename)
+    return count
+
+
+def shard_of(name, shards):
+    """ Returns the shard of a function name. """
+
+    return (zlib.crc32(name) & 0xffffffff) % shards
+
+
+def write_sharded_maps(directory, key, entries, shards):
+    """ Write (name, path) pairs of a translation unit into sorted temporary
+    maps, one for each shard. The map of a shard goes into the directory
+    named after the shard (which has to exist), into the file named by the
+    key of the translation unit. Returns the written files, the shards
+    without functions have none. """
+
+    buckets = [set() for _ in range(shards)]
+    for name, path in entries:
+        buckets[shard_of(name, shards)].add((name, path))
+    written = []
+    for shard, bucket in enumerate(buckets):
+        filename = os.path.join(directory, str(shard), key)
+        if bucket:
+            write_text_map(filename, sorted(bucket))
+            written.append(filename)
+        elif os.path.exists(filename):
+            os.remove(filename)
+    return written
+
+
+def read_sharded_maps(directory, key, shards):
+    """ Generate the (name, path) pairs of a translation unit from its
+    temporary maps. """
+
+    for shard in range(shards):
+        filename = os.path.join(directory, str(shard), key)
+        if os.path.exists(filename):
+            for entry in read_text_map(filename):
+                yield entry
+
+
+def remove_sharded_maps(directory, key, shards):
+    """ Removes the temporary maps of a translation unit. """
+
+    for shard in range(shards):
+        filename = os.path.join(directory, str(shard), key)
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def merge_sorted_maps(filenames):
+    """ Generate the (name, path) pairs of sorted maps in sorted order. The
+    pairs which are in more than one map are generated only once. """
+
+    previous = None
+    for entry in heapq.merge(*[read_text_map(filename)
+                               for filename in filenames]):
+        if entry != previous:
+            yield entry
+            previous = entry
+
+
+def drop_ambiguous(entries):
+    """ Drops the names of sorted (name, path) pairs, which are defined in
+    more than one AST file. The pairs have to be unique. """
+
+    for name, group in itertools.groupby(entries, operator.itemgetter(0)):
+        _, path = next(group)
+        if next(group, None) is None:
+            yield name, path
+
+
+def merge_shard(params):
+    """ Merges the sorted temporary maps of a shard into one sorted map of
+    the unambiguous names.
+
+    When there are too many maps to open at once, they are merged in more
+    passes, through intermediate maps in the directory of the output. The
+    intermediate maps are removed once they are merged. """
+
+    filenames, output = params
+    consumed, partials = [], []
+    try:
+        while len(filenames) > MAX_OPEN_FILES:
+            consumed, partials = partials, []
+            for index in range(0, len(filenames), MAX_OPEN_FILES):
+                handle, filename = tempfile.mkstemp(
+                    dir=os.path.dirname(output), suffix='.partial')
+                os.close(handle)
+                partials.append(filename)
+                write_text_map(filename, merge_sorted_maps(
+                    filenames[index:index + MAX_OPEN_FILES]))
+            remove_files(consumed)
+            filenames = partials
+        write_text_map(output, drop_ambiguous(merge_sorted_maps(filenames)))
+    finally:
+        remove_files(consumed + partials)
+    return output
+
+
+def remove_files(filenames):
+    """ Removes the files which exist. """
+
+    for filename in filenames:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def unique_entries(entries):
+    """ Returns the sorted (name, path) pairs of the names which are defined
+    in exactly one AST file. """
+
+    name_to_paths = {}
+    for name, path in entries:
+        name_to_paths.setdefault(name, set()).add(path)
+    return sorted((name, paths.pop())
+                  for name, paths in name_to_paths.items()
+                  if len(paths) == 1)
+
+
+class FunctionMap(object):
+    """ Memory-mapped reader of an indexed function map. """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as in_file:
+            self._buffer = mmap.mmap(in_file.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+        if len(self._buffer) < HEADER_STRUCT.size:
+            self.close()
+            raise ValueError('%s: not an indexed function map' % filename)
+        magic, version, _, self._count, self._entries, self._path_count, \
+            self._paths = HEADER_STRUCT.unpack_from(self._buffer, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError('%s: unsupported function map (version %d)' %
+                             (filename, version))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            name, path_index = self._entry(index)
+            yield name, self._path(path_index)
+
+    def close(self):
+        self._buffer.close()
+
+    def lookup(self, name):
+        """ Returns the AST path of a function, or None if it is not in the
+        map. The entries are searched with binary search. """
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            current, path_index = self._entry(middle)
+            if current < name:
+                low = middle + 1
+            elif current > name:
+                high = middle
+            else:
+                return self._path(path_index)
+        return None
+
+    def _string(self, offset, length):
+        return self._buffer[offset:offset + length]
+
+    def _entry(self, index):
+        offset, length, path_index = RECORD_STRUCT.unpack_from(
+            self._buffer, self._entries + index * RECORD_STRUCT.size)
+        return self._string(offset, length), path_index
+
+    def _path(self, index):
+        offset, length, _ = RECORD_STRUCT.unpack_from(
+            self._buffer, self._paths + index * RECORD_STRUCT.size)
+        return self._string(offset, length)
+
+
+def convert_text_to_index(text_file, index_file):
+    """ Converts a text function map to an indexed one. Ambiguous names are
+    dropped, like when the map is generated. """
+
+    return write_index(index_file, unique_entries(read_text_map(text_file)))
+
+
+def convert_index_to_text(index_file, text_file):
+    """ Converts an indexed function map to a text one. """
+
+    with FunctionMap(index_file) as function_map:
+        write_text_map(text_file, function_map)
+        return len(function_map)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Converts and queries the XTU external function maps')
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+    to_index = subparsers.add_parser(
+        'to-index', help='Convert a text map to an indexed map')
+    to_index.add_argument('text')
+    to_index.add_argument('index')
+    to_text = subparsers.add_parser(
+        'to-text', help='Convert an indexed map to a text map')
+    to_text.add_argument('index')
+    to_text.add_argument('text')
+    lookup = subparsers.add_parser(
+        'lookup', help='Print the AST files of the given functions')
+    lookup.add_argument('index')
+    lookup.add_argument('names', nargs='+')
+    args = parser.parse_args()
+
+    if args.action == 'to-index':
+        convert_text_to_index(args.text, args.index)
+    elif args.action == 'to-text':
+        convert_index_to_text(args.index, args.text)
+    else:
+        found = True
+        with FunctionMap(args.index) as function_map:
+            for name in args.names:
+                path = function_map.lookup(name.encode('utf-8'))
+                if path is None:
+                    found = False
+                    sys.stderr.write('%s: not found\n' % name)
+                else:
+                    sys.stdout.write('%s %s\n' % (name, path.decode('utf-8')))
+        return 0 if found else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
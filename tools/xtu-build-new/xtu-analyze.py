@@ -7,11 +7,9 @@ import multiprocessing
 import os
 import re
 import shutil
-import signal
 import subprocess
 import string
 import sys
-import threading
 import time
 import uuid
 import sys
@@ -28,6 +26,7 @@ except:
        
 sys.path.append(os.path.join(os.path.dirname(__file__), 'lib'))
 try:
+    import analyze_scheduler
     import deal_compilation_database
 except:
     raise
@@ -65,6 +64,17 @@ parser.add_argument('-j', metavar='threads', dest='threads',
                     default=threading_factor)
 parser.add_argument('-v', dest='verbose', action='store_true',
                     help='Verbose output of every command executed')
+parser.add_argument('--job-memory', metavar='MB', dest='job_memory',
+                    type=int, default=0,
+                    help='Expected peak memory of an analysis in megabytes. '
+                         'When given, an analysis is started only if the '
+                         'available memory is enough for it, besides what '
+                         'the running analyses may still allocate '
+                         '(default: 0, no admission control)')
+parser.add_argument('--reserved-memory', metavar='MB', dest='reserved_memory',
+                    type=int, default=1024,
+                    help='Memory in megabytes to leave available for the '
+                         'system with --job-memory (default: 1024)')
 parser.add_argument('--xtu-reparse', dest='reparse', action='store_true',
                     help='Use on-demand reparsing of external TUs (and do not dump ASTs).')
 parser.add_argument('--clang-path', metavar='clang-path', dest='clang_path',
@@ -100,11 +110,16 @@ parser.add_argument('--record-memory-profile', dest='record_memprof',
 parser.add_argument('--log-passed-build', metavar='passed-buildlog.json',
                     dest='passed_buildlog',
                     help='Write new buildlog JSON of files passing analysis')
+parser.add_argument('--telemetry', metavar='telemetry.jsonl',
+                    dest='telemetry',
+                    help='Append a record of every analyzed TU (times, peak '
+                         'memory, exit status, analyzer stats) to this JSON '
+                         'Lines file. Summarize it with scan-build-py\'s '
+                         'telemetry-summary')
 mainargs = parser.parse_args()
 
-concurrent_threads = 0
-concurrent_thread_times = [0.0]
-concurrent_thread_last_clock = time.time()
+# same as the statistic lines parsed by scan-build-py's telemetry
+statistic_pattern = re.compile(r'^\s*(\d+)\s+(\S+)\s+-\s+(.*\S)\s*$')
 
 
 def executable_exists(path, exe_name):
@@ -175,6 +190,9 @@ if mainargs.record_memprof:
     memprof_command = os.path.join(os.path.abspath(os.path.dirname(__file__)),
                                    'lib', 'memprof_analyze.py')
 
+if mainargs.telemetry:
+    telemetry_path = os.path.abspath(mainargs.telemetry)
+
 analyzer_params += ['-analyzer-stats']
 passthru_analyzer_params = []
 for param in analyzer_params:
@@ -196,6 +214,7 @@ buildlog_file.close()
 src_pattern = re.compile('.*\.(C|c|cc|cpp|cxx|ii|m|mm)$', re.IGNORECASE)
 dircmd_separator = ': '
 dircmd_2_orders = {}
+dircmd_order = []
 src_build_steps = 0
 all_build_steps = 0
 passed_buildlog = []
@@ -206,6 +225,7 @@ for step in buildlog:
         uid = step['directory'] + dircmd_separator + step['command']
         if uid not in dircmd_2_orders:
             dircmd_2_orders[uid] = [src_build_steps]
+            dircmd_order.append(uid)
             dircmd_2_original_orders[uid] = [all_build_steps]
         else:
             dircmd_2_orders[uid].append(src_build_steps)
@@ -226,7 +246,7 @@ def get_compiler_and_arguments(cmd):
     return compiler, args
 
 
-def analyze(directory, command):
+def analyze(directory, command, job=None):
     compiler, args = get_compiler_and_arguments(command)
 
     last_src = None
@@ -272,17 +292,36 @@ def analyze(directory, command):
     # sends SIGTERM
     runOK = True
     out = '******* Error running command'
+    returncode = None
+    rusage = None
+    start = time.time()
     try:
+        # in its own process group, to measure and kill it as a whole
         po = subprocess.Popen(analyze_cmd, shell=True,
                               stderr=subprocess.STDOUT,
                               stdout=subprocess.PIPE,
                               universal_newlines=True,
                               cwd=directory,
-                              env=cmdenv)
-        out, _ = po.communicate()
-        runOK = not po.returncode
+                              env=cmdenv,
+                              **analyze_scheduler.NEW_SESSION)
+        if job is not None:
+            job.pgid = po.pid
+        out = po.stdout.read()
+        po.stdout.close()
+        # wait4 tells the resource usage of this analysis only, while
+        # RUSAGE_CHILDREN would mix the concurrently running ones
+        _, status, rusage = os.wait4(po.pid, 0)
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        po.returncode = returncode
+        runOK = not returncode
+        if job is not None:
+            job.max_rss = rusage.ru_maxrss
     except OSError:
         runOK = False
+    end = time.time()
     if mainargs.verbose:
         sys.stdout.write(out)
     if not runOK:
@@ -292,53 +331,61 @@ def analyze(directory, command):
     with open(os.path.join(prefix, "%s.out" % tu_name), "w") as f:
         f.write("%s\n%s" % (analyze_cmd, out))
 
+    if mainargs.telemetry:
+        write_telemetry(directory, last_src, start, end, returncode, rusage,
+                        out)
+
     return runOK
 
 
-def analyze_work():
-    global concurrent_threads
-    global concurrent_thread_times
-    global concurrent_thread_last_clock
-    global dircmd_2_orders
-    global buildlog
-    global passed_buildlog
-    global dircmd_2_original_orders
+def write_telemetry(directory, source, start, end, returncode, rusage, out):
+    stats = {}
+    for line in out.splitlines():
+        match = statistic_pattern.match(line)
+        if match:
+            stats[match.group(2) + ': ' + match.group(3)] = \
+                int(match.group(1))
+    record = {
+        'file': os.path.join(directory, source) if source else None,
+        'directory': directory,
+        'start': start,
+        'wall': end - start,
+        'user': rusage.ru_utime if rusage else None,
+        'sys': rusage.ru_stime if rusage else None,
+        'max_rss': rusage.ru_maxrss if rusage else None,
+        'exit_code': returncode if returncode is not None else -1,
+        'output_size': len(out),
+        'limits': [],
+        'stats': stats
+    }
+    # a single write into an append mode file, the threads don't interleave
+    line = json.dumps(record, sort_keys=True) + '\n'
+    handle = os.open(telemetry_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0666)
+    try:
+        os.write(handle, line)
+    finally:
+        os.close(handle)
+
+
+def analyze_job(job):
+    return analyze(job.directory, job.command, job)
+
+
+def report_job(job, result, finished, total):
+    """Called by the scheduler under its lock, when a job is finished"""
     global num_passes
     global num_fails
-    while len(dircmd_2_orders) > 0:
-        found_dircmd_orders = None
-        found_dircmd = None
-        for dircmd_orders in dircmd_2_orders.items():
-            dircmd = dircmd_orders[0].split(dircmd_separator, 2)
-            assert len(dircmd) == 2 and len(dircmd[0]) > 0 and \
-                len(dircmd[1]) > 0
-            found_dircmd_orders = dircmd_orders
-            found_dircmd = dircmd
-            break
-        del dircmd_2_orders[found_dircmd_orders[0]]
-
-        concurrent_thread_current_clock = time.time()
-        concurrent_thread_times[concurrent_threads] += \
-            concurrent_thread_current_clock - concurrent_thread_last_clock
-        concurrent_thread_last_clock = concurrent_thread_current_clock
-        concurrent_threads += 1
-        if len(concurrent_thread_times) == concurrent_threads:
-            concurrent_thread_times.append(0.0)
-
-        result = analyze(found_dircmd[0], found_dircmd[1])
-        if (result):
-            num_passes += 1
-            for order in dircmd_2_original_orders[found_dircmd_orders[0]]:
-                passed_buildlog.append(buildlog[order])
-        else:
-            num_fails += 1
+    if result:
+        num_passes += 1
+        for order in dircmd_2_original_orders[job.uid]:
+            passed_buildlog.append(buildlog[order])
+    else:
+        num_fails += 1
+    print '[{}/{}] {} "{}"'.format(finished, total,
+                                   'Passed' if result else 'Failed',
+                                   job.command)
 
-        concurrent_thread_current_clock = time.time()
-        concurrent_thread_times[concurrent_threads] += \
-            concurrent_thread_current_clock - concurrent_thread_last_clock
-        concurrent_thread_last_clock = concurrent_thread_current_clock
-        concurrent_threads -= 1
-        assert concurrent_threads >= 0
 
 try:
     os.makedirs(os.path.abspath(mainargs.xtuoutdir))
@@ -355,17 +402,18 @@ num_passes = 0
 os.makedirs(os.path.join(os.path.abspath(mainargs.xtuoutdir), "fails"))
 num_fails = 0
 
-original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-signal.signal(signal.SIGINT, original_handler)
-
-analyze_workers = []
-for i in range(int(mainargs.threads)):
-    analyze_workers.append(threading.Thread(target=analyze_work))
-for worker in analyze_workers:
-    worker.start()
+jobs = []
+for uid in dircmd_order:
+    dircmd = uid.split(dircmd_separator, 1)
+    assert len(dircmd) == 2 and len(dircmd[0]) > 0 and len(dircmd[1]) > 0
+    jobs.append(analyze_scheduler.Job(uid, dircmd[0], dircmd[1]))
+scheduler = analyze_scheduler.Scheduler(
+    jobs, analyze_job, int(mainargs.threads),
+    job_memory=mainargs.job_memory,
+    reserved_memory=mainargs.reserved_memory,
+    report=report_job)
 try:
-    for worker in analyze_workers:
-        worker.join(9999999999)
+    scheduler.run()
 except KeyboardInterrupt:
     exit(1)
 
@@ -382,17 +430,17 @@ if mainargs.record_coverage:
     MergeCoverage.merge(gcov_tmppath, gcov_finalpath)
     shutil.rmtree(gcov_tmppath, True)
 
-assert concurrent_threads == 0
-concurrent_thread_times[0] += time.time() - concurrent_thread_last_clock
-sumtime = 0.0
-for i in range(len(concurrent_thread_times)):
-    sumtime += concurrent_thread_times[i]
+sumtime = sum(scheduler.busy_times)
 print '--- Total running time: %.2fs' % sumtime
-for i in range(len(concurrent_thread_times)):
+for i in range(len(scheduler.busy_times)):
     print '----- ' + \
         (('using %d processes' % i) if i != 0 else 'self time') + \
-        ' for %.2fs (%.0f%%)' % (concurrent_thread_times[i],
-                                 concurrent_thread_times[i] * 100.0 / sumtime)
+        ' for %.2fs (%.0f%%)' % (scheduler.busy_times[i],
+                                 scheduler.busy_times[i] * 100.0 / sumtime)
+print '--- Peak memory of an analysis: %dMB' % scheduler.peak_job_memory
+if mainargs.job_memory:
+    print '----- Analyses delayed for memory: %d, for %.2fs in total' % (
+        scheduler.admission_waits, scheduler.admission_wait_time)
 
 print '--- Total files analyzed: {}'.format(num_fails + num_passes)
 print '----- Files passed: {}'.format(num_passes)
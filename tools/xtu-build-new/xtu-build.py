@@ -9,22 +9,26 @@ import os
 import re
 import signal
 import subprocess
-import string
 import shlex
 import shutil
-import tempfile
 import sys
+import time
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'lib'))
 try:
+    import build_manifest
     import deal_compilation_database
+    import function_map
 except:
     raise
 
 threading_factor = int(multiprocessing.cpu_count() * 1.5)
 timeout = 86400
 EXTERNAL_FUNCTION_MAP_FILENAME = 'externalFnMap.txt'
+INDEXED_FUNCTION_MAP_FILENAME = 'externalFnMap.idx'
 TEMP_EXTERNAL_FNMAP_FOLDER = 'tmpExternalFnMaps'
+EXTERNAL_FNMAP_SHARDS_FOLDER = 'fnMapShards'
+MANIFEST_FOLDER = 'manifests'
 
 
 parser = argparse.ArgumentParser(
@@ -48,11 +52,30 @@ parser.add_argument('--clang-path', metavar='clang-path', dest='clang_path',
                     help='Set path of clang binaries to be used '
                          '(default taken from CLANG_PATH envvar)',
                     default=os.environ.get('CLANG_PATH'))
-parser.add_argument('--timeout', metavar='N',
+parser.add_argument('--fn-map-format', dest='fn_map_format',
+                    choices=['text', 'indexed', 'both'], default='both',
+                    help='Format of the external function map: the text '
+                         'map (' + EXTERNAL_FUNCTION_MAP_FILENAME + '), the '
+                         'indexed map (' + INDEXED_FUNCTION_MAP_FILENAME +
+                         ', used by the analyzer when it exists) or both '
+                         '(default="both")')
+parser.add_argument('--fn-map-shards', metavar='N', dest='fn_map_shards',
+                    type=int,
+                    help='Number of shards of the external function map, '
+                         'which are merged in parallel (default=number of '
+                         'threads)')
+parser.add_argument('--incremental', dest='incremental', action='store_true',
+                    help='Reuse the AST dumps and the function maps of the '
+                         'sources which did not change since the previous '
+                         'incremental run (the command, the source, the '
+                         'included files and the clang version are checked)')
+parser.add_argument('--timeout', metavar='N', type=int,
                     help='Timeout for build in seconds (default: %d)' %
                     timeout,
                     default=timeout)
 mainargs = parser.parse_args()
+if mainargs.fn_map_shards is None:
+    mainargs.fn_map_shards = int(mainargs.threads)
 
 
 def executable_exists(path, exe_name):
@@ -135,7 +158,7 @@ def get_command_arguments(cmd):
     return args
 
 
-def get_triple_arch(clang_path, clang_args,source):
+def get_triple_arch(clang_path, clang_args, source, directory=None):
     """Returns the architecture part of the target triple in a compilation command """
     arch = ""
     clang_cmd = []
@@ -143,7 +166,8 @@ def get_triple_arch(clang_path, clang_args,source):
     clang_cmd.append("-###")
     clang_cmd.extend(clang_args)
     clang_cmd.append(source)    
-    clang_out = subprocess.check_output(clang_cmd, stderr=subprocess.STDOUT, shell=False)    
+    clang_out = subprocess.check_output(clang_cmd, stderr=subprocess.STDOUT,
+                                        shell=False, cwd=directory)
     clang_params=shlex.split(clang_out)
     i=0
     while i<len(clang_params) and clang_params[i]!="-triple":        
@@ -153,126 +177,235 @@ def get_triple_arch(clang_path, clang_args,source):
     return arch
     
 
-def generate_ast(source):
-    cmd = src_2_cmd[source]
-    args = get_command_arguments(cmd)        
-    arch=get_triple_arch(clang_path,args,source)    
-    ast_path = os.path.abspath(os.path.join(mainargs.xtuindir,
-                               os.path.join('/ast/' + arch,
-                                            os.path.realpath(source)[1:] +
-                                            '.ast')[1:]))
-    try:
-        os.makedirs(os.path.dirname(ast_path))
-    except OSError:
-        if os.path.isdir(os.path.dirname(ast_path)):
-            pass
-        else:
-            raise
-    dir_command = 'cd ' + src_2_dir[source]
-    ast_command = os.path.join(clang_path, 'clang') + ' -emit-ast ' + \
-        string.join(args, ' ') + ' -w ' + source + ' -o ' + ast_path
-    if mainargs.verbose:
-        print dir_command + " && " + ast_command
-    subprocess.call(dir_command + " && " + ast_command, shell=True)
-
-
-def map_functions(params):
-    command, sources, directory, clang_path, ctuindir, reparse = params
-    ctuindir = os.path.abspath(ctuindir)
-    args = get_command_arguments(command)
-    arch = get_triple_arch(clang_path, args, sources[0])
+def get_arch(params):
+    """Returns the architecture of the distinct argument list of commands"""
+    args, source, directory = params
+    return args, get_triple_arch(clang_path, list(args), source, directory)
+
+
+def get_command_digest(source):
+    return build_manifest.digest(src_2_dir[source], list(src_2_args[source]),
+                                 mainargs.reparse)
+
+
+def get_manifest_file(key):
+    return os.path.join(manifest_folder, key + '.json')
+
+
+def check_source(source):
+    """Tells whether the outputs of a source are up to date, and reshards its
+    function map when the number of shards changed"""
+    real_source = os.path.realpath(os.path.join(src_2_dir[source], source))
+    key = build_manifest.source_key(real_source)
+    manifest_file = get_manifest_file(key)
+    manifest = build_manifest.read_manifest(manifest_file)
+    refreshed = []
+    if not build_manifest.is_up_to_date(manifest, real_source,
+                                        get_command_digest(source),
+                                        clang_version, refreshed):
+        return source, False
+    if manifest['shards'] != mainargs.fn_map_shards:
+        build_manifest.remove_manifest(manifest_file)
+        entries = list(function_map.read_sharded_maps(
+            extern_fns_map_folder, key, manifest['shards']))
+        function_map.remove_sharded_maps(extern_fns_map_folder, key,
+                                         manifest['shards'])
+        manifest['map_files'] = function_map.write_sharded_maps(
+            extern_fns_map_folder, key, entries, mainargs.fn_map_shards)
+        manifest['shards'] = mainargs.fn_map_shards
+        build_manifest.write_manifest(manifest_file, manifest)
+    elif refreshed:
+        # Touched, but unchanged inputs are not hashed again the next time
+        build_manifest.write_manifest(manifest_file, manifest)
+    return source, True
+
+
+def process_source(params):
+    """Parses a source file once: dumps its AST (unless reparse is on) and
+    writes its defined functions into the temporary function maps"""
+    source, directory, args, arch = params
+    ctuindir = os.path.abspath(mainargs.xtuindir)
+    real_source = os.path.realpath(os.path.join(directory, source))
+    key = build_manifest.source_key(real_source)
+    manifest_file = get_manifest_file(key)
+    deps_file = os.path.join(manifest_folder, key + '.deps')
     funcmap_command = [os.path.join(clang_path, 'clang-func-mapping')]
-    funcmap_command.extend(sources)
+    if not mainargs.reparse:
+        funcmap_command.append('-ast-dir=' +
+                               os.path.join(ctuindir, 'ast', arch))
+    if mainargs.incremental:
+        build_manifest.remove_manifest(manifest_file)
+        funcmap_command.append('-deps-file=' + deps_file)
+    funcmap_command.append(source)
     funcmap_command.append('--')
     funcmap_command.extend(args)
     output = []
-    os.chdir(directory);
     if mainargs.verbose:
         print funcmap_command
-    fn_out = subprocess.check_output(funcmap_command)
+    try:
+        fn_out = subprocess.check_output(funcmap_command, cwd=directory)
+    except subprocess.CalledProcessError as error:
+        # A source which does not compile is left out of the function map,
+        # like before; it has no manifest, so it is tried again next time
+        print 'error: clang-func-mapping failed on %s (exit code %d)' % (
+            source, error.returncode)
+        function_map.remove_sharded_maps(extern_fns_map_folder, key,
+                                         mainargs.fn_map_shards)
+        clear_file(deps_file)
+        return source
     fn_list = fn_out.splitlines()
     for fn_txt in fn_list:
         dpos = fn_txt.find(" ")
         mangled_name = fn_txt[0:dpos]
         path = fn_txt[dpos + 1:]
         ast_path = path
-        if not reparse:
+        if not mainargs.reparse:
             ast_path = os.path.join("ast", arch, path[1:] + ".ast")
-        output.append(mangled_name + "@" + arch + " " + ast_path)
-    extern_fns_map_folder = os.path.join(ctuindir,
-                                         TEMP_EXTERNAL_FNMAP_FOLDER)
-    if output:
-        with tempfile.NamedTemporaryFile(mode='w',
-                                         dir=extern_fns_map_folder,
-                                         delete=False) as out_file:
-            out_file.write("\n".join(output) + "\n")
-
-
-def create_external_fn_maps(ctuindir):
-    files = glob.glob(os.path.join(ctuindir, TEMP_EXTERNAL_FNMAP_FOLDER,
-                                   '*'))
+        output.append((mangled_name + "@" + arch, ast_path))
+    map_files = function_map.write_sharded_maps(
+        extern_fns_map_folder, key, output, mainargs.fn_map_shards)
+    if mainargs.incremental:
+        with open(deps_file, 'r') as in_file:
+            inputs = in_file.read().splitlines()
+        os.remove(deps_file)
+        ast_file = None
+        if not mainargs.reparse:
+            ast_file = os.path.join(ctuindir, 'ast', arch,
+                                    real_source[1:] + '.ast')
+        build_manifest.write_manifest(
+            manifest_file,
+            build_manifest.make_manifest(real_source,
+                                         get_command_digest(source),
+                                         clang_version, inputs, ast=ast_file,
+                                         shards=mainargs.fn_map_shards,
+                                         map_files=map_files))
+    return source
+
+
+def remove_stale_outputs(sources):
+    """Removes the outputs of the sources which are no longer built"""
+    keys = set(build_manifest.source_key(os.path.join(src_2_dir[source],
+                                                      source))
+               for source in sources)
+    for manifest_file in glob.glob(os.path.join(manifest_folder, '*.json')):
+        key = os.path.basename(manifest_file)[:-len('.json')]
+        if key not in keys:
+            manifest = build_manifest.read_manifest(manifest_file)
+            if manifest is not None and manifest.get('ast'):
+                clear_file(manifest['ast'])
+            build_manifest.remove_manifest(manifest_file)
+    for map_file in glob.glob(os.path.join(extern_fns_map_folder, '*', '*')):
+        if os.path.basename(map_file) not in keys:
+            os.remove(map_file)
+
+
+def report_progress(done, total, source):
+    if mainargs.verbose:
+        print '[%d/%d] %s' % (done, total, source)
+    else:
+        sys.stdout.write('\r[%d/%d]' % (done, total))
+        if done == total:
+            sys.stdout.write('\n')
+        sys.stdout.flush()
+
+
+def create_external_fn_maps(ctuindir, fn_map_format, shard_maps):
+    entries = function_map.merge_sorted_maps(shard_maps)
     extern_fns_map_file = os.path.join(ctuindir,
                                        EXTERNAL_FUNCTION_MAP_FILENAME)
-    mangled_to_asts = {}
-    for filename in files:
-        with open(filename, 'rb') as in_file:
-            for line in in_file:
-                mangled_name, ast_file = line.strip().split(' ', 1)
-                if mangled_name not in mangled_to_asts:
-                    mangled_to_asts[mangled_name] = {ast_file}
-                else:
-                    mangled_to_asts[mangled_name].add(ast_file)
-    with open(extern_fns_map_file, 'wb') as out_file:
-        for mangled_name, ast_files in mangled_to_asts.iteritems():
-            if len(ast_files) == 1:
-                out_file.write('%s %s\n' % (mangled_name, ast_files.pop()))
-
+    indexed_fns_map_file = os.path.join(ctuindir,
+                                        INDEXED_FUNCTION_MAP_FILENAME)
+    if fn_map_format == 'text':
+        function_map.write_text_map(extern_fns_map_file, entries)
+    else:
+        function_map.write_index(indexed_fns_map_file, entries)
+        if fn_map_format == 'both':
+            function_map.convert_index_to_text(indexed_fns_map_file,
+                                               extern_fns_map_file)
 
 if not os.path.exists(mainargs.xtuindir):
     os.makedirs(mainargs.xtuindir)
 clear_file(os.path.join(mainargs.xtuindir, 'cfg.txt'))
 clear_file(os.path.join(mainargs.xtuindir, 'definedFns.txt'))
 clear_file(os.path.join(mainargs.xtuindir, 'externalFns.txt'))
-clear_file(os.path.join(mainargs.xtuindir, 'externalFnMap.txt'))
-
-original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-if not mainargs.reparse:   #only generate AST dumps is reparse is off     
-    ast_workers = multiprocessing.Pool(processes=int(mainargs.threads))
-    signal.signal(signal.SIGINT, original_handler)
-    try:
-        res = ast_workers.map_async(generate_ast, src_order)
-        # Block with timeout so that signals don't get ignored, python bug 8296
-        res.get(mainargs.timeout)
-    except KeyboardInterrupt:
-        ast_workers.terminate()
-        ast_workers.join()
-        exit(1)
-    else:
-        ast_workers.close()
-        ast_workers.join()
-
-
-shutil.rmtree(os.path.join(mainargs.xtuindir, TEMP_EXTERNAL_FNMAP_FOLDER), ignore_errors=True)
-os.mkdir(os.path.join(mainargs.xtuindir, TEMP_EXTERNAL_FNMAP_FOLDER))
+clear_file(os.path.join(mainargs.xtuindir, EXTERNAL_FUNCTION_MAP_FILENAME))
+clear_file(os.path.join(mainargs.xtuindir, INDEXED_FUNCTION_MAP_FILENAME))
+
+manifest_folder = os.path.abspath(os.path.join(mainargs.xtuindir,
+                                               MANIFEST_FOLDER))
+shards_folder = os.path.abspath(os.path.join(mainargs.xtuindir,
+                                             EXTERNAL_FNMAP_SHARDS_FOLDER))
+if mainargs.incremental:
+    # The function maps of the sources are kept for the next run
+    extern_fns_map_folder = shards_folder
+    clang_version = subprocess.check_output(
+        [os.path.join(clang_path, 'clang'), '--version'])
+else:
+    extern_fns_map_folder = os.path.abspath(
+        os.path.join(mainargs.xtuindir, TEMP_EXTERNAL_FNMAP_FOLDER))
+    clang_version = None
+    shutil.rmtree(extern_fns_map_folder, ignore_errors=True)
+    shutil.rmtree(shards_folder, ignore_errors=True)
+    shutil.rmtree(manifest_folder, ignore_errors=True)
+for folder in [os.path.join(extern_fns_map_folder, str(shard))
+               for shard in range(mainargs.fn_map_shards)] + \
+        ([manifest_folder] if mainargs.incremental else []):
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+src_2_args = dict((source, tuple(get_command_arguments(src_2_cmd[source])))
+                  for source in src_order)
 original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-funcmap_workers = multiprocessing.Pool(processes=int(mainargs.threads))
+workers = multiprocessing.Pool(processes=int(mainargs.threads))
 signal.signal(signal.SIGINT, original_handler)
+deadline = time.time() + mainargs.timeout
 try:
-    res = funcmap_workers.map_async(map_functions,
-                                    [(cmd, cmd_2_src[cmd], src_2_dir[cmd_2_src[cmd][0]],
-                                      clang_path, mainargs.xtuindir, mainargs.reparse) for cmd in cmd_order])
-    res.get(mainargs.timeout)
+    changed_sources = src_order
+    if mainargs.incremental:
+        # Block with timeout so that signals don't get ignored, python bug 8296
+        res = workers.map_async(check_source, src_order)
+        up_to_date = dict(res.get(mainargs.timeout))
+        changed_sources = [source for source in src_order
+                           if not up_to_date[source]]
+        remove_stale_outputs(src_order)
+        print '%d of %d sources are up to date' % (
+            len(src_order) - len(changed_sources), len(src_order))
+    # The triple of every distinct argument list is computed only once
+    arch_params = {}
+    for source in changed_sources:
+        if src_2_args[source] not in arch_params:
+            arch_params[src_2_args[source]] = (src_2_args[source], source,
+                                               src_2_dir[source])
+    res = workers.map_async(get_arch, arch_params.values())
+    args_2_arch = dict(res.get(mainargs.timeout))
+    # Dump the AST and map the functions of every source in one pass
+    res = workers.imap_unordered(
+        process_source,
+        [(source, src_2_dir[source], list(src_2_args[source]),
+          args_2_arch[src_2_args[source]]) for source in changed_sources])
+    for done in range(1, len(changed_sources) + 1):
+        source = res.next(max(deadline - time.time(), 0))
+        report_progress(done, len(changed_sources), source)
+    # Merge the sorted temporary maps of every shard
+    shard_params = [
+        (glob.glob(os.path.join(extern_fns_map_folder, str(shard), '*')),
+         os.path.join(extern_fns_map_folder, str(shard) + '.merged'))
+        for shard in range(mainargs.fn_map_shards)]
+    res = workers.map_async(function_map.merge_shard, shard_params)
+    shard_maps = res.get(mainargs.timeout)
 except KeyboardInterrupt:
-    funcmap_workers.terminate()
-    funcmap_workers.join()
+    workers.terminate()
+    workers.join()
     exit(1)
 else:
-    funcmap_workers.close()
-    funcmap_workers.join()
-
+    workers.close()
+    workers.join()
 
-# Generate externalFnMap.txt
 
-create_external_fn_maps(mainargs.xtuindir)
-shutil.rmtree(os.path.join(mainargs.xtuindir, TEMP_EXTERNAL_FNMAP_FOLDER), ignore_errors=True)
+# Generate externalFnMap.txt and/or externalFnMap.idx
 
+create_external_fn_maps(mainargs.xtuindir, mainargs.fn_map_format, shard_maps)
+if mainargs.incremental:
+    for merged_file in glob.glob(os.path.join(extern_fns_map_folder, '*.*')):
+        os.remove(merged_file)
+else:
+    shutil.rmtree(extern_fns_map_folder, ignore_errors=True)
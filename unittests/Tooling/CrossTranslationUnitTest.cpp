@@ -12,6 +12,7 @@
 #include "clang/Tooling/CrossTranslationUnit.h"
 #include "clang/Tooling/Tooling.h"
 #include "llvm/Config/llvm-config.h"
+#include "llvm/Support/MathExtras.h"
 #include "llvm/Support/Path.h"
 #include "gtest/gtest.h"
 #include <cassert>
@@ -21,13 +22,58 @@ namespace tooling {
 
 namespace {
 StringRef IndexFileName = "index.txt";
+StringRef IndexedMapFileName = "index.idx";
 StringRef ASTFileName = "f.ast";
 StringRef DefinitionFileName = "input.cc";
+StringRef LookupName = "c:@F@f#I#";
+
+/// The function maps written for a test: the text map only, or an indexed
+/// map as well, which is valid, truncated or has out of range offsets.
+enum class FunctionMapKind { Text, Indexed, Truncated, OutOfRange };
+
+void appendLE(std::string &Data, uint64_t Value, unsigned Size) {
+  for (unsigned I = 0; I < Size; ++I)
+    Data.push_back(static_cast<char>((Value >> (8 * I)) & 0xff));
+}
+
+/// Creates an indexed function map of a single function, in the layout
+/// written by xtu-build (see function_map.py).
+std::string createIndexedMap(StringRef Name, StringRef Path,
+                             FunctionMapKind Kind) {
+  const uint64_t HeaderSize = 48;
+  uint64_t PathOffset = HeaderSize;
+  uint64_t NameOffset = PathOffset + Path.size();
+  uint64_t PathTable = llvm::alignTo(NameOffset + Name.size(), 8);
+  uint64_t EntryTable = PathTable + 16;
+
+  std::string Data = "XTUFNMAP";
+  appendLE(Data, /*Version=*/1, 4);
+  appendLE(Data, 0, 4);
+  appendLE(Data, /*EntryCount=*/1, 8);
+  appendLE(Data, EntryTable, 8);
+  appendLE(Data, /*PathCount=*/1, 8);
+  appendLE(Data, PathTable, 8);
+  Data += Path;
+  Data += Name;
+  Data.resize(PathTable, '\0');
+  if (Kind == FunctionMapKind::OutOfRange)
+    PathOffset = uint64_t(1) << 40;
+  appendLE(Data, PathOffset, 8);
+  appendLE(Data, Path.size(), 4);
+  appendLE(Data, 0, 4);
+  appendLE(Data, NameOffset, 8);
+  appendLE(Data, Name.size(), 4);
+  appendLE(Data, /*PathIndex=*/0, 4);
+  if (Kind == FunctionMapKind::Truncated)
+    Data.resize(Data.size() - 8);
+  return Data;
+}
 
 class CTUASTConsumer : public clang::ASTConsumer {
 public:
-  explicit CTUASTConsumer(clang::CompilerInstance &CI, bool *Success)
-      : CTU(CI), Success(Success) {}
+  explicit CTUASTConsumer(clang::CompilerInstance &CI, bool *Success,
+                          FunctionMapKind Kind)
+      : CTU(CI), Success(Success), Kind(Kind) {}
 
   void HandleTranslationUnit(ASTContext &Ctx) {
     const TranslationUnitDecl *TU = Ctx.getTranslationUnitDecl();
@@ -40,11 +86,17 @@ public:
     assert(FD);
     bool OrigFDHasBody = FD->hasBody();
 
-    // Prepare the index file and the AST file.
+    // Prepare the index file and the AST file. A valid indexed map is used
+    // instead of the text map, which is not written then.
     std::error_code EC;
-    llvm::raw_fd_ostream OS(IndexFileName, EC, llvm::sys::fs::F_Text);
-    OS << "c:@F@f#I# " << ASTFileName << "\n";
-    OS.flush();
+    if (Kind != FunctionMapKind::Indexed) {
+      llvm::raw_fd_ostream OS(IndexFileName, EC, llvm::sys::fs::F_Text);
+      OS << LookupName << " " << ASTFileName << "\n";
+    }
+    if (Kind != FunctionMapKind::Text) {
+      llvm::raw_fd_ostream OS(IndexedMapFileName, EC, llvm::sys::fs::F_None);
+      OS << createIndexedMap(LookupName, ASTFileName, Kind);
+    }
     StringRef SourceText = "int f(int) { return 0; }\n";
     // This file must exist since the saved ASTFile will reference it.
     llvm::raw_fd_ostream OS2(DefinitionFileName, EC, llvm::sys::fs::F_Text);
@@ -64,22 +116,31 @@ public:
 private:
   CrossTranslationUnit CTU;
   bool *Success;
+  FunctionMapKind Kind;
 };
 
 class CTUAction : public clang::ASTFrontendAction {
 public:
-  CTUAction(bool *Success) : Success(Success) {}
+  CTUAction(bool *Success, FunctionMapKind Kind = FunctionMapKind::Text)
+      : Success(Success), Kind(Kind) {}
 
 protected:
   std::unique_ptr<clang::ASTConsumer>
   CreateASTConsumer(clang::CompilerInstance &CI, StringRef) override {
-    return llvm::make_unique<CTUASTConsumer>(CI, Success);
+    return llvm::make_unique<CTUASTConsumer>(CI, Success, Kind);
   }
 
 private:
   bool *Success;
+  FunctionMapKind Kind;
 };
 
+void removeTestFiles() {
+  for (StringRef FileName : {IndexFileName, IndexedMapFileName, ASTFileName,
+                             DefinitionFileName})
+    llvm::sys::fs::remove(FileName);
+}
+
 } // end namespace
 
 TEST(CrossTranslationUnit, CanLoadFunctionDefinition) {
@@ -94,5 +155,31 @@ TEST(CrossTranslationUnit, CanLoadFunctionDefinition) {
   EXPECT_FALSE((bool)llvm::sys::fs::remove(DefinitionFileName));
 }
 
+TEST(CrossTranslationUnit, CanLoadFunctionDefinitionFromIndexedMap) {
+  bool Success = false;
+  EXPECT_TRUE(runToolOnCode(new CTUAction(&Success, FunctionMapKind::Indexed),
+                            "int f(int);"));
+  EXPECT_TRUE(Success);
+  EXPECT_FALSE(llvm::sys::fs::exists(IndexFileName));
+  removeTestFiles();
+}
+
+TEST(CrossTranslationUnit, TruncatedIndexedMapFallsBackToText) {
+  bool Success = false;
+  EXPECT_TRUE(runToolOnCode(
+      new CTUAction(&Success, FunctionMapKind::Truncated), "int f(int);"));
+  EXPECT_TRUE(Success);
+  removeTestFiles();
+}
+
+TEST(CrossTranslationUnit, IndexedMapWithOutOfRangeOffsets) {
+  // The indexed map is used, but the function is not found in it.
+  bool Success = true;
+  EXPECT_TRUE(runToolOnCode(
+      new CTUAction(&Success, FunctionMapKind::OutOfRange), "int f(int);"));
+  EXPECT_FALSE(Success);
+  removeTestFiles();
+}
+
 } // end namespace tooling
 } // end namespace clang